@@ -0,0 +1,99 @@
+"""
+Подбор столика под размер компании
+Столики разложены по корзинам вместимости. Компании из N гостей достается
+свободный столик из самой маленькой корзины, где мест не меньше N, —
+так большие столы остаются для больших компаний.
+Если ни один столик не вмещает компанию, ищется наименьшее сочетание
+соседних столиков; все сочетания заранее собраны в битовые маски.
+"""
+import bisect
+
+from config import config
+
+
+class TableAllocator:
+    """Best-fit подбор столика по корзинам вместимости"""
+
+    def __init__(self, table_layout):
+        # зона -> отсортированные вместимости и столики каждой корзины
+        self._capacities = {}
+        self._buckets = {}
+
+        by_zone = {}
+        for zone, number, seats in table_layout:
+            by_zone.setdefault(zone, {}).setdefault(seats, []).append(number)
+
+        for zone, buckets in by_zone.items():
+            capacities = sorted(buckets)
+            self._capacities[zone] = capacities
+            self._buckets[zone] = [sorted(buckets[seats]) for seats in capacities]
+
+    def max_capacity(self, zone='main'):
+        capacities = self._capacities.get(zone)
+        return capacities[-1] if capacities else 0
+
+    def candidates(self, guests, zone='main'):
+        """Столики, вмещающие компанию, от самых подходящих к самым большим"""
+        capacities = self._capacities.get(zone, [])
+        for position in range(bisect.bisect_left(capacities, guests), len(capacities)):
+            yield from self._buckets[zone][position]
+
+    def allocate(self, guests, is_free, zone='main'):
+        """Самый подходящий свободный столик или None
+
+        is_free(номер столика) -> bool — проверка занятости на нужный интервал
+        """
+        for table_number in self.candidates(guests, zone):
+            if is_free(table_number):
+                return table_number
+        return None
+
+
+class TableCombiner:
+    """Поиск наименьшего свободного сочетания соседних столиков"""
+
+    def __init__(self, table_layout, table_groups):
+        seats = {number: table_seats for _, number, table_seats in table_layout}
+        zones = {number: zone for zone, number, _ in table_layout}
+        self._bits = {number: 1 << position for position, (_, number, _) in enumerate(table_layout)}
+
+        # зона -> [(маска, столики, мест)] от меньшего числа столиков к большему
+        self._combinations = {}
+        for group in table_groups:
+            group = [number for number in group if number in seats]
+            for first in range(len(group)):
+                for last in range(first + 2, len(group) + 1):
+                    tables = tuple(group[first:last])
+                    zone = zones[tables[0]]
+                    if any(zones[number] != zone for number in tables):
+                        continue
+                    mask = 0
+                    for number in tables:
+                        mask |= self._bits[number]
+                    self._combinations.setdefault(zone, []).append(
+                        (mask, tables, sum(seats[number] for number in tables))
+                    )
+
+        for combinations in self._combinations.values():
+            combinations.sort(key=lambda combination: (len(combination[1]), combination[2]))
+
+    def max_capacity(self, zone='main'):
+        return max((seats for _, _, seats in self._combinations.get(zone, [])), default=0)
+
+    def find(self, guests, free_tables, zone='main', must_include=None):
+        """Наименьшее сочетание свободных соседних столиков для компании или None"""
+        free_mask = 0
+        for number in free_tables:
+            free_mask |= self._bits.get(number, 0)
+
+        for mask, tables, seats in self._combinations.get(zone, []):
+            if seats < guests or mask & free_mask != mask:
+                continue
+            if must_include is not None and must_include not in tables:
+                continue
+            return list(tables)
+        return None
+
+
+table_allocator = TableAllocator(config.TABLE_LAYOUT)
+table_combiner = TableCombiner(config.TABLE_LAYOUT, config.TABLE_GROUPS)
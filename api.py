@@ -0,0 +1,169 @@
+"""
+HTTP API свободных слотов для сайта ресторана
+Работает в процессе бота (aiohttp) и отвечает по тому же индексу
+занятости. ETag ответа строится из версии индекса: пока брони не
+менялись, браузер получает 304 без тела, а готовые тела кэшируются.
+
+    GET /api/availability/2026-10-20?guests=4
+    GET /calendar/<user_id>/<токен>.ics — календарь броней (см. calendar_feed)
+"""
+import json
+import logging
+from collections import OrderedDict
+from datetime import datetime
+from functools import partial
+
+from aiohttp import web
+
+from availability import availability_index
+from calendar_feed import check_feed_token, render_feed
+from config import config
+from utils import generate_time_slots, get_available_tables, validate_date
+
+logger = logging.getLogger(__name__)
+
+BODY_CACHE_SIZE = 256
+MAX_API_GUESTS = 50
+
+# Версия индекса считается с нуля при каждом запуске — отличаем ETag разных запусков
+_BOOT = format(int(datetime.now().timestamp()), 'x')
+
+
+class BodyCache:
+    """Готовые JSON-ответы по ETag"""
+
+    def __init__(self, max_size=BODY_CACHE_SIZE):
+        self.max_size = max_size
+        self._bodies = OrderedDict()
+
+    def get(self, etag):
+        body = self._bodies.get(etag)
+        if body is not None:
+            self._bodies.move_to_end(etag)
+        return body
+
+    def put(self, etag, body):
+        self._bodies[etag] = body
+        while len(self._bodies) > self.max_size:
+            self._bodies.popitem(last=False)
+
+
+body_cache = BodyCache()
+
+
+def _future_slots(date):
+    slots = generate_time_slots()
+    now = datetime.now()
+    if date != now.strftime('%Y-%m-%d'):
+        return slots
+    return [slot for slot in slots if slot > now.strftime('%H:%M')]
+
+
+def _etag(date, zone, guests, slots):
+    # Сегодня список слотов сокращается со временем — учитываем первый оставшийся
+    first_slot = slots[0] if slots else '-'
+    return f'W/"{_BOOT}-{availability_index.version}-{date}-{zone}-{guests or 0}-{first_slot}"'
+
+
+def _render(date, zone, guests, slots):
+    body = {
+        "date": date,
+        "zone": zone,
+        "guests": guests,
+        "slots": [],
+    }
+    for time in slots:
+        tables = get_available_tables(date, time, zone, guests)
+        body["slots"].append({
+            "time": time,
+            "free_tables": len(tables),
+            "max_guests": max((config.TABLE_SEATS.get(table, config.MAX_GUESTS) for table in tables), default=0),
+        })
+    return json.dumps(body, ensure_ascii=False).encode('utf-8')
+
+
+def _error(status, message):
+    return web.json_response(
+        {"error": message}, status=status, headers=_cors_headers(), dumps=partial(json.dumps, ensure_ascii=False)
+    )
+
+
+def _cors_headers():
+    return {"Access-Control-Allow-Origin": config.API_CORS_ORIGIN} if config.API_CORS_ORIGIN else {}
+
+
+def _not_modified(request, etag):
+    """If-None-Match совпадает с текущим ETag (слабое сравнение)"""
+    tags = {
+        tag.strip().removeprefix('W/')
+        for value in request.headers.getall('If-None-Match', [])
+        for tag in value.split(',')
+    }
+    return '*' in tags or etag.removeprefix('W/') in tags
+
+
+async def availability_handler(request):
+    date = request.match_info['date']
+    zone = request.query.get('zone', 'main')
+
+    valid, message = validate_date(date)
+    if not valid:
+        return _error(400, message)
+    if zone not in config.TABLES:
+        return _error(404, f"Нет зоны {zone}")
+    try:
+        guests = int(request.query['guests']) if 'guests' in request.query else None
+    except ValueError:
+        return _error(400, "guests должно быть числом")
+    if guests is not None and not 1 <= guests <= MAX_API_GUESTS:
+        return _error(400, f"guests от 1 до {MAX_API_GUESTS}")
+
+    slots = _future_slots(date)
+    etag = _etag(date, zone, guests, slots)
+    headers = {
+        "ETag": etag,
+        "Cache-Control": "no-cache",  # браузер каждый раз сверяет ETag
+        **_cors_headers(),
+    }
+    if _not_modified(request, etag):
+        return web.Response(status=304, headers=headers)
+
+    body = body_cache.get(etag)
+    if body is None:
+        body = _render(date, zone, guests, slots)
+        body_cache.put(etag, body)
+    return web.Response(body=body, content_type='application/json', charset='utf-8', headers=headers)
+
+
+async def calendar_handler(request):
+    try:
+        user_id = int(request.match_info['user_id'])
+    except ValueError:
+        raise web.HTTPNotFound()
+    if not check_feed_token(user_id, request.match_info['token']):
+        raise web.HTTPNotFound()
+
+    body, etag = render_feed(user_id)
+    headers = {"ETag": etag, "Cache-Control": "no-cache"}
+    if _not_modified(request, etag):
+        return web.Response(status=304, headers=headers)
+    return web.Response(body=body, content_type='text/calendar', charset='utf-8', headers=headers)
+
+
+def create_app():
+    app = web.Application()
+    app.router.add_get('/api/availability/{date}', availability_handler)
+    app.router.add_get('/calendar/{user_id}/{token}.ics', calendar_handler)
+    return app
+
+
+async def start_api():
+    """Запустить API, если задан API_PORT. Возвращает runner для остановки или None"""
+    if not config.API_PORT:
+        return None
+
+    runner = web.AppRunner(create_app(), access_log=None)
+    await runner.setup()
+    await web.TCPSite(runner, config.API_HOST, config.API_PORT).start()
+    logger.info(f"API свободных слотов: http://{config.API_HOST}:{config.API_PORT}/api/availability/<дата>")
+    return runner
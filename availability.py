@@ -0,0 +1,224 @@
+"""
+Индекс занятости столиков
+Для каждого дня и столика хранятся интервалы броней, отсортированные по началу,
+поэтому проверка пересечения — двоичный поиск, а не запрос к БД.
+День загружается одним запросом при первом обращении, дальше индекс
+обновляется по событиям броней.
+"""
+import bisect
+import logging
+from datetime import datetime
+
+from booking_events import on, BOOKING_CREATED, BOOKING_CONFIRMED, BOOKING_RELEASED
+from config import config
+from database import get_session, Booking
+
+logger = logging.getLogger(__name__)
+
+ACTIVE_STATUSES = ('pending', 'confirmed')
+
+
+def time_to_minutes(time_str):
+    """'HH:MM' -> минуты от начала дня"""
+    hour, minute = map(int, time_str.split(':'))
+    return hour * 60 + minute
+
+
+def parse_extra_tables(extra_tables):
+    """'2,3' или [2, 3] -> [2, 3]"""
+    if not extra_tables:
+        return []
+    if isinstance(extra_tables, str):
+        return [int(table) for table in extra_tables.split(',') if table]
+    return list(extra_tables)
+
+
+def booking_tables(booking):
+    """Все столики брони: основной и сдвинутые к нему"""
+    return [booking.table_number] + parse_extra_tables(getattr(booking, 'extra_tables', None))
+
+
+def booking_interval(booking):
+    """Интервал брони в минутах от начала дня: [начало, конец)"""
+    start = time_to_minutes(booking.time)
+    duration = booking.duration or config.get_booking_duration(booking.guests, booking.time)
+    return start, start + duration
+
+
+class TableIntervals:
+    """Интервалы броней одного столика за день, отсортированные по началу"""
+
+    __slots__ = ('starts', 'ends', 'ids', 'max_ends')
+
+    def __init__(self):
+        self.starts = []
+        self.ends = []
+        self.ids = []
+        self.max_ends = []  # максимум концов на префиксе — на случай старых пересекающихся броней
+
+    def _rebuild_max_ends(self, position):
+        current = self.max_ends[position - 1] if position else 0
+        del self.max_ends[position:]
+        for end in self.ends[position:]:
+            current = max(current, end)
+            self.max_ends.append(current)
+
+    def add(self, start, end, booking_id):
+        if booking_id in self.ids:
+            return
+        position = bisect.bisect_right(self.starts, start)
+        self.starts.insert(position, start)
+        self.ends.insert(position, end)
+        self.ids.insert(position, booking_id)
+        self._rebuild_max_ends(position)
+
+    def remove(self, booking_id):
+        if booking_id not in self.ids:
+            return
+        position = self.ids.index(booking_id)
+        del self.starts[position]
+        del self.ends[position]
+        del self.ids[position]
+        self._rebuild_max_ends(position)
+
+    def overlaps(self, start, end):
+        """Есть ли бронь, пересекающая [start, end)"""
+        # Кандидаты — брони, начавшиеся раньше end
+        position = bisect.bisect_left(self.starts, end)
+        return position > 0 and self.max_ends[position - 1] > start
+
+    def overlaps_except(self, start, end, booking_id):
+        """Есть ли пересекающая [start, end) бронь, кроме booking_id"""
+        if booking_id not in self.ids:
+            return self.overlaps(start, end)
+        return any(
+            other_start < end and other_end > start
+            for other_start, other_end, other_id in zip(self.starts, self.ends, self.ids)
+            if other_id != booking_id
+        )
+
+    def __len__(self):
+        return len(self.ids)
+
+
+class AvailabilityIndex:
+    """Занятость столиков по дням: {дата: {(зона, столик): TableIntervals}}"""
+
+    def __init__(self):
+        self._days = {}
+        # Растет при каждом изменении занятости: по нему сбрасываются кэши ответов
+        self.version = 0
+
+    def _load_day(self, date):
+        session = get_session()
+        try:
+            bookings = session.query(
+                Booking.id, Booking.zone, Booking.table_number, Booking.extra_tables,
+                Booking.time, Booking.duration, Booking.guests
+            ).filter(
+                Booking.date == date,
+                Booking.status.in_(ACTIVE_STATUSES)
+            ).all()
+        finally:
+            session.close()
+
+        day = {}
+        for booking in bookings:
+            try:
+                start, end = booking_interval(booking)
+            except ValueError:
+                logger.error(f"Некорректное время у брони #{booking.id}")
+                continue
+            for table_number in booking_tables(booking):
+                key = (booking.zone or 'main', table_number)
+                day.setdefault(key, TableIntervals()).add(start, end, booking.id)
+
+        self._prune()
+        self._days[date] = day
+        return day
+
+    def _prune(self):
+        """Забываем прошедшие дни"""
+        today = datetime.now().strftime('%Y-%m-%d')
+        for date in [date for date in self._days if date < today]:
+            del self._days[date]
+
+    def _day(self, date):
+        day = self._days.get(date)
+        if day is None:
+            day = self._load_day(date)
+        return day
+
+    def is_table_free(self, date, zone, table_number, start, end, ignore_booking=None):
+        """ignore_booking — id брони, которая сама занимает столик (подтверждение заявки)"""
+        intervals = self._day(date).get((zone, table_number))
+        if intervals is None:
+            return True
+        if ignore_booking is not None:
+            return not intervals.overlaps_except(start, end, ignore_booking)
+        return not intervals.overlaps(start, end)
+
+    def booked_tables(self, date, time, zone='main', duration=None):
+        """Столики, занятые хотя бы частично в интервале [time, time + duration)"""
+        start = time_to_minutes(time)
+        end = start + (duration or config.get_booking_duration(time=time))
+        day = self._day(date)
+        return [
+            table_number
+            for (table_zone, table_number), intervals in day.items()
+            if table_zone == zone and intervals.overlaps(start, end)
+        ]
+
+    def free_tables(self, date, time, zone='main', duration=None):
+        """Столики зоны, свободные весь интервал [time, time + duration)"""
+        start = time_to_minutes(time)
+        end = start + (duration or config.get_booking_duration(time=time))
+        day = self._day(date)
+        free = []
+        for table_number in config.TABLES.get(zone, []):
+            intervals = day.get((zone, table_number))
+            if intervals is None or not intervals.overlaps(start, end):
+                free.append(table_number)
+        return free
+
+    def add(self, booking):
+        self.version += 1
+        day = self._days.get(booking.date)
+        if day is None:
+            return  # День еще не загружен — загрузится из БД при обращении
+        start, end = booking_interval(booking)
+        for table_number in booking_tables(booking):
+            key = (booking.zone or 'main', table_number)
+            day.setdefault(key, TableIntervals()).add(start, end, booking.id)
+
+    def remove(self, booking):
+        self.version += 1
+        day = self._days.get(booking.date)
+        if day is None:
+            return
+        for table_number in booking_tables(booking):
+            intervals = day.get((booking.zone or 'main', table_number))
+            if intervals is not None:
+                intervals.remove(booking.id)
+
+    def invalidate(self, date=None):
+        """Сбросить индекс (после массовых изменений в БД)"""
+        self.version += 1
+        if date is None:
+            self._days.clear()
+        else:
+            self._days.pop(date, None)
+
+
+availability_index = AvailabilityIndex()
+
+
+@on(BOOKING_CREATED)
+@on(BOOKING_CONFIRMED)
+def _index_booking(booking):
+    availability_index.add(booking)
+
+
+@on(BOOKING_RELEASED)
+def _unindex_booking(booking):
+    availability_index.remove(booking)
@@ -0,0 +1,144 @@
+"""
+Снимок свободных столиков на весь горизонт бронирования
+Для каждого дня и слота хранится число свободных столиков, поэтому
+клавиатуры дат и времени строятся без обращения к индексу занятости.
+Снимок обновляется по событиям броней только для затронутых слотов,
+а в полночь сдвигается на день вперед. Сброшенный день горизонта
+досчитывается при первом обращении.
+"""
+import logging
+from datetime import datetime, timedelta
+
+from availability import availability_index, booking_interval, time_to_minutes
+from booking_events import on, BOOKING_CREATED, BOOKING_CONFIRMED, BOOKING_RELEASED
+from config import config
+from scheduler import scheduler
+from utils import generate_time_slots
+
+logger = logging.getLogger(__name__)
+
+SHIFT_JOB_KEY = "availability_snapshot:shift"
+
+
+class AvailabilitySnapshot:
+    """{(зона, дата): {время: свободных столиков}} на BOOKING_DAYS_AHEAD дней"""
+
+    def __init__(self):
+        self._counts = {}
+        self._first_day = None
+        self._slots = generate_time_slots()
+
+    def _horizon(self):
+        today = datetime.now().date()
+        return [
+            (today + timedelta(days=offset)).strftime('%Y-%m-%d')
+            for offset in range(config.BOOKING_DAYS_AHEAD)
+        ]
+
+    def _count_slot(self, zone, date, time):
+        return len(availability_index.free_tables(date, time, zone))
+
+    def _build_day(self, zone, date):
+        self._counts[(zone, date)] = {time: self._count_slot(zone, date, time) for time in self._slots}
+
+    def rebuild(self):
+        """Пересчитать снимок целиком"""
+        self._counts.clear()
+        horizon = self._horizon()
+        for zone in config.TABLES:
+            for date in horizon:
+                self._build_day(zone, date)
+        self._first_day = horizon[0]
+        logger.info(f"Снимок занятости построен на {len(horizon)} дн.")
+
+    def shift(self):
+        """Сдвинуть снимок: забыть прошедшие дни и досчитать новые"""
+        horizon = self._horizon()
+        for key in [key for key in self._counts if key[1] < horizon[0]]:
+            del self._counts[key]
+        for zone in config.TABLES:
+            for date in horizon:
+                if (zone, date) not in self._counts:
+                    self._build_day(zone, date)
+        self._first_day = horizon[0]
+
+    def _ensure_current(self):
+        if self._first_day != datetime.now().strftime('%Y-%m-%d'):
+            if self._first_day is None:
+                self.rebuild()
+            else:
+                self.shift()
+
+    def _day(self, zone, date):
+        self._ensure_current()
+        day = self._counts.get((zone, date))
+        if day is None and zone in config.TABLES and date in self._horizon():
+            self._build_day(zone, date)
+            day = self._counts[(zone, date)]
+        return day
+
+    def invalidate(self, date=None):
+        """Сбросить снимок дня или всего горизонта"""
+        if date is None:
+            self._counts.clear()
+        else:
+            for zone in config.TABLES:
+                self._counts.pop((zone, date), None)
+
+    def update(self, booking):
+        """Пересчитать слоты, которые пересекаются с бронью"""
+        if self._first_day is None:
+            return
+        zone = booking.zone or 'main'
+        day = self._counts.get((zone, booking.date))
+        if day is None:
+            return  # День вне горизонта
+
+        start, end = booking_interval(booking)
+        for time in self._slots:
+            slot_start = time_to_minutes(time)
+            # Бронь, начатая в слоте, длится не дольше MAX_BOOKING_DURATION
+            if start - config.MAX_BOOKING_DURATION < slot_start < end:
+                day[time] = self._count_slot(zone, booking.date, time)
+
+    def free_count(self, date, time, zone='main'):
+        """Свободных столиков в слоте"""
+        day = self._day(zone, date)
+        if day is None or time not in day:
+            return self._count_slot(zone, date, time)
+        return day[time]
+
+    def free_slots(self, date, zone='main'):
+        """Сколько слотов дня еще можно забронировать"""
+        day = self._day(zone, date)
+        if day is None:
+            return 0
+
+        min_minutes = -1
+        if date == datetime.now().strftime('%Y-%m-%d'):
+            now = datetime.now()
+            min_minutes = now.hour * 60 + now.minute
+        return sum(1 for time, free in day.items() if free and time_to_minutes(time) > min_minutes)
+
+    def start(self):
+        """Построить снимок и запланировать сдвиг в полночь"""
+        self.rebuild()
+        self._schedule_shift()
+
+    def _schedule_shift(self):
+        midnight = datetime.combine(datetime.now().date() + timedelta(days=1), datetime.min.time())
+        scheduler.schedule(SHIFT_JOB_KEY, midnight, self._midnight_shift)
+
+    def _midnight_shift(self):
+        self.shift()
+        self._schedule_shift()
+
+
+availability_snapshot = AvailabilitySnapshot()
+
+
+@on(BOOKING_CREATED)
+@on(BOOKING_CONFIRMED)
+@on(BOOKING_RELEASED)
+def _update_snapshot(booking):
+    availability_snapshot.update(booking)
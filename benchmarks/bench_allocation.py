@@ -0,0 +1,94 @@
+"""
+Бенчмарк подбора столиков
+Моделирует вечера с потоком компаний разного размера и сравнивает стратегии:
+  manual    — гость сам выбирает любой свободный столик, где хватает мест
+  first-fit — первый по номеру свободный столик, где хватает мест
+  best-fit  — TableAllocator: самая маленькая подходящая корзина
+
+Запуск из корня проекта:
+    python -m benchmarks.bench_allocation --evenings 500
+"""
+import argparse
+import random
+import statistics
+import time
+
+from allocation import TableAllocator
+from availability import TableIntervals
+from config import config
+
+# Распределение размеров компаний: (гостей, вес)
+PARTY_SIZES = [(1, 5), (2, 40), (3, 12), (4, 20), (5, 5), (6, 8), (7, 3), (8, 3), (9, 2), (10, 2)]
+EVENING_SLOTS = [17 * 60 + 30 * i for i in range(11)]  # 17:00 ... 22:00
+
+
+def simulate(strategy, evenings, parties_per_evening, seed):
+    rng = random.Random(seed)
+    sizes, weights = zip(*PARTY_SIZES)
+    allocator = TableAllocator(config.TABLE_LAYOUT)
+    tables = [(number, seats) for _, number, seats in config.TABLE_LAYOUT]
+
+    latencies = []
+    seated = rejected = 0
+    used_seat_minutes = guest_minutes = 0
+
+    for _ in range(evenings):
+        schedule = {number: TableIntervals() for number, _ in tables}
+        for booking_id in range(parties_per_evening):
+            guests = rng.choices(sizes, weights)[0]
+            start = rng.choice(EVENING_SLOTS)
+            duration = config.get_booking_duration(guests)
+            end = start + duration
+
+            def is_free(table_number):
+                return not schedule[table_number].overlaps(start, end)
+
+            started = time.perf_counter()
+            if strategy == "best-fit":
+                table = allocator.allocate(guests, is_free)
+            elif strategy == "first-fit":
+                table = next((n for n, seats in tables if seats >= guests and is_free(n)), None)
+            else:
+                fitting = [n for n, seats in tables if seats >= guests and is_free(n)]
+                table = rng.choice(fitting) if fitting else None
+            latencies.append(time.perf_counter() - started)
+
+            if table is None:
+                rejected += 1
+                continue
+
+            schedule[table].add(start, end, booking_id)
+            seated += 1
+            used_seat_minutes += config.TABLE_SEATS[table] * duration
+            guest_minutes += guests * duration
+
+    latencies.sort()
+    return {
+        "p50_us": latencies[len(latencies) // 2] * 1e6,
+        "p99_us": latencies[int(len(latencies) * 0.99)] * 1e6,
+        "mean_us": statistics.fmean(latencies) * 1e6,
+        "seated": seated,
+        "rejected": rejected,
+        "utilisation": guest_minutes / used_seat_minutes if used_seat_minutes else 0,
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Бенчмарк подбора столиков")
+    parser.add_argument("--evenings", type=int, default=200)
+    parser.add_argument("--parties", type=int, default=25, help="компаний за вечер")
+    parser.add_argument("--seed", type=int, default=42)
+    args = parser.parse_args()
+
+    print(f"\n{args.evenings} вечеров по {args.parties} компаний, столиков: {len(config.TABLE_LAYOUT)}\n")
+    print(f"{'стратегия':<10} {'p50, мкс':>9} {'p99, мкс':>9} {'посажено':>9} {'отказов':>8} {'загрузка мест':>14}")
+    for strategy in ("manual", "first-fit", "best-fit"):
+        result = simulate(strategy, args.evenings, args.parties, args.seed)
+        print(
+            f"{strategy:<10} {result['p50_us']:>9.2f} {result['p99_us']:>9.2f} "
+            f"{result['seated']:>9} {result['rejected']:>8} {result['utilisation']:>13.1%}"
+        )
+
+
+if __name__ == "__main__":
+    main()
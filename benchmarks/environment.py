@@ -0,0 +1,21 @@
+"""
+Окружение бенчмарков
+Бот создает базу и читает настройки при импорте, поэтому окружение
+готовится до него: временная база, фиктивный токен, без записи
+обновлений и без HTTP-портов.
+"""
+import os
+import tempfile
+
+
+def prepare_environment(name, admin_ids=None):
+    """Временная база name.db и переменные окружения. Возвращает каталог базы"""
+    database_dir = tempfile.mkdtemp(prefix=f"{name}_")
+    os.environ["DATABASE_URL"] = f"sqlite:///{os.path.join(database_dir, f'{name}.db')}"
+    os.environ.setdefault("BOT_TOKEN", f"123456:{name.upper()}")
+    os.environ.pop("RECORD_UPDATES", None)
+    os.environ.pop("API_PORT", None)
+    os.environ.pop("METRICS_PORT", None)
+    if admin_ids is not None:
+        os.environ["ADMIN_IDS"] = admin_ids
+    return database_dir
@@ -0,0 +1,79 @@
+"""
+Поддельный Bot API для бенчмарков
+Сессия aiogram, которая никуда не ходит: запоминает вызовы, ждет
+заданную задержку (как сеть до api.telegram.org) и возвращает
+правдоподобный ответ нужного типа.
+"""
+import asyncio
+import itertools
+import random
+from collections import Counter, defaultdict, namedtuple
+from datetime import datetime
+
+from aiogram.client.session.base import BaseSession
+from aiogram.types import Chat, Message, User
+
+# Исходящий вызов, который видит виртуальный гость
+Outgoing = namedtuple("Outgoing", ["method", "message_id", "text", "reply_markup"])
+
+
+def attach(bot, session):
+    """Подменить сессию бота, сохранив его middleware запросов (метрики, кэш хэшей правок)"""
+    for middleware in bot.session.middleware:
+        session.middleware(middleware)
+    bot.session = session
+
+
+class FakeTelegramSession(BaseSession):
+    """latency — средняя задержка ответа в секундах, jitter — разброс в долях от нее
+
+    track=True — складывать исходящие вызовы в outbox по chat_id (ответы на
+    нажатия — по id нажатия), чтобы генератор нагрузки читал клавиатуры.
+    """
+
+    def __init__(self, latency=0.0, jitter=0.2, seed=0, track=False):
+        super().__init__()
+        self.latency = latency
+        self.jitter = jitter
+        self.track = track
+        self.calls = Counter()
+        self.outbox = defaultdict(list)
+        self._rng = random.Random(seed)
+        self._message_ids = itertools.count(1_000_000)
+
+    async def make_request(self, bot, method, timeout=None):
+        method_name = type(method).__name__
+        self.calls[method_name] += 1
+        if self.latency:
+            spread = self.latency * self.jitter
+            await asyncio.sleep(max(0.0, self._rng.uniform(self.latency - spread, self.latency + spread)))
+
+        if self.track and hasattr(method, 'callback_query_id'):
+            self.outbox[method.callback_query_id].append(Outgoing(method_name, None, method.text, None))
+
+        returning = getattr(method, '__returning__', None)
+        if returning is Message or 'Message' in str(returning):
+            chat_id = getattr(method, 'chat_id', None) or 0
+            message_id = getattr(method, 'message_id', None) or next(self._message_ids)
+            text = getattr(method, 'text', None)
+            if self.track:
+                self.outbox[chat_id].append(Outgoing(method_name, message_id, text, getattr(method, 'reply_markup', None)))
+            return Message(
+                message_id=message_id,
+                date=datetime.now(),
+                chat=Chat(id=chat_id, type='private'),
+                text=text
+            ).as_(bot)
+        if returning is User:
+            return User(id=bot.id, is_bot=True, first_name="bench")
+        return True
+
+    async def stream_content(self, url, headers=None, timeout=30, chunk_size=65536, raise_for_status=True):
+        yield b''
+
+    async def close(self):
+        pass
+
+    @property
+    def total_calls(self):
+        return sum(self.calls.values())
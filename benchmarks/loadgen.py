@@ -0,0 +1,391 @@
+"""
+Синтетическая нагрузка: виртуальные гости бронируют столики одновременно
+Каждый гость проходит весь путь BookingStates через настоящий диспетчер:
+/start → «Забронировать столик» → дата → время → столик (или автоподбор) →
+количество гостей → имя → телефон → подтверждение. Кнопки гость берет из
+клавиатур, которые бот ему на самом деле прислал (FakeTelegramSession с
+track=True), паузы между шагами — логнормальные, как у живых людей.
+Выбор дат и времени смещен к «горячим» слотам (ближайшие дни, вечер),
+чтобы гости сталкивались за одни и те же столики.
+
+Запуск из корня проекта:
+    python -m benchmarks.loadgen --guests 500 --rate 20 --time-scale 0.05
+"""
+import argparse
+import asyncio
+import itertools
+import logging
+import math
+import random
+import shutil
+import sys
+import time
+from collections import Counter, defaultdict
+
+from benchmarks.environment import prepare_environment
+from benchmarks.replay import PERCENTILES, percentile
+
+# Медианы пауз перед шагом, в секундах живого времени
+THINK_TIMES = {
+    "start": 0.0,
+    "menu": 2.0,
+    "date": 4.0,
+    "time": 5.0,
+    "table": 6.0,
+    "guests": 3.0,
+    "name": 8.0,
+    "phone": 10.0,
+    "confirm": 5.0,
+}
+THINK_SIGMA = 0.6  # разброс логнормального распределения
+
+# Размер компании: количество -> доля гостей
+PARTY_SIZES = {2: 0.55, 4: 0.28, 6: 0.12, 8: 0.05}
+HOT_MINUTE = 19 * 60 + 30  # пик спроса — вечер
+AUTO_TABLE_SHARE = 0.5  # доля гостей, выбирающих автоподбор
+
+# Исходы сценария
+COMPLETED = "completed"
+CONFLICT = "conflict"  # столик заняли между выбором и подтверждением
+TABLE_TAKEN = "table_taken"  # столик заняли еще до подтверждения
+NO_SLOTS = "no_slots"  # подходящих дат, времени или столиков не осталось
+FAILED = "failed"  # бот ответил не тем, что ожидал сценарий
+ERROR = "error"  # исключение в обработчике
+
+PHONE_BASE = 79990000000
+
+
+def zipf_choice(rng, items, skew):
+    """Элемент списка с весом 1/(ранг+1)^skew: первые выбираются чаще"""
+    weights = [1 / (rank + 1) ** skew for rank in range(len(items))]
+    return rng.choices(items, weights=weights)[0]
+
+
+def think_time(rng, step, scale):
+    median = THINK_TIMES[step]
+    if not median or not scale:
+        return 0.0
+    return rng.lognormvariate(math.log(median), THINK_SIGMA) * scale
+
+
+def inline_buttons(markup, prefix):
+    """Кнопки клавиатуры с данным префиксом: [(текст, callback_data)]"""
+    if markup is None or not hasattr(markup, 'inline_keyboard'):
+        return []
+    return [
+        (button.text, button.callback_data)
+        for row in markup.inline_keyboard for button in row
+        if button.callback_data and button.callback_data.split(':')[0] == prefix
+    ]
+
+
+def button_seats(text):
+    """'🟢 5 (4👤)' -> 4"""
+    try:
+        return int(text.rsplit('(', 1)[1].split('👤')[0])
+    except (IndexError, ValueError):
+        return 0
+
+
+class LockMonitor:
+    """Время записи в SQLite и ошибки «database is locked»
+
+    Ожидание блокировки SQLite происходит внутри execute, поэтому долгие
+    INSERT/UPDATE/DELETE — это в основном ожидание чужой транзакции.
+    """
+
+    WRITE_STATEMENTS = ("INSERT", "UPDATE", "DELETE")
+
+    def __init__(self, engine, threshold):
+        from sqlalchemy import event
+
+        self.threshold = threshold
+        self.write_times = []
+        self.waits = 0
+        self.locked_errors = 0
+        event.listen(engine, "before_cursor_execute", self._before)
+        event.listen(engine, "after_cursor_execute", self._after)
+        event.listen(engine, "handle_error", self._error)
+
+    def _before(self, conn, cursor, statement, parameters, context, executemany):
+        conn.info['loadgen_started'] = time.perf_counter()
+
+    def _after(self, conn, cursor, statement, parameters, context, executemany):
+        started = conn.info.pop('loadgen_started', None)
+        if started is None or not statement.lstrip().upper().startswith(self.WRITE_STATEMENTS):
+            return
+        elapsed = time.perf_counter() - started
+        self.write_times.append(elapsed)
+        if elapsed >= self.threshold:
+            self.waits += 1
+
+    def _error(self, context):
+        if "database is locked" in str(context.original_exception):
+            self.locked_errors += 1
+
+
+class VirtualGuest:
+    """Один гость, проходящий сценарий бронирования"""
+
+    def __init__(self, runner, user_id, rng):
+        self.runner = runner
+        self.user_id = user_id
+        self.rng = rng
+        self.party = rng.choices(list(PARTY_SIZES), weights=list(PARTY_SIZES.values()))[0]
+        self.view_id = None  # сообщение с inline-клавиатурой, по которому гость нажимает
+
+    # ---------- Обновления ----------
+
+    def _user(self):
+        return {"id": self.user_id, "is_bot": False, "first_name": f"Гость {self.user_id}", "username": f"guest{self.user_id}"}
+
+    def _message(self, text):
+        return {
+            "update_id": next(self.runner.update_ids),
+            "message": {
+                "message_id": next(self.runner.message_ids),
+                "date": int(time.time()),
+                "chat": {"id": self.user_id, "type": "private"},
+                "from": self._user(),
+                "text": text,
+            },
+        }
+
+    def _callback(self, data):
+        return {
+            "update_id": next(self.runner.update_ids),
+            "callback_query": {
+                "id": f"{self.user_id}-{next(self.runner.update_ids)}",
+                "from": self._user(),
+                "chat_instance": str(self.user_id),
+                "data": data,
+                "message": {
+                    "message_id": self.view_id,
+                    "date": int(time.time()),
+                    "chat": {"id": self.user_id, "type": "private"},
+                    "from": {"id": self.runner.bot.id, "is_bot": True, "first_name": "bot"},
+                    "text": "view",
+                },
+            },
+        }
+
+    # ---------- Шаги ----------
+
+    async def step(self, name, update):
+        """Пауза «на подумать», затем обработка обновления с замером"""
+        await asyncio.sleep(think_time(self.rng, name, self.runner.args.time_scale))
+        sent_before = len(self.runner.session.outbox[self.user_id])
+        await self.runner.feed(name, update)
+        return self.runner.session.outbox[self.user_id][sent_before:]
+
+    def _last_view(self, sent):
+        """Последнее сообщение с inline-клавиатурой из ответов бота"""
+        for outgoing in reversed(sent):
+            if hasattr(outgoing.reply_markup, 'inline_keyboard'):
+                self.view_id = outgoing.message_id
+                return outgoing
+        return None
+
+    def _alert(self, update):
+        """Текст всплывающего ответа на нажатие, если бот отказал"""
+        answers = self.runner.session.outbox.pop(update["callback_query"]["id"], [])
+        for answer in answers:
+            if answer.text and answer.text.startswith("❌"):
+                return answer.text
+        return None
+
+    async def press(self, name, data):
+        update = self._callback(data)
+        sent = await self.step(name, update)
+        return sent, self._alert(update)
+
+    async def run(self):
+        skew = self.runner.args.skew
+
+        await self.step("start", self._message("/start"))
+        view = self._last_view(await self.step("menu", self._message("🎯 Забронировать столик")))
+        dates = inline_buttons(view and view.reply_markup, "d")
+        if not dates:
+            return NO_SLOTS
+
+        # Ближайшие дни популярнее: клавиатура уже отсортирована по дате
+        _, date_data = zipf_choice(self.rng, dates, skew)
+        sent, _ = await self.press("date", date_data)
+        view = self._last_view(sent)
+        times = inline_buttons(view and view.reply_markup, "t")
+        if not times:
+            return NO_SLOTS
+
+        # Время ранжируем по удаленности от вечернего пика
+        times.sort(key=lambda button: abs(int(button[1].split(':')[1]) - HOT_MINUTE))
+        _, time_data = zipf_choice(self.rng, times, skew)
+        sent, _ = await self.press("time", time_data)
+        view = self._last_view(sent)
+
+        tables = [
+            button for button in inline_buttons(view and view.reply_markup, "tb")
+            if button_seats(button[0]) >= self.party
+        ]
+        if tables and self.rng.random() >= AUTO_TABLE_SHARE:
+            _, table_data = self.rng.choice(tables)
+        elif inline_buttons(view and view.reply_markup, "at"):
+            table_data = "at"
+        else:
+            return NO_SLOTS
+        sent, alert = await self.press("table", table_data)
+        if alert:
+            return TABLE_TAKEN
+        self._last_view(sent)
+
+        if self.party > 6:
+            sent, _ = await self.press("guests", "gm")
+            self._last_view(sent)
+        sent, alert = await self.press("guests", f"g:{self.party}")
+        if alert:
+            return TABLE_TAKEN if "занят" in alert else NO_SLOTS
+
+        await self.step("name", self._message(f"Гость {self.user_id}"))
+        sent = await self.step("phone", self._message(f"+{PHONE_BASE + self.user_id}"))
+        if not self._last_view(sent):
+            return FAILED
+
+        sent, alert = await self.press("confirm", "cf")
+        if any(outgoing.text and "ОФОРМЛЕНО" in outgoing.text for outgoing in sent):
+            return COMPLETED
+        if alert:
+            return CONFLICT
+        return FAILED
+
+
+class LoadRunner:
+    def __init__(self, args, bot, dp, session):
+        self.args = args
+        self.bot = bot
+        self.dp = dp
+        self.session = session
+        self.update_ids = itertools.count(1)
+        self.message_ids = itertools.count(1)
+        self.latencies = defaultdict(list)
+        self.errors = Counter()
+        self.outcomes = Counter()
+
+    async def feed(self, step, data):
+        from aiogram.types import Update
+
+        update = Update.model_validate(data, context={"bot": self.bot})
+        started = time.perf_counter()
+        try:
+            await self.dp.feed_update(self.bot, update)
+        except Exception as e:
+            self.errors[step] += 1
+            if self.args.verbose:
+                print(f"Ошибка на шаге {step}: {e!r}", file=sys.stderr)
+            raise
+        finally:
+            self.latencies[step].append(time.perf_counter() - started)
+
+    async def guest(self, user_id, rng):
+        try:
+            outcome = await VirtualGuest(self, user_id, rng).run()
+        except Exception:
+            outcome = ERROR
+        self.outcomes[outcome] += 1
+        # Ответы бота гостю больше не нужны
+        self.session.outbox.pop(user_id, None)
+
+
+async def load(args):
+    # Импорт после подготовки окружения: база и бот создаются при импорте
+    import bot as bot_module
+    from benchmarks.fake_telegram import FakeTelegramSession, attach
+    from database import engine
+    from scheduler import scheduler
+    from sender import sender
+
+    if not args.verbose:
+        logging.getLogger().setLevel(logging.WARNING)
+
+    bot, dp = bot_module.bot, bot_module.dp
+    session = FakeTelegramSession(latency=args.latency / 1000, seed=args.seed, track=True)
+    attach(bot, session)
+    locks = LockMonitor(engine, args.lock_threshold / 1000)
+    runner = LoadRunner(args, bot, dp, session)
+
+    background = [asyncio.create_task(scheduler.run()), asyncio.create_task(sender.run(bot))]
+
+    # Пуассоновский поток гостей с интенсивностью --rate в секунду
+    rng = random.Random(args.seed)
+    started_at = time.perf_counter()
+    tasks = []
+    for number in range(args.guests):
+        if args.rate > 0:
+            await asyncio.sleep(rng.expovariate(args.rate))
+        tasks.append(asyncio.create_task(runner.guest(args.first_user_id + number, random.Random(rng.random()))))
+    await asyncio.gather(*tasks)
+    elapsed = time.perf_counter() - started_at
+    queue_left = sender.queue_depth
+
+    for task in background:
+        task.cancel()
+
+    report(runner, locks, session, elapsed, queue_left, args)
+
+
+def report(runner, locks, session, elapsed, queue_left, args):
+    outcomes = runner.outcomes
+    completed = outcomes[COMPLETED]
+    confirm_attempts = completed + outcomes[CONFLICT]
+
+    print(f"\nГостей: {args.guests}, поток {args.rate:g}/с, паузы x{args.time_scale:g}, "
+          f"перекос {args.skew:g}, задержка API {args.latency:g} мс")
+    print(f"Прогон занял {elapsed:.2f} с: {completed / elapsed if elapsed else 0:.1f} оформленных броней/с")
+    print(f"Конфликтов при подтверждении: {outcomes[CONFLICT]} из {confirm_attempts} "
+          f"({outcomes[CONFLICT] / confirm_attempts if confirm_attempts else 0:.1%})")
+
+    print("\nИсходы:")
+    for outcome in (COMPLETED, CONFLICT, TABLE_TAKEN, NO_SLOTS, FAILED, ERROR):
+        print(f"  {outcome:<14} {outcomes[outcome]:>6}")
+
+    write_times = sorted(locks.write_times)
+    print(f"\nЗаписей в БД: {len(write_times)}, " + ", ".join(
+        f"p{int(fraction * 100)} {percentile(write_times, fraction) * 1000:.2f}" for fraction in PERCENTILES
+    ) + " мс")
+    print(f"Ожиданий блокировки (запись дольше {args.lock_threshold:g} мс): {locks.waits}, "
+          f"ошибок «database is locked»: {locks.locked_errors}")
+
+    print(f"\n{'шаг':<10} {'число':>6} {'p50, мс':>8} {'p95, мс':>8} {'p99, мс':>8} {'ошибок':>7}")
+    for step in THINK_TIMES:
+        values = sorted(runner.latencies.get(step, []))
+        if not values:
+            continue
+        print(
+            f"{step:<10} {len(values):>6} {percentile(values, 0.50) * 1000:>8.1f} "
+            f"{percentile(values, 0.95) * 1000:>8.1f} {percentile(values, 0.99) * 1000:>8.1f} {runner.errors[step]:>7}"
+        )
+
+    print(f"\nВызовов Bot API: {session.total_calls}, в очереди рассылки осталось: {queue_left}")
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Синтетическая нагрузка: гости бронируют столики одновременно")
+    parser.add_argument("--guests", type=int, default=300, help="сколько гостей пройдет сценарий")
+    parser.add_argument("--rate", type=float, default=20.0, help="новых гостей в секунду (0 — все сразу)")
+    parser.add_argument("--time-scale", type=float, default=0.05, help="множитель пауз между шагами (0 — без пауз)")
+    parser.add_argument("--skew", type=float, default=1.2, help="перекос спроса к ближайшим дням и вечеру")
+    parser.add_argument("--latency", type=float, default=50.0, help="средняя задержка Bot API, мс")
+    parser.add_argument("--lock-threshold", type=float, default=20.0, help="запись дольше, мс, считается ожиданием блокировки")
+    parser.add_argument("--admin-ids", default="1", help="ADMIN_IDS на время прогона")
+    parser.add_argument("--first-user-id", type=int, default=100000)
+    parser.add_argument("--seed", type=int, default=42)
+    parser.add_argument("--verbose", action="store_true", help="логи бота и ошибки обработчиков")
+    args = parser.parse_args()
+
+    database_dir = prepare_environment("loadgen", args.admin_ids)
+    try:
+        asyncio.run(load(args))
+    finally:
+        shutil.rmtree(database_dir, ignore_errors=True)
+
+
+if __name__ == "__main__":
+    main()
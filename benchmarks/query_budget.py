@@ -0,0 +1,224 @@
+"""
+Бюджет SQL-запросов на основном пути бронирования
+Один гость проходит бронирование через настоящий диспетчер (временная
+база с заполненным залом, Bot API подменен), каждый шаг выполняется
+внутри query_profiler.query_budget. Если шаг сделал больше запросов, чем
+указано в BUDGETS, скрипт печатает самые частые запросы и завершается
+с кодом 1 — так регрессию вроде N+1 ловит CI (tests/test_query_budget.py).
+
+Сначала второй гость нажимает дату и время на дне, которого нет ни в
+индексе занятости, ни в снимке: холодный день догружается с нуля, и
+запрос на каждый слот или столик здесь сразу виден.
+
+Запуск из корня проекта:
+    python -m benchmarks.query_budget
+"""
+import argparse
+import asyncio
+import logging
+import random
+import shutil
+import sys
+from datetime import datetime, timedelta
+
+from benchmarks.environment import prepare_environment
+from benchmarks.loadgen import inline_buttons
+
+# Шаг -> не больше запросов к БД. Клавиатуры дат, времени и столиков
+# строятся по индексу занятости и снимку — запросов на слот быть не должно
+BUDGETS = {
+    "cold date": 1,
+    "cold time": 1,
+    "start": 3,
+    "menu": 1,
+    "date": 1,
+    "time": 1,
+    "table": 1,
+    "guests": 1,
+    "name": 0,
+    "phone": 2,
+    "confirm": 4,
+}
+SEED_BOOKINGS = 200  # броней в зале на ближайшие дни
+
+
+def seed_bookings(count, rng):
+    """Заполнить зал бронями на ближайшие дни, минуя бота"""
+    from config import config
+    from database import get_session, Booking
+    from utils import generate_time_slots
+
+    slots = generate_time_slots()
+    tables = config.TABLES['main']
+    session = get_session()
+    try:
+        for number in range(count):
+            day = datetime.now() + timedelta(days=rng.randint(1, config.BOOKING_DAYS_AHEAD - 1))
+            guests = rng.choice((2, 2, 4, 6))
+            time = rng.choice(slots)
+            session.add(Booking(
+                user_id=900000 + number,
+                username=f"seed{number}",
+                full_name=f"Гость {number}",
+                phone=f"+7999{number:07d}",
+                zone='main',
+                table_number=rng.choice(tables),
+                date=day.strftime('%Y-%m-%d'),
+                time=time,
+                duration=config.get_booking_duration(guests, time),
+                guests=guests,
+                status=rng.choice(('pending', 'confirmed')),
+            ))
+        session.commit()
+    finally:
+        session.close()
+
+
+class Guest:
+    """Гость, нажимающий кнопки из ответов бота"""
+
+    def __init__(self, bot, dp, session, user_id):
+        self.bot = bot
+        self.dp = dp
+        self.session = session
+        self.user_id = user_id
+        self.view_id = None
+        self.update_ids = iter(range(1, 10 ** 9))
+
+    def _user(self):
+        return {"id": self.user_id, "is_bot": False, "first_name": "Гость", "username": f"guest{self.user_id}"}
+
+    def _chat(self):
+        return {"id": self.user_id, "type": "private"}
+
+    async def feed(self, data):
+        from aiogram.types import Update
+
+        sent_before = len(self.session.outbox[self.user_id])
+        data["update_id"] = next(self.update_ids)
+        await self.dp.feed_update(self.bot, Update.model_validate(data, context={"bot": self.bot}))
+        sent = self.session.outbox[self.user_id][sent_before:]
+        for outgoing in reversed(sent):
+            if hasattr(outgoing.reply_markup, 'inline_keyboard'):
+                self.view_id = outgoing.message_id
+                return outgoing.reply_markup
+        return None
+
+    async def send(self, text):
+        return await self.feed({"message": {
+            "message_id": next(self.update_ids), "date": int(datetime.now().timestamp()),
+            "chat": self._chat(), "from": self._user(), "text": text,
+        }})
+
+    async def press(self, callback_data):
+        return await self.feed({"callback_query": {
+            "id": str(next(self.update_ids)), "from": self._user(), "chat_instance": "budget", "data": callback_data,
+            "message": {
+                "message_id": self.view_id, "date": int(datetime.now().timestamp()), "chat": self._chat(),
+                "from": {"id": self.bot.id, "is_bot": True, "first_name": "bot"}, "text": "view",
+            },
+        }})
+
+
+async def check(args):
+    # Импорт после подготовки окружения: база и бот создаются при импорте
+    import bot as bot_module
+    from availability import availability_index
+    from availability_snapshot import availability_snapshot
+    from benchmarks.fake_telegram import FakeTelegramSession, attach
+    from callbacks import DateCallback
+    from query_profiler import query_budget, QueryBudgetExceeded
+
+    if not args.verbose:
+        logging.getLogger().setLevel(logging.ERROR)
+
+    seed_bookings(args.seed_bookings, random.Random(args.seed))
+    availability_index.invalidate()
+    availability_snapshot.rebuild()
+
+    bot, dp = bot_module.bot, bot_module.dp
+    session = FakeTelegramSession(track=True)
+    attach(bot, session)
+
+    results = []
+
+    async def step(name, action):
+        try:
+            with query_budget(BUDGETS[name], label=f"шаг {name}") as profile:
+                markup = await action
+        except QueryBudgetExceeded as e:
+            results.append((name, None, str(e)))
+            return None
+        results.append((name, profile.queries, None))
+        return markup
+
+    # Холодный проход: день сброшен из индекса и снимка перед каждым нажатием
+    cold_guest = Guest(bot, dp, session, user_id=101)
+    await cold_guest.send("/start")
+    markup = await cold_guest.send("🎯 Забронировать столик")
+    dates = inline_buttons(markup, "d")
+    if dates:
+        day = dates[-1][1]
+        cold_day = DateCallback.unpack(day).date
+        availability_index.invalidate(cold_day)
+        availability_snapshot.invalidate(cold_day)
+        markup = await step("cold date", cold_guest.press(day))
+        times = inline_buttons(markup, "t")
+        if times:
+            availability_index.invalidate(cold_day)
+            await step("cold time", cold_guest.press(times[len(times) // 2][1]))
+
+    guest = Guest(bot, dp, session, user_id=100)
+    await step("start", guest.send("/start"))
+    markup = await step("menu", guest.send("🎯 Забронировать столик"))
+    dates = inline_buttons(markup, "d")
+    # Завтрашний день: на нем есть и брони, и свободные столики
+    markup = await step("date", guest.press(dates[min(1, len(dates) - 1)][1])) if dates else None
+    times = inline_buttons(markup, "t")
+    markup = await step("time", guest.press(times[len(times) // 2][1])) if times else None
+    table = "at" if inline_buttons(markup, "at") else None
+    if table:
+        await step("table", guest.press(table))
+        await step("guests", guest.press("g:2"))
+        await step("name", guest.send("Гость"))
+        await step("phone", guest.send("+79990000100"))
+        await step("confirm", guest.press("cf"))
+
+    print(f"\n{'шаг':<10} {'запросов':>9} {'бюджет':>7}")
+    failed = False
+    for name, queries, error in results:
+        if error:
+            failed = True
+            print(f"{name:<10} {'—':>9} {BUDGETS[name]:>7}  ПРЕВЫШЕН\n{error}")
+        else:
+            print(f"{name:<10} {queries:>9} {BUDGETS[name]:>7}")
+
+    missing = [name for name in BUDGETS if name not in {result[0] for result in results}]
+    if missing:
+        failed = True
+        print(f"\nСценарий не дошел до шагов: {', '.join(missing)}")
+    return 1 if failed else 0
+
+
+def parse_args(argv=None):
+    parser = argparse.ArgumentParser(description="Проверка бюджета SQL-запросов на пути бронирования")
+    parser.add_argument("--seed-bookings", type=int, default=SEED_BOOKINGS, help="броней в зале перед проверкой")
+    parser.add_argument("--admin-ids", default="1", help="ADMIN_IDS на время проверки")
+    parser.add_argument("--seed", type=int, default=42)
+    parser.add_argument("--verbose", action="store_true", help="логи бота")
+    return parser.parse_args(argv)
+
+
+def main():
+    args = parse_args()
+
+    database_dir = prepare_environment("query_budget", args.admin_ids)
+    try:
+        exit_code = asyncio.run(check(args))
+    finally:
+        shutil.rmtree(database_dir, ignore_errors=True)
+    sys.exit(exit_code)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,193 @@
+"""
+Воспроизведение записанного трафика через настоящий диспетчер
+Обновления из JSONL (записывает middlewares.UpdateRecorder, если задан
+RECORD_UPDATES) подаются в dp бота с исходными интервалами, ускоренными
+в --speed раз. Bot API подменен FakeTelegramSession с задержкой --latency,
+база — временная, так что рабочие данные не трогаются.
+
+Запуск из корня проекта:
+    RECORD_UPDATES=data/updates.jsonl python bot.py   # записать трафик
+    python -m benchmarks.replay data/updates.jsonl --speed 20 --latency 40
+"""
+import argparse
+import asyncio
+import json
+import logging
+import re
+import shutil
+import statistics
+import sys
+import time
+from collections import defaultdict
+from datetime import datetime, timedelta
+
+from benchmarks.environment import prepare_environment
+
+PERCENTILES = (0.50, 0.95, 0.99)
+DRAIN_TIMEOUT = 30  # секунд ждем, пока очередь рассылки опустеет
+
+
+def percentile(sorted_values, fraction):
+    if not sorted_values:
+        return 0.0
+    return sorted_values[min(len(sorted_values) - 1, int(len(sorted_values) * fraction))]
+
+
+def load_records(path):
+    records = []
+    with open(path, encoding='utf-8') as file:
+        for line in file:
+            if line.strip():
+                records.append(json.loads(line))
+    records.sort(key=lambda record: record["ts"])
+    return records
+
+
+_PACKED_DATE = re.compile(r"(?<=:)(\d{8})(?=:|$)")
+
+
+def shift_callback_dates(data, days):
+    """Сдвинуть упакованные даты ('d:20261020') в данных кнопок на days дней"""
+    def shift(match):
+        try:
+            day = datetime.strptime(match.group(1), '%Y%m%d') + timedelta(days=days)
+        except ValueError:
+            return match.group(1)
+        return day.strftime('%Y%m%d')
+    return _PACKED_DATE.sub(shift, data)
+
+
+def update_label(update):
+    """Группа обновления для отчета: команда, префикс кнопки и т.п."""
+    if update.message:
+        text = update.message.text or ''
+        if text.startswith('/'):
+            return f"command {text.split()[0]}"
+        if update.message.contact:
+            return "message contact"
+        if update.message.document:
+            return "message document"
+        return "message text"
+    if update.callback_query:
+        return f"callback {(update.callback_query.data or '').split(':')[0]}"
+    return update.event_type
+
+
+async def replay(args):
+    # Импорт после подготовки окружения: база и бот создаются при импорте
+    from aiogram.types import Update
+
+    import bot as bot_module
+    from benchmarks.fake_telegram import FakeTelegramSession, attach
+    from scheduler import scheduler
+    from sender import sender
+
+    if not args.verbose:
+        logging.getLogger().setLevel(logging.WARNING)
+
+    records = load_records(args.updates)
+    if not records:
+        print("Нет обновлений для воспроизведения")
+        return
+
+    bot, dp = bot_module.bot, bot_module.dp
+    session = FakeTelegramSession(latency=args.latency / 1000, seed=args.seed)
+    attach(bot, session)
+
+    # Даты в кнопках сдвигаем на сегодня, иначе старый трафик упрется в «прошедшую дату»
+    shift_days = 0
+    if not args.no_shift:
+        shift_days = (datetime.now().date() - datetime.fromtimestamp(records[0]["ts"]).date()).days
+
+    background = [asyncio.create_task(scheduler.run()), asyncio.create_task(sender.run(bot))]
+
+    latencies = defaultdict(list)
+    errors = defaultdict(int)
+
+    async def handle(update):
+        label = update_label(update)
+        started = time.perf_counter()
+        try:
+            await dp.feed_update(bot, update)
+        except Exception as e:
+            errors[label] += 1
+            if args.verbose:
+                print(f"Ошибка в {label}: {e!r}", file=sys.stderr)
+        latencies[label].append(time.perf_counter() - started)
+
+    loop = asyncio.get_running_loop()
+    first_ts = records[0]["ts"]
+    started_at = loop.time()
+    tasks = []
+    for record in records:
+        if args.speed > 0:
+            delay = started_at + (record["ts"] - first_ts) / args.speed - loop.time()
+            if delay > 0:
+                await asyncio.sleep(delay)
+
+        data = record["update"]
+        callback_query = data.get("callback_query")
+        if shift_days and callback_query and callback_query.get("data"):
+            callback_query["data"] = shift_callback_dates(callback_query["data"], shift_days)
+        update = Update.model_validate(data, context={"bot": bot})
+        tasks.append(asyncio.create_task(handle(update)))
+
+    await asyncio.gather(*tasks)
+    handled_at = loop.time()
+
+    # Дожидаемся рассылок из очереди: они тоже часть нагрузки
+    drain_deadline = handled_at + DRAIN_TIMEOUT
+    while sender.queue_depth and loop.time() < drain_deadline:
+        await asyncio.sleep(0.05)
+
+    for task in background:
+        task.cancel()
+
+    report(records, latencies, errors, session, handled_at - started_at, args)
+
+
+def report(records, latencies, errors, session, elapsed, args):
+    all_latencies = sorted(value for values in latencies.values() for value in values)
+    recorded_span = records[-1]["ts"] - records[0]["ts"]
+
+    print(f"\nОбновлений: {len(records)}, записано за {recorded_span:.1f} с, "
+          f"скорость x{args.speed:g}, задержка API {args.latency:g} мс")
+    print(f"Обработано за {elapsed:.2f} с: {len(records) / elapsed if elapsed else 0:.1f} обн/с, "
+          f"ошибок: {sum(errors.values())}")
+    print(f"Задержка обработчика, мс: " + ", ".join(
+        f"p{int(fraction * 100)} {percentile(all_latencies, fraction) * 1000:.1f}" for fraction in PERCENTILES
+    ) + f", среднее {statistics.fmean(all_latencies) * 1000:.1f}")
+
+    print(f"\n{'группа':<28} {'число':>6} {'p50, мс':>8} {'p95, мс':>8} {'p99, мс':>8} {'ошибок':>7}")
+    for label, values in sorted(latencies.items(), key=lambda item: -len(item[1])):
+        values.sort()
+        print(
+            f"{label:<28} {len(values):>6} {percentile(values, 0.50) * 1000:>8.1f} "
+            f"{percentile(values, 0.95) * 1000:>8.1f} {percentile(values, 0.99) * 1000:>8.1f} {errors[label]:>7}"
+        )
+
+    print(f"\nВызовов Bot API: {session.total_calls} ({session.total_calls / len(records):.2f} на обновление)")
+    for method, count in session.calls.most_common():
+        print(f"  {method:<26} {count:>6}")
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Воспроизведение записанных обновлений через диспетчер бота")
+    parser.add_argument("updates", help="JSONL, записанный UpdateRecorder")
+    parser.add_argument("--speed", type=float, default=1.0, help="во сколько раз быстрее записи (0 — без пауз)")
+    parser.add_argument("--latency", type=float, default=50.0, help="средняя задержка Bot API, мс")
+    parser.add_argument("--admin-ids", help="ADMIN_IDS для воспроизведения (по умолчанию из окружения)")
+    parser.add_argument("--no-shift", action="store_true", help="не сдвигать даты в кнопках на сегодня")
+    parser.add_argument("--seed", type=int, default=42)
+    parser.add_argument("--verbose", action="store_true", help="логи бота и ошибки обработчиков")
+    args = parser.parse_args()
+
+    database_dir = prepare_environment("replay", args.admin_ids)
+    try:
+        asyncio.run(replay(args))
+    finally:
+        shutil.rmtree(database_dir, ignore_errors=True)
+
+
+if __name__ == "__main__":
+    main()
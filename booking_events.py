@@ -0,0 +1,69 @@
+"""
+События изменения бронирований
+Обработчики бота сообщают сюда о каждом изменении брони,
+а планировщик и другие подсистемы подписываются на нужные события.
+"""
+import asyncio
+import logging
+from collections import namedtuple
+
+logger = logging.getLogger(__name__)
+
+BOOKING_CREATED = "created"      # новая бронь заняла столик
+BOOKING_CONFIRMED = "confirmed"  # администратор подтвердил бронь
+BOOKING_RELEASED = "released"    # бронь отменена или удалена, столик свободен
+
+# Снимок брони, не привязанный к сессии SQLAlchemy
+BookingSnapshot = namedtuple(
+    "BookingSnapshot",
+    ["id", "user_id", "zone", "table_number", "extra_tables", "date", "time", "duration", "guests", "status"]
+)
+
+_subscribers = {
+    BOOKING_CREATED: [],
+    BOOKING_CONFIRMED: [],
+    BOOKING_RELEASED: [],
+}
+
+
+def snapshot(booking):
+    """Снимок брони для передачи подписчикам"""
+    if isinstance(booking, BookingSnapshot):
+        return booking
+    return BookingSnapshot(
+        id=booking.id,
+        user_id=booking.user_id,
+        zone=booking.zone,
+        table_number=booking.table_number,
+        extra_tables=booking.extra_tables,
+        date=booking.date,
+        time=booking.time,
+        duration=booking.duration,
+        guests=booking.guests,
+        status=booking.status
+    )
+
+
+def subscribe(event, handler):
+    """Подписать обработчик (обычную или async-функцию) на событие"""
+    _subscribers[event].append(handler)
+    return handler
+
+
+def on(event):
+    """Декоратор для подписки на событие"""
+    def decorator(handler):
+        return subscribe(event, handler)
+    return decorator
+
+
+async def emit(event, booking):
+    """Сообщить подписчикам о событии"""
+    booking_snapshot = snapshot(booking)
+    for handler in list(_subscribers[event]):
+        try:
+            result = handler(booking_snapshot)
+            if asyncio.iscoroutine(result):
+                await result
+        except Exception as e:
+            logger.error(f"Ошибка в обработчике события {event} для брони #{booking_snapshot.id}: {e}")
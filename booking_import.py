@@ -0,0 +1,213 @@
+"""
+Массовый импорт броней из CSV (телефонные брони, гости без Telegram)
+Каждая строка проверяется теми же правилами, что и бронь из бота,
+занятость проверяется за один проход по индексу с учетом строк самого
+файла, а принятые брони записываются пачками по BATCH_SIZE.
+"""
+import csv
+import io
+import logging
+from collections import namedtuple
+from datetime import datetime
+
+from allocation import table_allocator, table_combiner
+from availability import availability_index, TableIntervals, time_to_minutes
+from booking_events import emit, snapshot, BOOKING_CREATED
+from config import config
+from database import get_session, Booking
+from utils import format_tables, validate_date, validate_time
+
+logger = logging.getLogger(__name__)
+
+REQUIRED_COLUMNS = ('date', 'time', 'guests', 'full_name', 'phone')
+OPTIONAL_COLUMNS = ('table', 'zone', 'status')
+IMPORT_STATUSES = ('pending', 'confirmed')
+BATCH_SIZE = 500
+MAX_ROWS = 20000
+
+ACCEPTED = "accepted"
+CONFLICT = "conflict"
+INVALID = "invalid"
+
+ImportResult = namedtuple("ImportResult", ["line", "result", "booking_id", "message"])
+
+
+def _normalize_date(value):
+    for date_format in ('%Y-%m-%d', '%d.%m.%Y'):
+        try:
+            return datetime.strptime(value, date_format).strftime('%Y-%m-%d')
+        except ValueError:
+            continue
+    return value
+
+
+def _normalize_time(value):
+    try:
+        return datetime.strptime(value, '%H:%M').strftime('%H:%M')
+    except ValueError:
+        return value
+
+
+def read_rows(text):
+    """CSV -> [(номер строки, {колонка: значение})]. Без нужных колонок — ValueError"""
+    sample = text[:4096]
+    try:
+        dialect = csv.Sniffer().sniff(sample, delimiters=',;\t')
+    except csv.Error:
+        dialect = csv.excel
+
+    reader = csv.DictReader(io.StringIO(text), dialect=dialect)
+    columns = [(name or '').strip().lower() for name in reader.fieldnames or []]
+    missing = [name for name in REQUIRED_COLUMNS if name not in columns]
+    if missing:
+        raise ValueError(f"Нет колонок: {', '.join(missing)}")
+    reader.fieldnames = columns
+
+    rows = []
+    for row in reader:
+        if len(rows) >= MAX_ROWS:
+            raise ValueError(f"Слишком много строк: не больше {MAX_ROWS} за раз")
+        values = {name: (value or '').strip() for name, value in row.items() if name}
+        if any(values.values()):
+            rows.append((reader.line_num, values))
+    return rows
+
+
+class ImportPlanner:
+    """Проверка строк и выбор столиков с учетом уже принятых строк файла"""
+
+    def __init__(self):
+        self._planned = {}  # (зона, дата, столик) -> TableIntervals принятых строк
+
+    def _is_free(self, zone, date, table_number, start, end):
+        if not availability_index.is_table_free(date, zone, table_number, start, end):
+            return False
+        planned = self._planned.get((zone, date, table_number))
+        return planned is None or not planned.overlaps(start, end)
+
+    def _combine(self, guests, zone, date, start, end, must_include=None):
+        """Сочетание соседних свободных столиков, как в боте, или None"""
+        free_tables = [number for number in config.TABLES[zone] if self._is_free(zone, date, number, start, end)]
+        return table_combiner.find(guests, free_tables, zone, must_include)
+
+    def plan(self, line, row):
+        """Бронь для вставки или ImportResult с причиной отказа"""
+        date = _normalize_date(row['date'])
+        time = _normalize_time(row['time'])
+        zone = row.get('zone') or 'main'
+        status = (row.get('status') or 'confirmed').lower()
+
+        valid, msg = validate_date(date)
+        if not valid:
+            return ImportResult(line, INVALID, None, msg)
+        valid, msg = validate_time(time, date)
+        if not valid:
+            return ImportResult(line, INVALID, None, msg)
+
+        try:
+            guests = int(row['guests'])
+        except ValueError:
+            return ImportResult(line, INVALID, None, "Количество гостей — не число")
+        if guests < 1:
+            return ImportResult(line, INVALID, None, "Количество гостей должно быть больше нуля")
+
+        if zone not in config.TABLES:
+            return ImportResult(line, INVALID, None, f"Нет зоны {zone}")
+        if status not in IMPORT_STATUSES:
+            return ImportResult(line, INVALID, None, f"Статус должен быть одним из: {', '.join(IMPORT_STATUSES)}")
+        if len(row['full_name']) < 2 or not row['phone']:
+            return ImportResult(line, INVALID, None, "Нужны имя и телефон")
+
+        duration = config.get_booking_duration(guests, time)
+        start = time_to_minutes(time)
+        end = start + duration
+
+        if row.get('table'):
+            try:
+                table_number = int(row['table'])
+            except ValueError:
+                return ImportResult(line, INVALID, None, "Номер столика — не число")
+            if table_number not in config.TABLES[zone]:
+                return ImportResult(line, INVALID, None, f"Нет столика №{table_number}")
+            if not self._is_free(zone, date, table_number, start, end):
+                return ImportResult(line, CONFLICT, None, f"Столик №{table_number} занят на {date} {time}")
+            tables = [table_number]
+            if config.TABLE_SEATS.get(table_number, config.MAX_GUESTS) < guests:
+                # Столик мал — сдвигаем к нему соседние
+                tables = self._combine(guests, zone, date, start, end, must_include=table_number)
+                if tables is None:
+                    return ImportResult(
+                        line, CONFLICT, None, f"Столик №{table_number} меньше компании, а соседние заняты"
+                    )
+        else:
+            table_number = table_allocator.allocate(
+                guests, lambda number: self._is_free(zone, date, number, start, end), zone
+            )
+            tables = [table_number] if table_number is not None else self._combine(guests, zone, date, start, end)
+            if tables is None:
+                return ImportResult(line, CONFLICT, None, f"Нет свободного столика на {date} {time}")
+
+        # Столик из файла идет первым: остальные — сдвинутые к нему
+        tables.sort(key=lambda number: number != table_number)
+        for number in tables:
+            self._planned.setdefault((zone, date, number), TableIntervals()).add(start, end, -line)
+        return Booking(
+            full_name=row['full_name'],
+            phone=row['phone'],
+            zone=zone,
+            table_number=tables[0],
+            extra_tables=",".join(str(number) for number in tables[1:]) or None,
+            date=date,
+            time=time,
+            duration=duration,
+            guests=guests,
+            status=status
+        )
+
+
+async def import_bookings(text):
+    """Импортировать CSV. Возвращает отчет [ImportResult] в порядке строк"""
+    rows = read_rows(text)
+    planner = ImportPlanner()
+
+    report = []
+    accepted = []  # (номер строки, Booking)
+    for line, row in rows:
+        result = planner.plan(line, row)
+        if isinstance(result, Booking):
+            accepted.append((line, result))
+        else:
+            report.append(result)
+
+    session = get_session()
+    try:
+        for batch_start in range(0, len(accepted), BATCH_SIZE):
+            batch = accepted[batch_start:batch_start + BATCH_SIZE]
+            session.add_all([booking for _, booking in batch])
+            session.flush()
+            # Снимки до commit: после него атрибуты пришлось бы перечитывать из БД
+            created = [(line, snapshot(booking)) for line, booking in batch]
+            session.commit()
+
+            for line, booking in created:
+                report.append(ImportResult(
+                    line, ACCEPTED, booking.id, f"Столик №{format_tables(booking.table_number, booking.extra_tables)}"
+                ))
+                await emit(BOOKING_CREATED, booking)
+    finally:
+        session.close()
+
+    report.sort(key=lambda result: result.line)
+    logger.info(
+        f"Импорт броней: принято {sum(1 for r in report if r.result == ACCEPTED)} из {len(report)}"
+    )
+    return report
+
+
+def format_report(report):
+    """Отчет по строкам в CSV"""
+    output = io.StringIO()
+    writer = csv.writer(output)
+    writer.writerow(['line', 'result', 'booking_id', 'message'])
+    writer.writerows(report)
+    return output.getvalue()
@@ -1,18 +1,55 @@
 import asyncio
+import html
 import logging
+import os
+import tempfile
 from datetime import datetime, timedelta
 from aiogram import Bot, Dispatcher, Router, F
-from aiogram.filters import Command
-from aiogram.types import Message, CallbackQuery
+from aiogram.filters import Command, CommandObject
+from aiogram.types import Message, CallbackQuery, FSInputFile, BufferedInputFile, InlineQuery, InlineQueryResultsButton
 from aiogram.fsm.context import FSMContext
 from aiogram.fsm.state import State, StatesGroup
 from aiogram.fsm.storage.memory import MemoryStorage
 
 from config import config
-from database import get_session, Booking, User
+from database import engine, get_session, archive_booking, archive_bookings, Booking, BookingArchive, User
 from keyboards import *
 from filters import IsAdminFilter
 from utils import *
+from scheduler import scheduler
+from booking_events import emit, on, snapshot, BOOKING_CREATED, BOOKING_CONFIRMED, BOOKING_RELEASED
+from sender import sender
+from reminders import schedule_reminders
+from waitlist import waitlist
+from availability import availability_index, booking_tables, parse_extra_tables
+from availability_snapshot import availability_snapshot
+from callbacks import (
+    callbacks,
+    AdminCallCallback, AdminCancelCallback, AdminConfirmCallback, AdminDetailsCallback,
+    AutoTableCallback, BackToDatesCallback, BackToGuestsCallback, BackToTimesCallback,
+    CancelBookingCallback, ConfirmBookingCallback, DateCallback, GuestsCallback,
+    MoreGuestsCallback, NoTablesCallback, PickSlotCallback, RepeatDateCallback,
+    RepeatManualCallback, TableCallback, TimeCallback, WaitlistClaimCallback,
+    WaitlistDeclineCallback, WaitlistJoinCallback
+)
+from exports import export_bookings, parse_export_args, EXPORT_STATUSES
+from occupancy import build_occupancy, parse_occupancy_args
+from search import search, SEARCH_AVAILABLE
+from api import start_api
+from calendar_feed import render_feed, feed_url, FEED_ADMIN, feed_kind
+from inline_availability import parse_query as parse_inline_query, get_results as get_inline_results, INLINE_CACHE_TIME
+from booking_import import (
+    import_bookings, format_report as format_import_report,
+    REQUIRED_COLUMNS as IMPORT_REQUIRED_COLUMNS, OPTIONAL_COLUMNS as IMPORT_OPTIONAL_COLUMNS,
+    ACCEPTED as IMPORT_ACCEPTED, CONFLICT as IMPORT_CONFLICT
+)
+from middlewares import UpdateRecorder, HandlerMetrics, ApiCallMetrics, track_update
+import metrics
+import query_profiler
+from loop_watchdog import start_watchdog
+from views import (
+    views, edit_view, edit_view_markup, forget_view_middleware, TrackRenderedEdits, VIEW_TIMES, VIEW_TABLES
+)
 
 # Настройка логирования
 logging.basicConfig(
@@ -46,6 +83,32 @@ class BookingStates(StatesGroup):
 dp.include_router(admin_router)
 dp.include_router(user_router)
 
+# Все нажатия на inline-кнопки разбирает один обработчик по префиксу
+dp.callback_query.register(callbacks.dispatch)
+
+# Живые клавиатуры: нажатие в сообщении снимает его с обновления
+dp.callback_query.outer_middleware(forget_view_middleware)
+
+# Метрики: время и ошибки обработчиков, вызовы Bot API, запросы к БД
+handler_metrics = HandlerMetrics()
+for event_name, observer in dp.observers.items():
+    if event_name not in ("update", "error"):
+        observer.middleware(handler_metrics)
+bot.session.middleware(ApiCallMetrics())
+
+# Кэш хэшей живых клавиатур видит все правки сообщений, не только edit_view
+bot.session.middleware(TrackRenderedEdits())
+metrics.instrument_engine(engine)
+
+# Какое обновление и обработчик сейчас выполняются; запросы к БД на каждое обновление
+dp.update.outer_middleware(track_update)
+dp.update.outer_middleware(query_profiler.profile_updates)
+query_profiler.install(engine)
+
+# Запись трафика для воспроизведения в benchmarks/replay.py
+if config.RECORD_UPDATES_PATH:
+    dp.update.outer_middleware(UpdateRecorder(config.RECORD_UPDATES_PATH))
+
 
 # ========== ОБЩИЕ ВСПОМОГАТЕЛЬНЫЕ ФУНКЦИИ ==========
 
@@ -59,6 +122,7 @@ dp.include_router(user_router)
 class AdminStates(StatesGroup):
     waiting_for_confirm_outdated = State()
     waiting_for_confirm_cancelled = State()
+    waiting_for_import = State()
 
 
 # Обновите обработчики с подтверждением:
@@ -117,13 +181,16 @@ async def execute_delete_outdated(message: Message, state: FSMContext):
             today = now.strftime('%Y-%m-%d')
             current_time = now.strftime('%H:%M')
 
-            # Удаляем
-            deleted = session.query(Booking).filter(
+            # Переносим в архив — они остаются в выгрузке /export
+            deleted = archive_bookings(
+                session,
                 (Booking.date < today) |
                 ((Booking.date == today) & (Booking.time < current_time))
-            ).delete()
+            )
 
             session.commit()
+            availability_index.invalidate()
+            availability_snapshot.rebuild()
 
             await message.answer(
                 f"✅ <b>Удалено {deleted} неактуальных бронирований.</b>",
@@ -192,6 +259,54 @@ async def cmd_start(message: Message, state: FSMContext):
     await show_welcome_message(message, state)
 
 
+@user_router.inline_query()
+async def inline_availability(inline_query: InlineQuery):
+    """Свободные столики по запросу '@bot 20.10 19:00 4' из любого чата"""
+    text = inline_query.query.strip()
+    book_button = InlineQueryResultsButton(text="📅 Забронировать в боте", start_parameter="book")
+
+    if not text:
+        await inline_query.answer(
+            [], cache_time=INLINE_CACHE_TIME,
+            button=InlineQueryResultsButton(text="Дата, время, гости: 20.10 19:00 4", start_parameter="book")
+        )
+        return
+
+    try:
+        query = parse_inline_query(text)
+    except ValueError as e:
+        error = f"❌ {e}"
+        if len(error) > 64:  # длиннее Telegram не покажет
+            error = error[:63] + "…"
+        await inline_query.answer(
+            [], cache_time=INLINE_CACHE_TIME,
+            button=InlineQueryResultsButton(text=error, start_parameter="book")
+        )
+        return
+
+    results = get_inline_results(query)
+    if not results:
+        book_button = InlineQueryResultsButton(text="😔 Свободных столиков нет", start_parameter="book")
+    await inline_query.answer(results, cache_time=INLINE_CACHE_TIME, is_personal=False, button=book_button)
+
+
+@user_router.message(Command("calendar"))
+async def cmd_calendar(message: Message):
+    """Брони файлом .ics и ссылка для подписки в календаре"""
+    body, _ = render_feed(message.from_user.id)
+    is_admin_feed = feed_kind(message.from_user.id) == FEED_ADMIN
+
+    caption = "📆 Все бронирования ресторана" if is_admin_feed else "📆 Ваши бронирования"
+    url = feed_url(message.from_user.id)
+    if url:
+        caption += f"\n\n🔗 Подписка (обновляется сама):\n{url}"
+
+    await message.answer_document(
+        BufferedInputFile(body, filename="bookings.ics" if is_admin_feed else "my_bookings.ics"),
+        caption=caption
+    )
+
+
 @user_router.message(Command("myid"))
 async def cmd_myid(message: Message):
     """Показать ID пользователя"""
@@ -233,6 +348,7 @@ async def cmd_help(message: Message):
         "👤 <b>Для пользователей:</b>\n"
         "/start - Начать работу с ботом\n"
         "/myid - Показать мой ID\n"
+        "/calendar - Мои брони в календаре (.ics)\n"
         "/cancel - Отменить текущее бронирование\n"
         "/help - Показать эту справку\n\n"
 
@@ -245,8 +361,18 @@ async def cmd_help(message: Message):
         "6. Укажите контактный телефон\n"
         "7. Подтвердите бронирование\n\n"
 
+        "🔁 <b>Повторная бронь:</b>\n"
+        "Кнопка '🔁 Повторить бронь' берет столик, время и гостей из прошлой брони — "
+        "останется выбрать дату и подтвердить.\n\n"
+
         "👨‍💼 <b>Для администраторов:</b>\n"
-        "/admin - Открыть панель администратора\n\n"
+        "/admin - Открыть панель администратора\n"
+        "/export - Выгрузить бронирования в CSV/JSONL\n"
+        "/import - Загрузить телефонные брони из CSV\n"
+        "/occupancy - Загрузка зала за период\n"
+        "/find - Найти бронь или гостя по имени, телефону, номеру\n"
+        "/calendar - Все брони в календаре (.ics)\n"
+        "/metrics - Метрики бота: медленные обработчики, запросы к БД\n\n"
 
         "📞 <b>Если возникли проблемы:</b>\n"
         f"• Используйте кнопку '📞 Контакты'\n"
@@ -293,6 +419,120 @@ async def start_booking(message: Message, state: FSMContext):
         )
 
 
+@user_router.message(F.text == "🔁 Повторить бронь")
+async def repeat_last_booking(message: Message, state: FSMContext):
+    """Быстрая повторная бронь по данным последнего визита"""
+    session = get_session()
+    try:
+        last_booking = session.query(Booking).filter(
+            Booking.user_id == message.from_user.id
+        ).order_by(Booking.id.desc()).first()
+
+        if not last_booking:
+            await message.answer(
+                "📋 <b>У вас еще нет бронирований</b>\n\n"
+                "Нажмите '🎯 Забронировать столик', чтобы создать первую бронь!",
+                parse_mode="HTML"
+            )
+            return
+
+        user = session.query(User).filter(User.user_id == message.from_user.id).first()
+        phone = user.phone if user and user.phone else last_booking.phone
+
+        # Сохраняем параметры прошлой брони — дальше нужна только дата
+        await state.clear()
+        await state.set_state(BookingStates.waiting_for_date)
+        await state.update_data(
+            repeat=True,
+            zone=last_booking.zone or 'main',
+            time=last_booking.time,
+            table_number=last_booking.table_number,
+            extra_tables=parse_extra_tables(last_booking.extra_tables),
+            guests=last_booking.guests,
+            full_name=last_booking.full_name,
+            phone=phone
+        )
+
+        await message.answer(
+            f"🔁 <b>Повторим прошлую бронь?</b>\n\n"
+            f"⏰ Время: {last_booking.time}\n"
+            f"🪑 Столик: {format_tables(last_booking.table_number, last_booking.extra_tables)}\n"
+            f"👥 Гостей: {last_booking.guests}\n"
+            f"👤 Имя: {last_booking.full_name}\n"
+            f"📞 Телефон: {phone}\n\n"
+            f"<i>Выберите дату — и останется только подтвердить:</i>",
+            parse_mode="HTML",
+            reply_markup=get_repeat_date_selection()
+        )
+
+    finally:
+        session.close()
+
+
+@callbacks.route(RepeatDateCallback)
+async def process_repeat_date(callback: CallbackQuery, state: FSMContext, callback_data: RepeatDateCallback):
+    """Выбор даты для повторной брони"""
+    date_str = callback_data.date
+    data = await state.get_data()
+
+    if not data.get('repeat'):
+        await callback.answer("❌ Данные устарели. Нажмите '🔁 Повторить бронь' еще раз.", show_alert=True)
+        return
+
+    valid, msg = validate_date(date_str)
+    if not valid:
+        await callback.answer(msg, show_alert=True)
+        return
+
+    valid, msg = validate_time_for_today(date_str, data['time'])
+    if not valid:
+        await callback.answer(msg, show_alert=True)
+        return
+
+    # Прежние столики свободны — берем их, иначе подбираем другие
+    tables = [data['table_number']] + data.get('extra_tables', [])
+    table_note = ""
+    if not tables_free(date_str, data['time'], tables, data['zone'], data['guests']):
+        tables = allocate_tables(date_str, data['time'], data['guests'], data['zone'])
+        if not tables:
+            await callback.answer(
+                f"❌ На {data['time']} все столики заняты. Выберите другую дату.",
+                show_alert=True
+            )
+            return
+        table_note = (
+            f"\n<i>Столик №{format_tables(data['table_number'], data.get('extra_tables'))} занят, "
+            f"предлагаем №{format_tables(tables[0], tables[1:])}.</i>\n"
+        )
+
+    await state.update_data(date=date_str, table_number=tables[0], extra_tables=tables[1:])
+    await state.set_state(BookingStates.waiting_for_confirm)
+
+    data = await state.get_data()
+    await callback.message.edit_text(
+        f"📋 <b>Сводка вашего бронирования:</b>\n\n"
+        f"{format_booking_data(data)}\n"
+        f"{table_note}\n"
+        f"<i>Проверьте все данные и подтвердите бронирование:</i>",
+        parse_mode="HTML",
+        reply_markup=get_confirm_keyboard()
+    )
+    await callback.answer()
+
+
+@callbacks.route(RepeatManualCallback)
+async def repeat_manual(callback: CallbackQuery, state: FSMContext, callback_data: RepeatManualCallback):
+    """Переход от повторной брони к обычному оформлению"""
+    await state.clear()
+    await state.set_state(BookingStates.waiting_for_date)
+    await callback.message.edit_text(
+        "📅 <b>Выберите дату для бронирования:</b>",
+        parse_mode="HTML",
+        reply_markup=get_date_selection()
+    )
+    await callback.answer()
+
+
 @user_router.message(F.text == "📋 Мои бронирования")
 async def show_my_bookings(message: Message):
     """Показать все бронирования пользователя"""
@@ -406,11 +646,12 @@ async def show_contacts(message: Message):
 
 # ========== ОБРАБОТЧИКИ КОЛЛБЭКОВ БРОНИРОВАНИЯ ==========
 
-@user_router.callback_query(F.data == "back_to_date_selection")
-async def back_to_date_selection(callback: CallbackQuery, state: FSMContext):
+@callbacks.route(BackToDatesCallback)
+async def back_to_date_selection(callback: CallbackQuery, state: FSMContext, callback_data: BackToDatesCallback):
     """Возврат к выбору даты"""
     await state.set_state(BookingStates.waiting_for_date)
-    await callback.message.edit_text(
+    await edit_view(
+        callback.message,
         "📅 <b>Выберите дату для бронирования:</b>",
         parse_mode="HTML",
         reply_markup=get_date_selection()
@@ -418,10 +659,10 @@ async def back_to_date_selection(callback: CallbackQuery, state: FSMContext):
     await callback.answer()
 
 
-@user_router.callback_query(F.data.startswith("date_"))
-async def process_date(callback: CallbackQuery, state: FSMContext):
+@callbacks.route(DateCallback)
+async def process_date(callback: CallbackQuery, state: FSMContext, callback_data: DateCallback):
     """Обработка выбора даты"""
-    date_str = callback.data.split("_")[1]
+    date_str = callback_data.date
 
     valid, msg = validate_date(date_str)
     if not valid:
@@ -439,27 +680,23 @@ async def process_date(callback: CallbackQuery, state: FSMContext):
     days = ["Понедельник", "Вторник", "Среда", "Четверг", "Пятница", "Суббота", "Воскресенье"]
     day_name = days[date_obj.weekday()]
 
-    await callback.message.edit_text(
+    # Слоты показываем в том же сообщении — кнопка возврата к датам есть в клавиатуре
+    await edit_view(
+        callback.message,
         f"✅ <b>Дата выбрана:</b> {formatted_date} ({day_name})\n\n"
-        f"<i>Теперь выберите удобное время:</i>",
-        parse_mode="HTML",
-        reply_markup=get_back_to_dates_keyboard()
-    )
-
-    # Показываем доступные временные слоты
-    await callback.message.answer(
         f"⏰ <b>Выберите время на {formatted_date}:</b>",
         parse_mode="HTML",
         reply_markup=get_time_slots(date_str, 'main')
     )
+    views.register(callback.message, VIEW_TIMES, date_str)
 
     await callback.answer()
 
 
-@user_router.callback_query(F.data.startswith("time_"))
-async def process_time(callback: CallbackQuery, state: FSMContext):
+@callbacks.route(TimeCallback)
+async def process_time(callback: CallbackQuery, state: FSMContext, callback_data: TimeCallback):
     """Обработка выбора времени"""
-    time_str = callback.data.split("_")[1]
+    time_str = callback_data.time
 
     data = await state.get_data()
 
@@ -472,7 +709,11 @@ async def process_time(callback: CallbackQuery, state: FSMContext):
         )
         return
 
-    date = data['date']
+    await show_tables_for_time(callback, state, data['date'], time_str)
+
+
+async def show_tables_for_time(callback: CallbackQuery, state: FSMContext, date, time_str):
+    """Показать свободные столики на выбранные дату и время"""
     zone = 'main'
 
     # Проверяем доступные столики
@@ -488,24 +729,39 @@ async def process_time(callback: CallbackQuery, state: FSMContext):
     date_obj = datetime.strptime(date, '%Y-%m-%d')
     formatted_date = date_obj.strftime('%d.%m.%Y')
 
-    await callback.message.edit_text(
+    await edit_view(
+        callback.message,
         f"✅ <b>Время выбрано:</b> {time_str}\n"
         f"📅 Дата: {formatted_date}\n\n"
-        f"<i>Свободных столиков: {len(available_tables)} из {len(config.TABLES['main'])}</i>",
-        parse_mode="HTML",
-        reply_markup=get_back_to_times_keyboard()
-    )
-
-    await callback.message.answer(
+        f"<i>Свободных столиков: {len(available_tables)} из {len(config.TABLES['main'])}</i>\n\n"
         f"🪑 <b>Выберите столик на {formatted_date} в {time_str}:</b>",
         parse_mode="HTML",
         reply_markup=get_tables_keyboard(date, time_str, zone)
     )
+    views.register(callback.message, VIEW_TABLES, date, time_str, zone)
 
     await callback.answer()
 
 
-@user_router.callback_query(F.data == "no_tables")
+@callbacks.route(PickSlotCallback)
+async def pick_nearest_slot(callback: CallbackQuery, state: FSMContext, callback_data: PickSlotCallback):
+    """Выбор одного из предложенных ближайших свободных слотов"""
+    date_str, time_str = callback_data.date, callback_data.time
+
+    valid, msg = validate_date(date_str)
+    if not valid:
+        await callback.answer(msg, show_alert=True)
+        return
+
+    valid, msg = validate_time_for_today(date_str, time_str)
+    if not valid:
+        await callback.answer(msg, show_alert=True)
+        return
+
+    await state.update_data(date=date_str)
+    await show_tables_for_time(callback, state, date_str, time_str)
+
+
 async def no_tables_available(callback: CallbackQuery):
     """Обработка отсутствия свободных столиков"""
     await callback.answer(
@@ -515,10 +771,147 @@ async def no_tables_available(callback: CallbackQuery):
     )
 
 
-@user_router.callback_query(F.data.startswith("table_"))
-async def process_table(callback: CallbackQuery, state: FSMContext):
+@callbacks.route(NoTablesCallback)
+async def no_tables_for_time(callback: CallbackQuery, state: FSMContext, callback_data: NoTablesCallback):
+    """Все столики на время заняты — предлагаем лист ожидания"""
+    time_str = callback_data.time
+    data = await state.get_data()
+
+    if time_str is None or 'date' not in data:
+        await no_tables_available(callback)
+        return
+
+    date_obj = datetime.strptime(data['date'], '%Y-%m-%d')
+    formatted_date = date_obj.strftime('%d.%m.%Y')
+
+    # Один проход по индексу занятости вместо ручного перебора дат и времени
+    nearest_slots = find_nearest_slots(data.get('guests'), data['date'], time_str)
+    nearest_text = (
+        "🕐 Ближайшее свободное время — кнопки ниже.\n\n" if nearest_slots
+        else "Ближайшие дни на это время тоже заняты.\n\n"
+    )
+
+    await callback.message.edit_text(
+        f"😔 <b>На {formatted_date} в {time_str} все столики заняты.</b>\n\n"
+        f"{nearest_text}"
+        f"Или встаньте в лист ожидания — если столик освободится, "
+        f"мы сразу предложим его вам.\n\n"
+        f"<i>Сколько будет гостей?</i>",
+        parse_mode="HTML",
+        reply_markup=get_waitlist_join_keyboard(data['date'], time_str, nearest_slots)
+    )
+    await callback.answer()
+
+
+@callbacks.route(WaitlistJoinCallback)
+async def join_waitlist(callback: CallbackQuery, state: FSMContext, callback_data: WaitlistJoinCallback):
+    """Запись в лист ожидания"""
+    date_str, time_str, guests = callback_data.date, callback_data.time, callback_data.guests
+
+    valid, msg = validate_date(date_str)
+    if not valid:
+        await callback.answer(msg, show_alert=True)
+        return
+
+    valid, msg = validate_time(time_str, date_str)
+    if not valid:
+        await callback.answer(msg, show_alert=True)
+        return
+
+    if not 1 <= guests <= config.MAX_GUESTS:
+        await callback.answer("❌ Неверное количество гостей.", show_alert=True)
+        return
+
+    if get_available_tables(date_str, time_str, 'main', guests):
+        # Пока гость выбирал, столик освободился — сразу к выбору столика
+        await state.update_data(date=date_str)
+        await show_tables_for_time(callback, state, date_str, time_str)
+        return
+
+    position, created = waitlist.join(callback.from_user.id, 'main', date_str, time_str, guests)
+    await state.clear()
+
+    date_obj = datetime.strptime(date_str, '%Y-%m-%d')
+    formatted_date = date_obj.strftime('%d.%m.%Y')
+
+    await callback.message.edit_text(
+        f"📝 <b>{'Вы в листе ожидания' if created else 'Вы уже в листе ожидания'}</b>\n\n"
+        f"📅 Дата: {formatted_date}\n"
+        f"⏰ Время: {time_str}\n"
+        f"👥 Гостей: {guests}\n"
+        f"🔢 Ваше место в очереди: {position}\n\n"
+        f"<i>Как только столик освободится, мы пришлем предложение. "
+        f"На ответ будет {config.WAITLIST_OFFER_TIMEOUT_MINUTES} мин.</i>",
+        parse_mode="HTML"
+    )
+    await callback.answer()
+
+
+@callbacks.route(WaitlistClaimCallback)
+async def claim_waitlist_offer(callback: CallbackQuery, state: FSMContext, callback_data: WaitlistClaimCallback):
+    """Гость принимает столик из листа ожидания"""
+    entry_id = callback_data.entry_id
+
+    offer = waitlist.get_offer(entry_id, callback.from_user.id)
+    if not offer:
+        await callback.answer("❌ Предложение больше не действует.", show_alert=True)
+        return
+
+    guest, table_num = offer
+    if table_num not in get_available_tables(guest.date, guest.time, guest.zone, guest.guests):
+        position = waitlist.return_offer(entry_id)
+        await callback.message.edit_text(
+            f"😔 <b>Столик №{table_num} уже занят.</b>\n\n"
+            + (f"Вы остаетесь в листе ожидания, ваше место в очереди: {position}."
+               if position else "Вы уже в листе ожидания на это время."),
+            parse_mode="HTML"
+        )
+        await callback.answer()
+        return
+
+    waitlist.claim(entry_id)
+    await state.clear()
+    await state.update_data(
+        date=guest.date,
+        time=guest.time,
+        zone=guest.zone,
+        table_number=table_num,
+        guests=guest.guests
+    )
+    await state.set_state(BookingStates.waiting_for_name)
+
+    await callback.message.edit_text(
+        f"✅ <b>Столик №{table_num} ваш!</b>\n"
+        f"📅 Дата: {datetime.strptime(guest.date, '%Y-%m-%d').strftime('%d.%m.%Y')}\n"
+        f"⏰ Время: {guest.time}\n"
+        f"👥 Гостей: {guest.guests}\n\n"
+        f"<i>Осталось указать имя и телефон.</i>",
+        parse_mode="HTML"
+    )
+    await callback.message.answer(
+        "👤 <b>Введите ваше имя для бронирования:</b>\n\n"
+        "<i>Пример: Иван Иванов</i>",
+        parse_mode="HTML"
+    )
+    await callback.answer()
+
+
+@callbacks.route(WaitlistDeclineCallback)
+async def decline_waitlist_offer(callback: CallbackQuery, state: FSMContext, callback_data: WaitlistDeclineCallback):
+    """Гость отказывается от столика из листа ожидания"""
+    entry_id = callback_data.entry_id
+
+    if waitlist.get_offer(entry_id, callback.from_user.id):
+        waitlist.decline(entry_id)
+
+    await callback.message.edit_text("👌 <b>Хорошо, предложим столик другому гостю.</b>", parse_mode="HTML")
+    await callback.answer()
+
+
+@callbacks.route(TableCallback)
+async def process_table(callback: CallbackQuery, state: FSMContext, callback_data: TableCallback):
     """Обработка выбора столика"""
-    table_num = int(callback.data.split("_")[1])
+    table_num = callback_data.number
 
     data = await state.get_data()
 
@@ -539,35 +932,54 @@ async def process_table(callback: CallbackQuery, state: FSMContext):
     available_tables = get_available_tables(date, time, zone)
     if table_num not in available_tables:
         await callback.answer("❌ Этот столик уже занят. Выберите другой.", show_alert=True)
+        # Показываем актуальные столики
+        await edit_view_markup(callback.message, get_tables_keyboard(date, time, zone))
+        views.register(callback.message, VIEW_TABLES, date, time, zone)
         return
 
-    await state.update_data(table_number=table_num)
+    await state.update_data(table_number=table_num, extra_tables=[], auto_table=False)
     await state.set_state(BookingStates.waiting_for_guests)
 
     date_obj = datetime.strptime(date, '%Y-%m-%d')
     formatted_date = date_obj.strftime('%d.%m.%Y')
 
-    await callback.message.edit_text(
+    await edit_view(
+        callback.message,
         f"✅ <b>Столик выбран:</b> №{table_num}\n"
         f"📅 Дата: {formatted_date}\n"
         f"⏰ Время: {time}\n\n"
-        f"<i>Отлично! Теперь укажите количество гостей:</i>",
+        f"👥 <b>Сколько гостей будет?</b>\n\n"
+        f"<i>Выберите подходящий вариант:</i>",
         parse_mode="HTML",
-        reply_markup=get_back_to_tables_keyboard()
+        reply_markup=get_guests_keyboard()
     )
 
-    await callback.message.answer(
-        "👥 <b>Сколько гостей будет?</b>\n\n"
-        "<i>Выберите подходящий вариант:</i>",
+    await callback.answer()
+
+
+@callbacks.route(AutoTableCallback)
+async def process_auto_table(callback: CallbackQuery, state: FSMContext, callback_data: AutoTableCallback):
+    """Автоматический подбор столика: сначала узнаем количество гостей"""
+    data = await state.get_data()
+
+    if 'date' not in data or 'time' not in data:
+        await callback.answer("❌ Сначала выберите дату и время.", show_alert=True)
+        return
+
+    await state.update_data(table_number=None, extra_tables=[], auto_table=True)
+    await state.set_state(BookingStates.waiting_for_guests)
+
+    await callback.message.edit_text(
+        "🎲 <b>Подберем столик под вашу компанию!</b>\n\n"
+        "👥 <b>Сколько гостей будет?</b>",
         parse_mode="HTML",
         reply_markup=get_guests_keyboard()
     )
-
     await callback.answer()
 
 
-@user_router.callback_query(F.data == "back_to_time_selection")
-async def back_to_time_selection(callback: CallbackQuery, state: FSMContext):
+@callbacks.route(BackToTimesCallback)
+async def back_to_time_selection(callback: CallbackQuery, state: FSMContext, callback_data: BackToTimesCallback):
     """Возврат к выбору времени"""
     await state.set_state(BookingStates.waiting_for_time)
 
@@ -576,44 +988,94 @@ async def back_to_time_selection(callback: CallbackQuery, state: FSMContext):
         date_obj = datetime.strptime(data['date'], '%Y-%m-%d')
         formatted_date = date_obj.strftime('%d.%m.%Y')
 
-        await callback.message.edit_text(
+        await edit_view(
+            callback.message,
             f"⏰ <b>Выберите время на {formatted_date}:</b>",
             parse_mode="HTML",
             reply_markup=get_time_slots(data['date'], 'main')
         )
+        views.register(callback.message, VIEW_TIMES, data['date'])
 
     await callback.answer()
 
 
-@user_router.callback_query(F.data.startswith("guests_"))
-async def process_guests(callback: CallbackQuery, state: FSMContext):
+@callbacks.route(MoreGuestsCallback)
+async def process_more_guests(callback: CallbackQuery, state: FSMContext, callback_data: MoreGuestsCallback):
+    """Показать клавиатуру для выбора точного количества гостей"""
+    await callback.message.edit_text(
+        "👨‍👩‍👧‍👦 <b>Выберите точное количество гостей:</b>",
+        parse_mode="HTML",
+        reply_markup=get_more_guests_keyboard()
+    )
+    await callback.answer()
+
+
+@callbacks.route(GuestsCallback)
+async def process_guests(callback: CallbackQuery, state: FSMContext, callback_data: GuestsCallback):
     """Обработка выбора количества гостей"""
-    guests_data = callback.data.split("_")[1]
+    guests = callback_data.count
 
-    if guests_data == "more":
-        # Показать клавиатуру для выбора точного количества
-        await callback.message.edit_text(
-            "👨‍👩‍👧‍👦 <b>Выберите точное количество гостей:</b>",
-            parse_mode="HTML",
-            reply_markup=get_more_guests_keyboard()
-        )
-        await callback.answer()
-        return
+    data = await state.get_data()
+    table_note = ""
+
+    if data.get('auto_table') and 'time' in data:
+        # Подбираем самый подходящий по размеру свободный столик,
+        # а для большой компании — наименьшее сочетание соседних столиков
+        tables = allocate_tables(data['date'], data['time'], guests, data.get('zone', 'main'))
+        if not tables:
+            await callback.answer(
+                f"❌ На {data['time']} нет свободного столика для {guests} гостей. Выберите другое время.",
+                show_alert=True
+            )
+            return
+        await state.update_data(table_number=tables[0], extra_tables=tables[1:])
+        if len(tables) == 1:
+            table_note = f"🪑 Подобран столик №{tables[0]} (мест: {config.TABLE_SEATS.get(tables[0])})\n"
+        else:
+            seats = sum(config.TABLE_SEATS.get(table, 0) for table in tables)
+            table_note = f"🪑 Сдвинем для вас столики №{format_tables(tables[0], tables[1:])} (мест: {seats})\n"
+
+    elif data.get('table_number') and 'time' in data:
+        seats = config.TABLE_SEATS.get(data['table_number'], config.MAX_GUESTS)
+        if guests > seats:
+            # Выбранный столик мал — пробуем сдвинуть к нему соседние
+            tables = allocate_tables(
+                data['date'], data['time'], guests, data.get('zone', 'main'),
+                must_include=data['table_number']
+            )
+            if not tables:
+                await callback.answer(
+                    f"❌ Столик №{data['table_number']} рассчитан на {seats} гостей. "
+                    f"Выберите другой столик или подбор автоматически.",
+                    show_alert=True
+                )
+                return
+            await state.update_data(table_number=tables[0], extra_tables=tables[1:])
+            seats = sum(config.TABLE_SEATS.get(table, 0) for table in tables)
+            table_note = f"🪑 Сдвинем для вас столики №{format_tables(tables[0], tables[1:])} (мест: {seats})\n"
+
+        # Большие компании сидят дольше — проверяем столик на их продолжительность
+        elif not tables_free(data['date'], data['time'], [data['table_number']], data.get('zone', 'main'), guests):
+            duration = config.get_booking_duration(guests, data['time'])
+            await callback.answer(
+                f"❌ Для {guests} гостей столик бронируется на {duration} мин., "
+                f"а столик №{data['table_number']} занят раньше. Выберите другой столик или время.",
+                show_alert=True
+            )
+            return
+
+        else:
+            await state.update_data(extra_tables=[])
 
-    guests = int(guests_data)
     await state.update_data(guests=guests)
     await state.set_state(BookingStates.waiting_for_name)
 
-    await callback.message.edit_text(
-        f"✅ <b>Количество гостей:</b> {guests}\n\n"
-        f"<i>Отлично! Теперь введите ваше имя:</i>",
-        parse_mode="HTML",
-        reply_markup=get_back_to_guests_keyboard()
-    )
-
-    await callback.message.answer(
-        "👤 <b>Введите ваше имя для бронирования:</b>\n\n"
-        "<i>Пример: Иван Иванов</i>",
+    await edit_view(
+        callback.message,
+        f"✅ <b>Количество гостей:</b> {guests}\n"
+        f"{table_note}\n"
+        f"👤 <b>Введите ваше имя для бронирования:</b>\n\n"
+        f"<i>Пример: Иван Иванов</i>",
         parse_mode="HTML",
         reply_markup=get_name_input_keyboard()
     )
@@ -621,12 +1083,13 @@ async def process_guests(callback: CallbackQuery, state: FSMContext):
     await callback.answer()
 
 
-@user_router.callback_query(F.data == "back_to_guests")
-async def back_to_guests(callback: CallbackQuery, state: FSMContext):
+@callbacks.route(BackToGuestsCallback)
+async def back_to_guests(callback: CallbackQuery, state: FSMContext, callback_data: BackToGuestsCallback):
     """Возврат к выбору количества гостей"""
     await state.set_state(BookingStates.waiting_for_guests)
 
-    await callback.message.edit_text(
+    await edit_view(
+        callback.message,
         "👥 <b>Сколько гостей будет?</b>\n\n"
         "<i>Выберите подходящий вариант:</i>",
         parse_mode="HTML",
@@ -753,11 +1216,25 @@ async def process_phone_number(message: Message, state: FSMContext, phone: str):
     )
 
 
-@user_router.callback_query(F.data == "confirm_booking")
-async def confirm_booking(callback: CallbackQuery, state: FSMContext):
+@callbacks.route(ConfirmBookingCallback)
+async def confirm_booking(callback: CallbackQuery, state: FSMContext, callback_data: ConfirmBookingCallback):
     """Подтверждение бронирования"""
     data = await state.get_data()
 
+    # Столики могли занять, пока гость заполнял данные. Между проверкой и записью
+    # нет await, поэтому все столики компании занимаются разом одной строкой брони
+    tables = [data['table_number']] + data.get('extra_tables', [])
+    if not tables_free(data['date'], data['time'], tables, data.get('zone', 'main'), data['guests']):
+        await callback.answer("❌ Этот столик уже занят. Начните бронирование заново.", show_alert=True)
+        await state.clear()
+        await callback.message.edit_text(
+            "❌ <b>Пока вы оформляли бронь, столик заняли.</b>\n\n"
+            "Пожалуйста, выберите другой столик или время.",
+            parse_mode="HTML"
+        )
+        await callback.message.answer("Выберите дальнейшее действие:", reply_markup=get_main_menu())
+        return
+
     # Сохраняем бронирование в БД
     session = get_session()
     try:
@@ -768,8 +1245,10 @@ async def confirm_booking(callback: CallbackQuery, state: FSMContext):
             phone=data['phone'],
             zone=data.get('zone', 'main'),
             table_number=data['table_number'],
+            extra_tables=",".join(str(table) for table in data.get('extra_tables', [])) or None,
             date=data['date'],
             time=data['time'],
+            duration=config.get_booking_duration(data['guests'], data['time']),
             guests=data['guests'],
             status='pending'
         )
@@ -778,6 +1257,7 @@ async def confirm_booking(callback: CallbackQuery, state: FSMContext):
 
         booking_summary = format_booking_data(data)
         booking_id = booking.id
+        await emit(BOOKING_CREATED, booking)
 
         # Уведомляем администраторов
         admin_notified = False
@@ -839,8 +1319,8 @@ async def confirm_booking(callback: CallbackQuery, state: FSMContext):
     await callback.answer()
 
 
-@user_router.callback_query(F.data == "cancel_booking")
-async def cancel_booking_user(callback: CallbackQuery, state: FSMContext):
+@callbacks.route(CancelBookingCallback)
+async def cancel_booking_user(callback: CallbackQuery, state: FSMContext, callback_data: CancelBookingCallback):
     """Отмена бронирования пользователем"""
     await state.clear()
     await callback.message.edit_text("❌ <b>Бронирование отменено.</b>", parse_mode="HTML")
@@ -884,6 +1364,225 @@ async def cmd_admin(message: Message):
         session.close()
 
 
+@admin_router.message(Command("export"))
+async def cmd_export(message: Message, command: CommandObject):
+    """Выгрузка бронирований файлом: /export [csv|jsonl] [с] [по] [статус]"""
+    try:
+        export_format, date_from, date_to, statuses = parse_export_args(command.args)
+    except ValueError as e:
+        await message.answer(
+            f"❌ {e}\n\n"
+            f"<b>Формат:</b> /export [csv|jsonl] [с ДД.ММ.ГГГГ] [по ДД.ММ.ГГГГ] [статус]\n"
+            f"<b>Статусы:</b> {', '.join(EXPORT_STATUSES)}\n"
+            f"<i>Пример: /export jsonl 01.10.2026 31.10.2026 confirmed</i>",
+            parse_mode="HTML"
+        )
+        return
+
+    status_message = await message.answer("⏳ Выгружаем бронирования...")
+
+    async def report_progress(exported):
+        await status_message.edit_text(f"⏳ Выгружено строк: {exported}...")
+
+    # Пишем во временный файл: память не растет с размером выгрузки
+    with tempfile.NamedTemporaryFile('w', suffix=f".{export_format}", encoding='utf-8',
+                                     newline='', delete=False) as file:
+        path = file.name
+        try:
+            exported = await export_bookings(file, export_format, date_from, date_to, statuses, report_progress)
+        except Exception as e:
+            logger.error(f"Ошибка выгрузки бронирований: {e}")
+            exported = None
+
+    try:
+        if exported is None:
+            await status_message.edit_text("❌ Не удалось выгрузить бронирования.")
+            return
+
+        period = f"{date_from or '…'} — {date_to or '…'}" if date_from or date_to else "все даты"
+        filename = f"bookings_{datetime.now().strftime('%Y%m%d_%H%M')}.{export_format}"
+        await message.answer_document(
+            FSInputFile(path, filename=filename),
+            caption=f"📤 Бронирований: {exported}\n📅 Период: {period}"
+                    + (f"\n📌 Статусы: {', '.join(statuses)}" if statuses else "")
+        )
+        await status_message.edit_text(f"✅ Выгружено строк: {exported}")
+        logger.info(f"Админ {message.from_user.id} выгрузил {exported} бронирований ({export_format})")
+    finally:
+        os.remove(path)
+
+
+@admin_router.message(Command("find"))
+async def cmd_find(message: Message, command: CommandObject):
+    """Поиск броней и гостей: /find <имя, телефон, @username или номер брони>"""
+    if not command.args:
+        await message.answer(
+            "🔎 <b>Формат:</b> /find запрос\n"
+            "<i>Примеры: /find Иван, /find 4567, /find +7 999 123, /find 152</i>",
+            parse_mode="HTML"
+        )
+        return
+    if not SEARCH_AVAILABLE:
+        await message.answer("❌ Поиск недоступен: SQLite собран без FTS5.")
+        return
+
+    bookings, users = search(command.args)
+    if not bookings and not users:
+        await message.answer(f"📭 По запросу «{html.escape(command.args)}» ничего не найдено.")
+        return
+
+    lines = [f"🔎 <b>Найдено по запросу «{html.escape(command.args)}»</b>"]
+    if bookings:
+        lines.append("\n<b>Бронирования:</b>")
+        for booking in bookings:
+            status_icon = '📋' if booking.status == 'pending' else '✅' if booking.status == 'confirmed' else '❌'
+            is_archived = isinstance(booking, BookingArchive)
+            archived = " · 🗄 архив" if is_archived else ""
+            lines.append(
+                f"{status_icon} #{booking.booking_id if is_archived else booking.id} · {booking.date} {booking.time} · "
+                f"{html.escape(booking.full_name or '')} · {html.escape(booking.phone or '')} · "
+                f"🪑 {format_tables(booking.table_number, booking.extra_tables)}{archived}"
+            )
+    if users:
+        lines.append("\n<b>Гости:</b>")
+        for user in users:
+            username = f" (@{html.escape(user.username)})" if user.username else ""
+            lines.append(
+                f"👤 {html.escape(user.full_name or '')}{username} · "
+                f"{html.escape(user.phone or 'телефон не указан')} · ID {user.user_id}"
+            )
+    await message.answer("\n".join(lines), parse_mode="HTML")
+
+    # Единственная текущая бронь — сразу с кнопками действий
+    live = [booking for booking in bookings if isinstance(booking, Booking)]
+    if len(live) == 1 and len(bookings) == 1:
+        await message.answer(format_booking(live[0]), parse_mode="HTML", reply_markup=get_booking_actions(live[0].id))
+
+
+@admin_router.message(Command("occupancy"))
+async def cmd_occupancy(message: Message, command: CommandObject):
+    """Загрузка зала: /occupancy [с] [по] [png]"""
+    try:
+        date_from, date_to, png = parse_occupancy_args(command.args)
+    except ValueError as e:
+        await message.answer(
+            f"❌ {e}\n\n"
+            f"<b>Формат:</b> /occupancy [с ДД.ММ.ГГГГ] [по ДД.ММ.ГГГГ] [png]\n"
+            f"<i>Без дат — последние 30 дней. Пример: /occupancy 01.09.2026 30.09.2026 png</i>",
+            parse_mode="HTML"
+        )
+        return
+
+    try:
+        report = build_occupancy(date_from, date_to)
+    except RuntimeError as e:
+        await message.answer(f"❌ {e}")
+        return
+    except Exception as e:
+        logger.error(f"Ошибка расчета загрузки: {e}")
+        await message.answer("❌ Не удалось посчитать загрузку.")
+        return
+
+    await message.answer(
+        f"{report.summary_text()}\n\n<pre>{report.heatmap_text()}</pre>",
+        parse_mode="HTML"
+    )
+
+    if png:
+        image = report.heatmap_png()
+        if image is None:
+            await message.answer("ℹ️ Для PNG-карты установите matplotlib.")
+        else:
+            await message.answer_photo(BufferedInputFile(image, filename="occupancy.png"))
+
+
+@admin_router.message(Command("metrics"))
+async def cmd_metrics(message: Message, command: CommandObject):
+    """Метрики бота: /metrics — сводка, /metrics raw — файл в формате Prometheus"""
+    if (command.args or "").strip().lower() == "raw":
+        await message.answer_document(
+            BufferedInputFile(metrics.registry.render().encode('utf-8'), filename="metrics.prom")
+        )
+        return
+
+    text = metrics.summary_text()
+    if config.METRICS_PORT:
+        text += f"\n\n<i>Prometheus: http://{config.METRICS_HOST}:{config.METRICS_PORT}/metrics</i>"
+    await message.answer(text, parse_mode="HTML")
+
+
+@admin_router.message(Command("import"))
+async def cmd_import(message: Message, state: FSMContext):
+    """Импорт телефонных броней: ждем CSV-файл"""
+    await state.set_state(AdminStates.waiting_for_import)
+    await message.answer(
+        f"📥 <b>ИМПОРТ БРОНИРОВАНИЙ</b>\n\n"
+        f"Пришлите CSV-файл (UTF-8, разделитель запятая или точка с запятой).\n\n"
+        f"<b>Обязательные колонки:</b> {', '.join(IMPORT_REQUIRED_COLUMNS)}\n"
+        f"<b>Необязательные:</b> {', '.join(IMPORT_OPTIONAL_COLUMNS)}\n\n"
+        f"<i>Дата — ДД.ММ.ГГГГ или ГГГГ-ММ-ДД, время — ЧЧ:ММ. "
+        f"Без столика подберем свободный, статус по умолчанию — confirmed.</i>\n\n"
+        f"Для отмены отправьте /cancel",
+        parse_mode="HTML"
+    )
+
+
+@admin_router.message(AdminStates.waiting_for_import, F.document)
+async def process_import_file(message: Message, state: FSMContext):
+    """Проверить и загрузить брони из CSV, ответить отчетом по строкам"""
+    await state.clear()
+    status_message = await message.answer("⏳ Проверяем файл...")
+
+    try:
+        file = await bot.download(message.document)
+        text = file.read().decode('utf-8-sig')
+    except UnicodeDecodeError:
+        await status_message.edit_text("❌ Файл должен быть в кодировке UTF-8.")
+        return
+    except Exception as e:
+        logger.error(f"Не удалось скачать файл импорта: {e}")
+        await status_message.edit_text("❌ Не удалось получить файл.")
+        return
+
+    try:
+        report = await import_bookings(text)
+    except ValueError as e:
+        await status_message.edit_text(f"❌ {e}")
+        return
+    except Exception as e:
+        logger.error(f"Ошибка импорта бронирований: {e}")
+        await status_message.edit_text("❌ Не удалось импортировать бронирования.")
+        return
+
+    accepted = sum(1 for result in report if result.result == IMPORT_ACCEPTED)
+    conflicts = sum(1 for result in report if result.result == IMPORT_CONFLICT)
+    invalid = len(report) - accepted - conflicts
+
+    await status_message.edit_text(
+        f"✅ Импорт завершен\n\n"
+        f"📥 Принято: {accepted}\n"
+        f"⚠️ Конфликтов: {conflicts}\n"
+        f"❌ С ошибками: {invalid}"
+    )
+    await message.answer_document(
+        BufferedInputFile(
+            format_import_report(report).encode('utf-8-sig'),
+            filename=f"import_report_{datetime.now().strftime('%Y%m%d_%H%M')}.csv"
+        ),
+        caption="📋 Отчет по строкам"
+    )
+    logger.info(f"Админ {message.from_user.id} импортировал {accepted} из {len(report)} броней")
+
+
+@admin_router.message(AdminStates.waiting_for_import)
+async def process_import_not_file(message: Message, state: FSMContext):
+    if message.text == "/cancel":
+        await state.clear()
+        await message.answer("❌ Импорт отменен.")
+        return
+    await message.answer("📎 Пришлите CSV-файл документом или /cancel для отмены.")
+
+
 @admin_router.message(F.text == "📊 Все бронирования")
 async def show_all_bookings(message: Message):
     """Показать все бронирования"""
@@ -1048,10 +1747,10 @@ async def back_to_menu_admin(message: Message):
 
 # ========== АДМИН КОЛЛБЭКИ ==========
 
-@admin_router.callback_query(F.data.startswith("admin_confirm_"))
-async def admin_confirm_booking(callback: CallbackQuery):
+@callbacks.route(AdminConfirmCallback, admin=True)
+async def admin_confirm_booking(callback: CallbackQuery, state: FSMContext, callback_data: AdminConfirmCallback):
     """Подтверждение бронирования админом"""
-    booking_id = int(callback.data.split("_")[-1])
+    booking_id = callback_data.booking_id
 
     session = get_session()
     try:
@@ -1060,8 +1759,27 @@ async def admin_confirm_booking(callback: CallbackQuery):
             await callback.answer("❌ Бронь не найдена", show_alert=True)
             return
 
+        if booking.status != 'pending':
+            # Заявку уже подтвердили, отменил гость или сняла автоотмена
+            await callback.message.edit_text(format_booking(booking), parse_mode="HTML")
+            await callback.answer(
+                "✅ Бронь уже подтверждена" if booking.status == 'confirmed'
+                else "❌ Бронь отменена — подтвердить ее нельзя",
+                show_alert=True
+            )
+            return
+
+        if not tables_free(booking.date, booking.time, booking_tables(booking), booking.zone or 'main',
+                           booking.guests, booking.duration, ignore_booking=booking.id):
+            await callback.answer(
+                "❌ Столик на это время уже занят другой бронью. Свяжитесь с гостем.",
+                show_alert=True
+            )
+            return
+
         booking.status = 'confirmed'
         session.commit()
+        await emit(BOOKING_CONFIRMED, booking)
 
         # Уведомляем пользователя
         try:
@@ -1070,7 +1788,7 @@ async def admin_confirm_booking(callback: CallbackQuery):
                 f"✅ <b>ВАША БРОНЬ ПОДТВЕРЖДЕНА!</b>\n\n"
                 f"{format_booking_data(booking)}\n\n"
                 f"📅 Мы ждем вас {booking.date} в {booking.time}\n"
-                f"🪑 Столик №{booking.table_number}\n\n",
+                f"🪑 Столик №{format_tables(booking.table_number, booking.extra_tables)}\n\n",
                 parse_mode="HTML"
             )
         except Exception as e:
@@ -1112,11 +1830,13 @@ async def delete_outdated_bookings(message: Message):
             )
             return
 
-        # Удаляем
+        # Переносим в архив — они остаются в выгрузке /export
         for booking in outdated_bookings:
-            session.delete(booking)
+            archive_booking(session, booking)
 
         session.commit()
+        availability_index.invalidate()
+        availability_snapshot.rebuild()
 
         await message.answer(
             f"✅ <b>Удалено {outdated_count} неактуальных бронирований.</b>\n\n"
@@ -1145,12 +1865,10 @@ async def delete_cancelled_bookings(message: Message):
     """Удаление всех отмененных бронирований"""
     session = get_session()
     try:
-        # Находим все отмененные бронирования
-        cancelled_bookings = session.query(Booking).filter(
+        # Считаем отмененные бронирования
+        cancelled_count = session.query(Booking).filter(
             Booking.status == 'cancelled'
-        ).all()
-
-        cancelled_count = len(cancelled_bookings)
+        ).count()
 
         if cancelled_count == 0:
             await message.answer(
@@ -1159,11 +1877,11 @@ async def delete_cancelled_bookings(message: Message):
             )
             return
 
-        # Удаляем
-        for booking in cancelled_bookings:
-            session.delete(booking)
+        # Переносим в архив — они остаются в выгрузке /export и истории загрузки
+        cancelled_count = archive_bookings(session, Booking.status == 'cancelled')
 
         session.commit()
+        availability_index.invalidate()
 
         await message.answer(
             f"✅ <b>Удалено {cancelled_count} отмененных бронирований.</b>\n\n"
@@ -1186,10 +1904,10 @@ async def delete_cancelled_bookings(message: Message):
 
 
 
-@admin_router.callback_query(F.data.startswith("admin_cancel_"))
-async def admin_cancel_booking(callback: CallbackQuery):
+@callbacks.route(AdminCancelCallback, admin=True)
+async def admin_cancel_booking(callback: CallbackQuery, state: FSMContext, callback_data: AdminCancelCallback):
     """Отмена бронирования админом"""
-    booking_id = int(callback.data.split("_")[-1])
+    booking_id = callback_data.booking_id
 
     session = get_session()
     try:
@@ -1200,6 +1918,7 @@ async def admin_cancel_booking(callback: CallbackQuery):
 
         booking.status = 'cancelled'
         session.commit()
+        await emit(BOOKING_RELEASED, booking)
 
         # Уведомляем пользователя
         try:
@@ -1225,10 +1944,10 @@ async def admin_cancel_booking(callback: CallbackQuery):
         session.close()
 
 
-@admin_router.callback_query(F.data.startswith("admin_call_"))
-async def admin_call_booking(callback: CallbackQuery):
+@callbacks.route(AdminCallCallback, admin=True)
+async def admin_call_booking(callback: CallbackQuery, state: FSMContext, callback_data: AdminCallCallback):
     """Позвонить по бронированию"""
-    booking_id = int(callback.data.split("_")[-1])
+    booking_id = callback_data.booking_id
 
     session = get_session()
     try:
@@ -1247,10 +1966,10 @@ async def admin_call_booking(callback: CallbackQuery):
         session.close()
 
 
-@admin_router.callback_query(F.data.startswith("admin_details_"))
-async def admin_details_booking(callback: CallbackQuery):
+@callbacks.route(AdminDetailsCallback, admin=True)
+async def admin_details_booking(callback: CallbackQuery, state: FSMContext, callback_data: AdminDetailsCallback):
     """Детальная информация о бронировании"""
-    booking_id = int(callback.data.split("_")[-1])
+    booking_id = callback_data.booking_id
 
     session = get_session()
     try:
@@ -1323,35 +2042,142 @@ async def handle_other_messages(message: Message, state: FSMContext):
         )
 
 
-# ========== ФУНКЦИЯ АВТОМАТИЧЕСКОГО УДАЛЕНИЯ УСТАРЕВШИХ БРОНЕЙ ==========
+# ========== АВТОМАТИЧЕСКОЕ УДАЛЕНИЕ УСТАРЕВШИХ БРОНЕЙ ==========
 
-async def cleanup_expired_bookings():
-    """Автоматическое удаление устаревших бронирований"""
-    while True:
-        try:
-            session = get_session()
-            now = datetime.now()
-            today = now.strftime('%Y-%m-%d')
-            current_time = now.strftime('%H:%M')
+async def expire_booking(booking_id):
+    """Удаление брони, время которой закончилось"""
+    session = get_session()
+    try:
+        booking = session.query(Booking).get(booking_id)
+        if not booking:
+            return
 
-            # Удаляем прошедшие бронирования
-            expired_bookings = session.query(Booking).filter(
-                (Booking.date < today) |
-                ((Booking.date == today) & (Booking.time < current_time))
-            ).all()
+        booking_end = get_booking_end(booking)
+        if booking_end > datetime.now():
+            # Бронь перенесли — ждем нового срока
+            scheduler.schedule(f"expire:{booking_id}", booking_end, expire_booking, booking_id)
+            return
 
-            if expired_bookings:
-                for booking in expired_bookings:
-                    session.delete(booking)
-                session.commit()
-                logger.info(f"Удалено {len(expired_bookings)} устаревших бронирований")
+        released = snapshot(booking)
+        archive_booking(session, booking)
+        session.commit()
+        logger.info(f"Бронь #{booking_id} перенесена в архив")
 
-            session.close()
+        if released.status in ('pending', 'confirmed'):
+            await emit(BOOKING_RELEASED, released)
+    except Exception as e:
+        logger.error(f"Ошибка при удалении устаревшей брони #{booking_id}: {e}")
+    finally:
+        session.close()
+
+
+@on(BOOKING_CREATED)
+def schedule_booking_expiry(booking):
+    """Поставить бронь в очередь на удаление после ее окончания"""
+    scheduler.schedule(f"expire:{booking.id}", get_booking_end(booking), expire_booking, booking.id)
+
+
+# ========== АВТООТМЕНА НЕПОДТВЕРЖДЕННЫХ БРОНЕЙ ==========
+
+# Срок отсчитывается не раньше запуска бота: у заявок из старых версий
+# created_at мог остаться временем импорта модуля, и после обновления
+# они отменились бы сразу при старте
+PENDING_TIMEOUT_FLOOR = datetime.now()
+
+
+def get_pending_deadline(created_at):
+    """Когда неподтвержденная заявка отменяется автоматически"""
+    start = max(created_at or PENDING_TIMEOUT_FLOOR, PENDING_TIMEOUT_FLOOR)
+    return start + timedelta(minutes=config.PENDING_TIMEOUT_MINUTES)
+
+
+async def expire_pending_booking(booking_id):
+    """Отмена брони, которую администратор не подтвердил вовремя"""
+    session = get_session()
+    try:
+        booking = session.query(Booking).get(booking_id)
+        if not booking or booking.status != 'pending':
+            return
+
+        deadline = get_pending_deadline(booking.created_at)
+        if deadline > datetime.now():
+            scheduler.schedule(f"pending:{booking_id}", deadline, expire_pending_booking, booking_id)
+            return
+
+        booking.status = 'cancelled'
+        session.commit()
+        logger.info(f"Бронь #{booking_id} отменена: не подтверждена за {config.PENDING_TIMEOUT_MINUTES} мин.")
+        await emit(BOOKING_RELEASED, booking)
+
+        try:
+            await bot.send_message(
+                booking.user_id,
+                f"⌛ <b>ВАША БРОНЬ НЕ БЫЛА ПОДТВЕРЖДЕНА</b>\n\n"
+                f"{format_booking_data(booking)}\n\n"
+                f"<i>К сожалению, администратор не успел подтвердить заявку, и столик освобожден. "
+                f"Оформите бронь заново или позвоните нам: {config.RESTAURANT_PHONE}</i>",
+                parse_mode="HTML"
+            )
         except Exception as e:
-            logger.error(f"Ошибка при очистке устаревших бронирований: {e}")
+            logger.error(f"Не удалось уведомить пользователя: {e}")
 
-        # Проверяем каждую минуту
-        await asyncio.sleep(60)
+        # Кнопка «Подтвердить» в старой заявке больше не сработает — предупреждаем админов
+        for admin_id in config.ADMIN_IDS:
+            try:
+                await bot.send_message(
+                    admin_id,
+                    f"⌛ <b>Заявка #{booking_id} отменена автоматически</b>: "
+                    f"не подтверждена за {config.PENDING_TIMEOUT_MINUTES} мин., столик освобожден.\n\n"
+                    f"{format_booking(booking)}",
+                    parse_mode="HTML"
+                )
+            except Exception as e:
+                logger.error(f"Не удалось уведомить админа {admin_id}: {e}")
+    except Exception as e:
+        logger.error(f"Ошибка при автоотмене брони #{booking_id}: {e}")
+    finally:
+        session.close()
+
+
+@on(BOOKING_CREATED)
+def schedule_pending_timeout(booking):
+    """Запланировать автоотмену, если бронь не подтвердят"""
+    if not config.PENDING_TIMEOUT_MINUTES or booking.status != 'pending':
+        return
+    if not getattr(booking, 'user_id', None):
+        # Импортированная бронь без гостя в Telegram: ее подтверждает администратор
+        return
+    deadline = get_pending_deadline(getattr(booking, 'created_at', None) or datetime.now())
+    scheduler.schedule(f"pending:{booking.id}", deadline, expire_pending_booking, booking.id)
+
+
+@on(BOOKING_CONFIRMED)
+@on(BOOKING_RELEASED)
+def cancel_pending_timeout(booking):
+    """Снять автоотмену после подтверждения или отмены брони"""
+    scheduler.cancel(f"pending:{booking.id}")
+
+
+def schedule_existing_bookings():
+    """Восстановить очередь удаления и автоотмены из БД при запуске"""
+    session = get_session()
+    try:
+        bookings = session.query(Booking.id, Booking.date, Booking.time, Booking.duration, Booking.guests).all()
+        for booking in bookings:
+            try:
+                schedule_booking_expiry(booking)
+            except ValueError:
+                logger.error(f"Некорректные дата/время у брони #{booking.id}")
+
+        # Неподтвержденные брони (индекс по status, created_at)
+        pending_bookings = session.query(Booking.id, Booking.user_id, Booking.status, Booking.created_at).filter(
+            Booking.status == 'pending'
+        ).order_by(Booking.created_at).all()
+        for booking in pending_bookings:
+            schedule_pending_timeout(booking)
+        logger.info(f"В планировщике {len(scheduler)} броней")
+    finally:
+        session.close()
 
 
 # ========== ЗАПУСК БОТА ==========
@@ -1364,8 +2190,16 @@ async def main():
         os.makedirs('data')
         logger.info("Создана директория 'data'")
 
-    # Запускаем задачу по очистке устаревших бронирований
-    asyncio.create_task(cleanup_expired_bookings())
+    # Запускаем планировщик: устаревшие брони удаляются точно по окончании
+    schedule_existing_bookings()
+    schedule_reminders()
+    waitlist.load()
+    availability_snapshot.start()
+    asyncio.create_task(scheduler.run())
+    asyncio.create_task(sender.run(bot))
+    api_runner = await start_api()
+    metrics_runner = await metrics.start_metrics_server()
+    watchdog = start_watchdog()
 
     logger.info(f"Запуск бота для ресторана '{config.RESTAURANT_NAME}'")
     logger.info(f"Часы работы: {config.WORKING_HOURS_STR}")
@@ -1378,6 +2212,12 @@ async def main():
     except Exception as e:
         logger.error(f"Ошибка при запуске бота: {e}")
     finally:
+        if api_runner is not None:
+            await api_runner.cleanup()
+        if metrics_runner is not None:
+            await metrics_runner.cleanup()
+        if watchdog is not None:
+            watchdog.stop()
         await bot.session.close()
 
 
@@ -0,0 +1,188 @@
+"""
+Календарь броней в формате iCalendar (.ics)
+Администратор получает все брони, гость — только свои. Каждый VEVENT
+кэшируется по id брони и хэшу ее полей: после изменения одной брони
+заново собирается только ее событие, остальные берутся из кэша.
+Ссылка на подписку защищена HMAC-токеном от id пользователя.
+"""
+import hashlib
+import hmac
+import logging
+from collections import OrderedDict
+from datetime import timedelta
+
+from config import config
+from database import get_session, Booking
+from utils import format_tables, get_booking_start
+
+logger = logging.getLogger(__name__)
+
+EVENT_CACHE_SIZE = 20000
+FEED_ADMIN = "admin"
+FEED_GUEST = "guest"
+
+ICS_STATUSES = {
+    'pending': 'TENTATIVE',
+    'confirmed': 'CONFIRMED',
+    'cancelled': 'CANCELLED',
+}
+
+# Поля брони, от которых зависит событие
+EVENT_FIELDS = (
+    'full_name', 'phone', 'zone', 'table_number', 'extra_tables',
+    'date', 'time', 'duration', 'guests', 'status', 'created_at'
+)
+
+
+def feed_token(user_id):
+    """Токен ссылки на календарь пользователя"""
+    secret = hashlib.sha256(f"calendar:{config.BOT_TOKEN}".encode()).digest()
+    return hmac.new(secret, str(user_id).encode(), hashlib.sha256).hexdigest()[:32]
+
+
+def check_feed_token(user_id, token):
+    return hmac.compare_digest(feed_token(user_id), token)
+
+
+def feed_kind(user_id):
+    return FEED_ADMIN if user_id in config.ADMIN_IDS else FEED_GUEST
+
+
+def _escape(value):
+    return (
+        str(value).replace('\\', '\\\\').replace(';', '\\;').replace(',', '\\,').replace('\n', '\\n')
+    )
+
+
+def _fold(line):
+    """Строки длиннее 75 байт переносятся (RFC 5545, 3.1)"""
+    encoded = line.encode('utf-8')
+    if len(encoded) <= 75:
+        return line
+    parts, current = [], b''
+    for char in line:
+        char_bytes = char.encode('utf-8')
+        if len(current) + len(char_bytes) > (75 if not parts else 74):
+            parts.append(current.decode('utf-8'))
+            current = b''
+        current += char_bytes
+    parts.append(current.decode('utf-8'))
+    return '\r\n '.join(parts)
+
+
+def _format_datetime(value):
+    return value.strftime('%Y%m%dT%H%M%S')
+
+
+def _render_event(booking, kind):
+    start = get_booking_start(booking)
+    end = start + timedelta(minutes=booking.duration or config.get_booking_duration(booking.guests, booking.time))
+    tables = format_tables(booking.table_number, booking.extra_tables)
+
+    if kind == FEED_ADMIN:
+        summary = f"🪑 {tables} · {booking.full_name} · {booking.guests} гост."
+        description = (
+            f"Бронь #{booking.id}\n"
+            f"Имя: {booking.full_name}\n"
+            f"Телефон: {booking.phone}\n"
+            f"Гостей: {booking.guests}\n"
+            f"Столик: {tables}"
+        )
+    else:
+        summary = f"{config.RESTAURANT_NAME}: столик на {booking.guests}"
+        description = (
+            f"Бронь #{booking.id}\n"
+            f"Столик: {tables}\n"
+            f"Телефон ресторана: {config.RESTAURANT_PHONE}"
+        )
+
+    created_at = booking.created_at or start
+    lines = [
+        "BEGIN:VEVENT",
+        f"UID:booking-{booking.id}@table-reservation-bot",
+        f"DTSTAMP:{_format_datetime(created_at)}",
+        f"DTSTART:{_format_datetime(start)}",
+        f"DTEND:{_format_datetime(end)}",
+        f"SUMMARY:{_escape(summary)}",
+        f"DESCRIPTION:{_escape(description)}",
+        f"LOCATION:{_escape(config.RESTAURANT_ADDRESS)}",
+        f"STATUS:{ICS_STATUSES.get(booking.status, 'TENTATIVE')}",
+        "END:VEVENT",
+    ]
+    return '\r\n'.join(_fold(line) for line in lines) + '\r\n'
+
+
+def booking_version(booking):
+    """Хэш полей брони: меняется, только когда меняется ее событие"""
+    raw = '\x1f'.join(str(getattr(booking, name)) for name in EVENT_FIELDS)
+    return hashlib.blake2b(raw.encode(), digest_size=8).hexdigest()
+
+
+class EventCache:
+    """Готовые VEVENT: (вид календаря, id брони) -> (версия брони, текст)"""
+
+    def __init__(self, max_size=EVENT_CACHE_SIZE):
+        self.max_size = max_size
+        self._events = OrderedDict()
+        self.hits = 0
+        self.misses = 0
+
+    def render(self, booking, kind):
+        key = (kind, booking.id)
+        version = booking_version(booking)
+        cached = self._events.get(key)
+        if cached is not None and cached[0] == version:
+            self.hits += 1
+            self._events.move_to_end(key)
+            return version, cached[1]
+
+        self.misses += 1
+        event = _render_event(booking, kind)
+        self._events[key] = (version, event)
+        self._events.move_to_end(key)
+        while len(self._events) > self.max_size:
+            self._events.popitem(last=False)
+        return version, event
+
+
+event_cache = EventCache()
+
+
+def render_feed(user_id):
+    """Календарь пользователя -> (содержимое .ics в байтах, ETag)"""
+    kind = feed_kind(user_id)
+
+    session = get_session()
+    try:
+        # Только нужные колонки: строки кортежей в разы дешевле объектов ORM
+        query = session.query(Booking.id, *[getattr(Booking, name) for name in EVENT_FIELDS])
+        if kind == FEED_GUEST:
+            query = query.filter(Booking.user_id == user_id)
+        bookings = query.order_by(Booking.date, Booking.time, Booking.id).all()
+    finally:
+        session.close()
+
+    calendar_name = config.RESTAURANT_NAME if kind == FEED_GUEST else f"{config.RESTAURANT_NAME}: все брони"
+    parts = [
+        "BEGIN:VCALENDAR\r\n",
+        "VERSION:2.0\r\n",
+        "PRODID:-//table-reservation-bot//RU\r\n",
+        "CALSCALE:GREGORIAN\r\n",
+        f"{_fold('X-WR-CALNAME:' + _escape(calendar_name))}\r\n",
+    ]
+    versions = hashlib.blake2b(kind.encode(), digest_size=8)
+    for booking in bookings:
+        version, event = event_cache.render(booking, kind)
+        versions.update(f"{booking.id}:{version};".encode())
+        parts.append(event)
+    parts.append("END:VCALENDAR\r\n")
+
+    return ''.join(parts).encode('utf-8'), f'"{versions.hexdigest()}"'
+
+
+def feed_url(user_id):
+    """Ссылка для подписки в календаре или None, если HTTP API выключен"""
+    if not config.API_PORT:
+        return None
+    base = config.API_PUBLIC_URL or f"http://{config.API_HOST}:{config.API_PORT}"
+    return f"{base.rstrip('/')}/calendar/{user_id}/{feed_token(user_id)}.ics"
@@ -0,0 +1,223 @@
+"""
+Данные inline-кнопок
+Каждая кнопка описана типизированной фабрикой CallbackData с коротким
+префиксом, а дата и время упакованы без разделителей: 'wj:20261020:1140:4'
+вместо 'wl_join_2026-10-20_19:00_4'. Все нажатия приходят в один обработчик,
+который выбирает нужную функцию по префиксу одним поиском в словаре.
+"""
+import logging
+
+from aiogram.filters.callback_data import CallbackData
+from aiogram.fsm.context import FSMContext
+from aiogram.types import CallbackQuery
+
+from config import config
+
+logger = logging.getLogger(__name__)
+
+SEPARATOR = ":"
+
+
+def pack_date(date_str):
+    """'2026-10-20' -> '20261020'"""
+    return date_str.replace('-', '')
+
+
+def unpack_date(day):
+    """'20261020' -> '2026-10-20'"""
+    return f"{day[:4]}-{day[4:6]}-{day[6:]}"
+
+
+def pack_time(time_str):
+    """'19:00' -> 1140 (минуты от начала дня)"""
+    hour, minute = map(int, time_str.split(':'))
+    return hour * 60 + minute
+
+
+def unpack_time(minutes):
+    """1140 -> '19:00'"""
+    return f"{minutes // 60:02d}:{minutes % 60:02d}"
+
+
+class _DateMixin:
+    @property
+    def date(self):
+        return unpack_date(self.day)
+
+
+class _TimeMixin:
+    @property
+    def time(self):
+        return unpack_time(self.minute)
+
+
+# ---------- Бронирование ----------
+
+class DateCallback(_DateMixin, CallbackData, prefix="d"):
+    day: str
+
+    @classmethod
+    def of(cls, date_str):
+        return cls(day=pack_date(date_str))
+
+
+class RepeatDateCallback(_DateMixin, CallbackData, prefix="rd"):
+    day: str
+
+    @classmethod
+    def of(cls, date_str):
+        return cls(day=pack_date(date_str))
+
+
+class RepeatManualCallback(CallbackData, prefix="rm"):
+    pass
+
+
+class BackToDatesCallback(CallbackData, prefix="bd"):
+    pass
+
+
+class TimeCallback(_TimeMixin, CallbackData, prefix="t"):
+    minute: int
+
+    @classmethod
+    def of(cls, time_str):
+        return cls(minute=pack_time(time_str))
+
+
+class BackToTimesCallback(CallbackData, prefix="bt"):
+    pass
+
+
+class PickSlotCallback(_DateMixin, _TimeMixin, CallbackData, prefix="ps"):
+    day: str
+    minute: int
+
+    @classmethod
+    def of(cls, date_str, time_str):
+        return cls(day=pack_date(date_str), minute=pack_time(time_str))
+
+
+class NoTablesCallback(CallbackData, prefix="n"):
+    minute: int | None = None  # время полностью занятого слота
+
+    @classmethod
+    def of(cls, time_str=None):
+        return cls(minute=pack_time(time_str) if time_str else None)
+
+    @property
+    def time(self):
+        return unpack_time(self.minute) if self.minute is not None else None
+
+
+class TableCallback(CallbackData, prefix="tb"):
+    number: int
+
+
+class AutoTableCallback(CallbackData, prefix="at"):
+    pass
+
+
+class GuestsCallback(CallbackData, prefix="g"):
+    count: int
+
+
+class MoreGuestsCallback(CallbackData, prefix="gm"):
+    pass
+
+
+class BackToGuestsCallback(CallbackData, prefix="bg"):
+    pass
+
+
+class ConfirmBookingCallback(CallbackData, prefix="cf"):
+    pass
+
+
+class CancelBookingCallback(CallbackData, prefix="cx"):
+    pass
+
+
+# ---------- Лист ожидания ----------
+
+class WaitlistJoinCallback(_DateMixin, _TimeMixin, CallbackData, prefix="wj"):
+    day: str
+    minute: int
+    guests: int
+
+    @classmethod
+    def of(cls, date_str, time_str, guests):
+        return cls(day=pack_date(date_str), minute=pack_time(time_str), guests=guests)
+
+
+class WaitlistClaimCallback(CallbackData, prefix="wc"):
+    entry_id: int
+
+
+class WaitlistDeclineCallback(CallbackData, prefix="wd"):
+    entry_id: int
+
+
+# ---------- Администратор ----------
+
+class AdminConfirmCallback(CallbackData, prefix="ac"):
+    booking_id: int
+
+
+class AdminCancelCallback(CallbackData, prefix="ax"):
+    booking_id: int
+
+
+class AdminCallCallback(CallbackData, prefix="ap"):
+    booking_id: int
+
+
+class AdminDetailsCallback(CallbackData, prefix="ai"):
+    booking_id: int
+
+
+class CallbackDispatcher:
+    """Таблица префикс -> (фабрика, обработчик, только для админов)"""
+
+    def __init__(self):
+        self._routes = {}
+
+    def route(self, factory, admin=False):
+        """Декоратор: обработчик (callback, state, callback_data) для кнопок фабрики"""
+        def decorator(handler):
+            if factory.__prefix__ in self._routes:
+                raise ValueError(f"Префикс {factory.__prefix__!r} уже занят")
+            self._routes[factory.__prefix__] = (factory, handler, admin)
+            return handler
+        return decorator
+
+    def handler_for(self, data):
+        """Обработчик, которому уйдет нажатие с такими данными, или None"""
+        route = self._routes.get((data or "").split(SEPARATOR, 1)[0])
+        return route[1] if route else None
+
+    async def dispatch(self, callback: CallbackQuery, state: FSMContext):
+        """Единственный обработчик нажатий на inline-кнопки"""
+        prefix = (callback.data or "").split(SEPARATOR, 1)[0]
+        route = self._routes.get(prefix)
+        if route is None:
+            # Кнопка из старого сообщения или чужой бот
+            await callback.answer("⌛ Кнопка устарела. Начните заново из меню.", show_alert=True)
+            return
+
+        factory, handler, admin = route
+        if admin and callback.from_user.id not in config.ADMIN_IDS:
+            await callback.answer("⛔ Доступно только администраторам.", show_alert=True)
+            return
+
+        try:
+            callback_data = factory.unpack(callback.data)
+        except (TypeError, ValueError) as e:
+            logger.warning(f"Некорректные данные кнопки {callback.data!r}: {e}")
+            await callback.answer("⌛ Кнопка устарела. Начните заново из меню.", show_alert=True)
+            return
+
+        return await handler(callback, state, callback_data)
+
+
+callbacks = CallbackDispatcher()
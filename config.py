@@ -10,6 +10,26 @@ class Config:
         self.BOT_TOKEN = os.getenv("BOT_TOKEN", "")
         self._admin_ids = None
 
+        # HTTP API свободных слотов для сайта (порт не задан — API выключен)
+        self.API_HOST = os.getenv("API_HOST", "127.0.0.1")
+        self.API_PORT = int(os.getenv("API_PORT", "0") or 0)
+        self.API_CORS_ORIGIN = os.getenv("API_CORS_ORIGIN", "*")
+        self.API_PUBLIC_URL = os.getenv("API_PUBLIC_URL", "")  # адрес API снаружи, для ссылок на календарь
+
+        # Метрики Prometheus только для локального сборщика (порт не задан — не отдаем)
+        self.METRICS_HOST = os.getenv("METRICS_HOST", "127.0.0.1")
+        self.METRICS_PORT = int(os.getenv("METRICS_PORT", "0") or 0)
+
+        # Профилирование SQL: медленный запрос и слишком много запросов на обновление
+        self.SLOW_QUERY_MS = float(os.getenv("SLOW_QUERY_MS", "100") or 100)
+        self.UPDATE_QUERY_WARN = int(os.getenv("UPDATE_QUERY_WARN", "50") or 50)
+
+        # Сторож цикла событий: зависание дольше стольких мс пишется со стеком (0 — выключен)
+        self.LOOP_STALL_MS = float(os.getenv("LOOP_STALL_MS", "250") or 0)
+
+        # Запись входящих обновлений в JSONL для benchmarks/replay.py (пусто — не писать)
+        self.RECORD_UPDATES_PATH = os.getenv("RECORD_UPDATES", "")
+
         # Загружаем конфигурацию из restaurant_config.py
         self.restaurant_config = RESTAURANT_CONFIG
 
@@ -33,6 +53,23 @@ class Config:
         # Интервал времени для бронирования
         self.TIME_INTERVAL = self.restaurant_config["time_interval"]  # в минутах
 
+        # Горизонт бронирования и поиск ближайшего свободного времени
+        self.BOOKING_DAYS_AHEAD = self.restaurant_config.get("booking_days_ahead", 10)
+        slot_search_config = self.restaurant_config.get("slot_search", {})
+        self.SLOT_SEARCH_TOLERANCE_MINUTES = slot_search_config.get("tolerance", 3 * 60)
+        self.SLOT_SEARCH_LIMIT = slot_search_config.get("limit", 6)
+
+        # Продолжительность брони
+        duration_config = self.restaurant_config.get("booking_duration", {})
+        self.BOOKING_DURATION_DEFAULT = duration_config.get("default", self.TIME_INTERVAL)
+        self.BOOKING_DURATION_BY_GUESTS = sorted(duration_config.get("by_guests", {}).items())
+        self.BOOKING_DURATION_BY_TIME = duration_config.get("by_time", {})
+        self.MAX_BOOKING_DURATION = max(
+            [self.BOOKING_DURATION_DEFAULT]
+            + [minutes for _, minutes in self.BOOKING_DURATION_BY_GUESTS]
+            + list(self.BOOKING_DURATION_BY_TIME.values())
+        )
+
         # Название ресторана
         self.RESTAURANT_NAME = self.restaurant_config["name"]
 
@@ -40,14 +77,38 @@ class Config:
         self.RESTAURANT_ADDRESS = self.restaurant_config["address"]
         self.RESTAURANT_PHONE = self.restaurant_config["phone"]
 
-        # Максимальное количество гостей за столом
-        self.MAX_GUESTS = self.restaurant_config["max_guests"]
+        # Автоотмена неподтвержденных броней (минуты, 0 — выключена)
+        self.PENDING_TIMEOUT_MINUTES = self.restaurant_config.get("pending_timeout", 0)
+
+        # Время на ответ по предложению из листа ожидания (минуты)
+        self.WAITLIST_OFFER_TIMEOUT_MINUTES = self.restaurant_config.get("waitlist_offer_timeout", 15)
 
-        # Зоны и столики
+        # Напоминания гостям (минуты до визита)
+        self.REMINDER_OFFSETS = self.restaurant_config.get("reminders", [])
+
+        # Зоны и столики: (зона, номер, мест)
         self.ZONES = self.restaurant_config["zones"]
-        self.TABLES = {
-            "main": self.restaurant_config["tables"]  # Все столики в основном зале
-        }
+        self.TABLE_LAYOUT = []
+        for table in self.restaurant_config["tables"]:
+            if isinstance(table, dict):
+                self.TABLE_LAYOUT.append((
+                    table.get("zone", "main"),
+                    table["number"],
+                    table.get("seats", self.restaurant_config["max_guests"])
+                ))
+            else:
+                self.TABLE_LAYOUT.append(("main", table, self.restaurant_config["max_guests"]))
+
+        self.TABLES = {}
+        for zone, number, seats in self.TABLE_LAYOUT:
+            self.TABLES.setdefault(zone, []).append(number)
+        self.TABLE_SEATS = {number: seats for _, number, seats in self.TABLE_LAYOUT}
+
+        # Максимальное количество гостей за одним столом
+        self.MAX_GUESTS = max(self.TABLE_SEATS.values(), default=self.restaurant_config["max_guests"])
+
+        # Группы соседних столиков, которые можно объединить
+        self.TABLE_GROUPS = self.restaurant_config.get("table_groups", [])
 
         # Проверка загрузки токена
         if not self.BOT_TOKEN:
@@ -55,6 +116,18 @@ class Config:
         else:
             print("✅ BOT_TOKEN успешно загружен")
 
+    def get_booking_duration(self, guests=None, time=None):
+        """Продолжительность брони в минутах: по слоту, затем по числу гостей"""
+        if time in self.BOOKING_DURATION_BY_TIME:
+            return self.BOOKING_DURATION_BY_TIME[time]
+
+        duration = self.BOOKING_DURATION_DEFAULT
+        if guests:
+            for min_guests, minutes in self.BOOKING_DURATION_BY_GUESTS:
+                if guests >= min_guests:
+                    duration = minutes
+        return duration
+
     @property
     def WORKING_HOURS_STR(self):
         """Время работы в строковом формате"""
@@ -1,8 +1,9 @@
-from sqlalchemy import create_engine, Column, Integer, String, DateTime, Boolean
+import os
+
+from sqlalchemy import create_engine, event, inspect, select, text, Column, Integer, String, DateTime, Boolean, Index
 from sqlalchemy.ext.declarative import declarative_base
 from sqlalchemy.orm import sessionmaker
 from datetime import datetime
-import pytz
 
 Base = declarative_base()
 
@@ -17,13 +18,50 @@ class Booking(Base):
     phone = Column(String)
     zone = Column(String, default='main')  # теперь только 'main'
     table_number = Column(Integer)
+    extra_tables = Column(String, nullable=True)  # "2,3" — сдвинутые столики для большой компании
     date = Column(String)  # YYYY-MM-DD
     time = Column(String)  # HH:MM
+    duration = Column(Integer, nullable=True)  # минут, NULL — по настройкам ресторана
     guests = Column(Integer)
     status = Column(String, default='pending')  # pending, confirmed, cancelled
-    created_at = Column(DateTime, default=datetime.now(pytz.timezone('Europe/Moscow')))
+    created_at = Column(DateTime, default=datetime.now)
     admin_notified = Column(Boolean, default=False)
 
+    __table_args__ = (
+        # Поиск неподтвержденных броней с истекшим сроком
+        Index('ix_bookings_status_created_at', 'status', 'created_at'),
+    )
+
+
+class BookingArchive(Base):
+    """Прошедшие брони: переносятся сюда из bookings после окончания визита"""
+    __tablename__ = 'bookings_archive'
+
+    # Свой ключ: id в bookings без AUTOINCREMENT, SQLite выдает id архивной брони заново
+    id = Column(Integer, primary_key=True)
+    booking_id = Column(Integer, index=True)  # id исходной брони
+    user_id = Column(Integer)
+    username = Column(String)
+    full_name = Column(String)
+    phone = Column(String)
+    zone = Column(String)
+    table_number = Column(Integer)
+    extra_tables = Column(String, nullable=True)
+    date = Column(String, index=True)  # YYYY-MM-DD
+    time = Column(String)  # HH:MM
+    duration = Column(Integer, nullable=True)
+    guests = Column(Integer)
+    status = Column(String)
+    created_at = Column(DateTime)
+    archived_at = Column(DateTime, default=datetime.now)
+
+
+# Колонки, которые переносятся из bookings в архив (id брони — в booking_id)
+ARCHIVED_COLUMNS = [
+    'user_id', 'username', 'full_name', 'phone', 'zone', 'table_number', 'extra_tables',
+    'date', 'time', 'duration', 'guests', 'status', 'created_at'
+]
+
 
 class User(Base):
     __tablename__ = 'users'
@@ -34,16 +72,106 @@ class User(Base):
     full_name = Column(String)
     phone = Column(String, nullable=True)
     is_admin = Column(Boolean, default=False)
-    created_at = Column(DateTime, default=datetime.now(pytz.timezone('Europe/Moscow')))
+    created_at = Column(DateTime, default=datetime.now)
+
+
+class ScheduledJob(Base):
+    __tablename__ = 'scheduled_jobs'
+
+    id = Column(Integer, primary_key=True)
+    kind = Column(String)  # reminder
+    booking_id = Column(Integer, index=True)
+    user_id = Column(Integer)
+    run_at = Column(DateTime)
+    offset_minutes = Column(Integer)  # за сколько минут до визита
+    status = Column(String, default='pending')  # pending, sent, cancelled
+    created_at = Column(DateTime, default=datetime.now)
+
+    __table_args__ = (
+        Index('ix_scheduled_jobs_status_run_at', 'status', 'run_at'),
+    )
+
+
+class WaitlistEntry(Base):
+    __tablename__ = 'waitlist'
+
+    id = Column(Integer, primary_key=True)
+    user_id = Column(Integer)
+    zone = Column(String, default='main')
+    date = Column(String)  # YYYY-MM-DD
+    time = Column(String)  # HH:MM
+    guests = Column(Integer)
+    status = Column(String, default='waiting')  # waiting, offered, claimed, expired, cancelled
+    offered_table = Column(Integer, nullable=True)
+    offer_expires_at = Column(DateTime, nullable=True)
+    created_at = Column(DateTime, default=datetime.now)
+
+    __table_args__ = (
+        Index('ix_waitlist_status_date', 'status', 'date'),
+    )
+
+
+# Создаем базу данных (DATABASE_URL — другая база, например временная для бенчмарков)
+engine = create_engine(os.getenv("DATABASE_URL", 'sqlite:///data/database.db'))
+
+
+@event.listens_for(engine, "connect")
+def _set_sqlite_pragmas(dbapi_connection, connection_record):
+    """WAL: долгое чтение (выгрузка /export) не блокирует запись броней"""
+    if engine.dialect.name != 'sqlite':
+        return
+    cursor = dbapi_connection.cursor()
+    try:
+        cursor.execute("PRAGMA journal_mode=WAL")
+        cursor.execute("PRAGMA synchronous=NORMAL")
+    finally:
+        cursor.close()
 
 
-# Создаем базу данных
-engine = create_engine('sqlite:///data/database.db')
 Base.metadata.create_all(engine)
 
+
+def _upgrade_schema():
+    """create_all не меняет существующие таблицы: добавляем новые колонки и индексы"""
+    inspector = inspect(engine)
+    with engine.begin() as connection:
+        for table in Base.metadata.sorted_tables:
+            existing_columns = {column['name'] for column in inspector.get_columns(table.name)}
+            for column in table.columns:
+                if column.name not in existing_columns:
+                    column_type = column.type.compile(dialect=engine.dialect)
+                    connection.execute(text(f"ALTER TABLE {table.name} ADD COLUMN {column.name} {column_type}"))
+
+        # Архив до появления booking_id хранил id брони в id
+        connection.execute(text("UPDATE bookings_archive SET booking_id = id WHERE booking_id IS NULL"))
+
+    for table in Base.metadata.sorted_tables:
+        for index in table.indexes:
+            index.create(engine, checkfirst=True)
+
+
+_upgrade_schema()
+
 Session = sessionmaker(bind=engine)
 
 
 def get_session():
     return Session()
 
+
+def archive_booking(session, booking):
+    """Перенести бронь в архив в текущей транзакции сессии"""
+    session.add(BookingArchive(booking_id=booking.id, **{name: getattr(booking, name) for name in ARCHIVED_COLUMNS}))
+    session.delete(booking)
+
+
+def archive_bookings(session, *criteria):
+    """Перенести в архив все брони, подходящие под условия. Возвращает их число"""
+    columns = [Booking.id] + [getattr(Booking, name) for name in ARCHIVED_COLUMNS]
+    session.execute(
+        BookingArchive.__table__.insert().from_select(
+            ['booking_id'] + ARCHIVED_COLUMNS, select(*columns).where(*criteria)
+        )
+    )
+    return session.query(Booking).filter(*criteria).delete(synchronize_session=False)
+
@@ -0,0 +1,116 @@
+"""
+Выгрузка бронирований в CSV или JSONL
+Строки читаются из bookings и bookings_archive курсором с yield_per
+и сразу пишутся в файл, поэтому память не зависит от размера таблиц.
+"""
+import asyncio
+import csv
+import json
+from datetime import datetime
+
+from sqlalchemy import literal
+
+from database import get_session, Booking, BookingArchive
+
+EXPORT_FORMATS = ('csv', 'jsonl')
+EXPORT_STATUSES = ('pending', 'confirmed', 'cancelled')
+EXPORT_COLUMNS = [
+    'source', 'id', 'user_id', 'username', 'full_name', 'phone', 'zone', 'table_number', 'extra_tables',
+    'date', 'time', 'duration', 'guests', 'status', 'created_at', 'archived_at'
+]
+
+BATCH_SIZE = 1000  # строк за одно чтение из курсора
+PROGRESS_EVERY = 10000  # как часто сообщать о прогрессе
+
+
+def _parse_date(value):
+    for date_format in ('%Y-%m-%d', '%d.%m.%Y'):
+        try:
+            return datetime.strptime(value, date_format).strftime('%Y-%m-%d')
+        except ValueError:
+            continue
+    return None
+
+
+def parse_export_args(args):
+    """'/export jsonl 01.10.2026 31.10.2026 confirmed' -> (формат, с, по, статусы)
+
+    Все аргументы необязательны и идут в любом порядке: первая дата — начало
+    периода, вторая — конец. Ошибка в аргументе — ValueError с пояснением.
+    """
+    export_format, date_from, date_to, statuses = 'csv', None, None, []
+
+    for arg in (args or '').split():
+        value = arg.lower()
+        if value in EXPORT_FORMATS:
+            export_format = value
+        elif value in EXPORT_STATUSES:
+            statuses.append(value)
+        elif _parse_date(arg):
+            if date_from is None:
+                date_from = _parse_date(arg)
+            elif date_to is None:
+                date_to = _parse_date(arg)
+            else:
+                raise ValueError("Укажите не больше двух дат: начало и конец периода")
+        else:
+            raise ValueError(f"Непонятный аргумент: {arg}")
+
+    if date_from and date_to and date_from > date_to:
+        date_from, date_to = date_to, date_from
+    return export_format, date_from, date_to, statuses
+
+
+def _query(session, model, source, date_from, date_to, statuses):
+    archived_at = model.archived_at if model is BookingArchive else literal(None)
+    booking_id = model.booking_id if model is BookingArchive else model.id
+    columns = (
+        [literal(source), booking_id] + [getattr(model, name) for name in EXPORT_COLUMNS[2:-1]] + [archived_at]
+    )
+
+    query = session.query(*columns)
+    if date_from:
+        query = query.filter(model.date >= date_from)
+    if date_to:
+        query = query.filter(model.date <= date_to)
+    if statuses:
+        query = query.filter(model.status.in_(statuses))
+    return query.order_by(model.id).yield_per(BATCH_SIZE)
+
+
+def _format_value(value):
+    if isinstance(value, datetime):
+        return value.strftime('%Y-%m-%d %H:%M:%S')
+    return value
+
+
+async def export_bookings(file, export_format='csv', date_from=None, date_to=None, statuses=None, progress=None):
+    """Записать брони в открытый текстовый файл. Возвращает число строк
+
+    progress(число строк) — корутина, вызывается каждые PROGRESS_EVERY строк
+    """
+    if export_format == 'csv':
+        writer = csv.writer(file)
+        writer.writerow(EXPORT_COLUMNS)
+        write_row = writer.writerow
+    else:
+        def write_row(row):
+            file.write(json.dumps(dict(zip(EXPORT_COLUMNS, row)), ensure_ascii=False) + '\n')
+
+    exported = 0
+    session = get_session()
+    try:
+        for model, source in ((Booking, 'live'), (BookingArchive, 'archive')):
+            for row in _query(session, model, source, date_from, date_to, statuses):
+                write_row([_format_value(value) for value in row])
+                exported += 1
+
+                if exported % BATCH_SIZE == 0:
+                    # Не держим цикл событий на больших выгрузках
+                    await asyncio.sleep(0)
+                if progress and exported % PROGRESS_EVERY == 0:
+                    await progress(exported)
+    finally:
+        session.close()
+
+    return exported
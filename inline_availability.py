@@ -0,0 +1,200 @@
+"""
+Свободные столики в inline-режиме: '@bot 20.10 19:00 4' в любом чате
+Запрос разбирается в (дата, время, гостей), ответ строится по индексу
+занятости и кэшируется по этому ключу вместе с версией индекса: пока
+брони не менялись, одинаковые запросы в час пик не пересчитываются.
+"""
+import logging
+from collections import OrderedDict, namedtuple
+from datetime import datetime, timedelta
+
+from aiogram.types import InlineQueryResultArticle, InputTextMessageContent
+
+from availability import availability_index
+from config import config
+from utils import (
+    allocate_tables, find_nearest_slots, format_tables, generate_time_slots,
+    get_available_tables, validate_date, validate_time
+)
+
+logger = logging.getLogger(__name__)
+
+INLINE_CACHE_TIME = 10  # секунд, сколько Telegram держит ответ у себя
+RESULT_CACHE_TTL = timedelta(seconds=60)  # прошедшие слоты сегодня уходят из ответа не позже
+RESULT_CACHE_SIZE = 1000
+MAX_RESULTS = 20
+DEFAULT_GUESTS = 2
+
+AvailabilityQuery = namedtuple("AvailabilityQuery", ["date", "time", "guests"])
+
+
+def _parse_date(token, today):
+    if token in ('сегодня', 'today'):
+        return today
+    if token in ('завтра', 'tomorrow'):
+        return today + timedelta(days=1)
+    for date_format in ('%d.%m.%Y', '%Y-%m-%d'):
+        try:
+            return datetime.strptime(token, date_format).date()
+        except ValueError:
+            continue
+    try:
+        # Без года: ближайшая такая дата, не раньше сегодняшней
+        day = datetime.strptime(f"{token}.{today.year}", '%d.%m.%Y').date()
+    except ValueError:
+        return None
+    return day if day >= today else day.replace(year=today.year + 1)
+
+
+def parse_query(text):
+    """'20.10 19:00 4' -> AvailabilityQuery. Порядок слов любой, нужна только дата
+
+    Ошибка в запросе — ValueError с пояснением для гостя.
+    """
+    today = datetime.now().date()
+    date = time = guests = None
+
+    for token in text.lower().split():
+        if ':' in token:
+            valid, message = validate_time(token)
+            if not valid:
+                raise ValueError(message)
+            hour, minute = map(int, token.split(':'))
+            time = f"{hour:02d}:{minute:02d}"
+        elif token.isdigit():
+            guests = int(token)
+        else:
+            date = _parse_date(token, today)
+            if date is None:
+                raise ValueError(f"Не понял «{token}». Пример: 20.10 19:00 4")
+
+    if date is None:
+        raise ValueError("Укажите дату, например: 20.10 19:00 4")
+    date = date.strftime('%Y-%m-%d')
+    valid, message = validate_date(date)
+    if not valid:
+        raise ValueError(message)
+    if time is not None:
+        valid, message = validate_time(time, date)
+        if not valid:
+            raise ValueError(message)
+    if guests is not None and guests < 1:
+        raise ValueError("Количество гостей должно быть больше нуля")
+
+    return AvailabilityQuery(date, time, guests or DEFAULT_GUESTS)
+
+
+class ResultCache:
+    """Ответы на запросы: (запрос, версия индекса) -> результаты, с TTL и вытеснением старых"""
+
+    def __init__(self, ttl=RESULT_CACHE_TTL, max_size=RESULT_CACHE_SIZE):
+        self.ttl = ttl
+        self.max_size = max_size
+        self._results = OrderedDict()
+        self.hits = 0
+        self.misses = 0
+
+    def get(self, key):
+        entry = self._results.get(key)
+        if entry is None or entry[0] < datetime.now():
+            self.misses += 1
+            return None
+        self.hits += 1
+        self._results.move_to_end(key)
+        return entry[1]
+
+    def put(self, key, results):
+        self._results[key] = (datetime.now() + self.ttl, results)
+        self._results.move_to_end(key)
+        while len(self._results) > self.max_size:
+            self._results.popitem(last=False)
+
+
+result_cache = ResultCache()
+
+
+def _article(result_id, title, description, text):
+    return InlineQueryResultArticle(
+        id=result_id,
+        title=title,
+        description=description,
+        input_message_content=InputTextMessageContent(message_text=text, parse_mode="HTML")
+    )
+
+
+def _slot_text(date, time, tables):
+    date_str = datetime.strptime(date, '%Y-%m-%d').strftime('%d.%m.%Y')
+    seats = sum(config.TABLE_SEATS.get(table, config.MAX_GUESTS) for table in tables)
+    return (
+        f"🍽️ <b>{config.RESTAURANT_NAME}</b>\n\n"
+        f"📅 {date_str} в {time}\n"
+        f"🪑 Свободен столик №{format_tables(tables[0], tables[1:])} (до {seats} гостей)\n\n"
+        f"📍 {config.RESTAURANT_ADDRESS}\n"
+        f"📞 {config.RESTAURANT_PHONE}"
+    )
+
+
+def _tables_for_slot(query, time):
+    """Свободные столики для компании: отдельные или одно сочетание соседних"""
+    tables = get_available_tables(query.date, time, guests=query.guests)
+    if tables:
+        tables.sort(key=lambda table: config.TABLE_SEATS.get(table, config.MAX_GUESTS))
+        return [[table] for table in tables]
+    combined = allocate_tables(query.date, time, query.guests)
+    return [combined] if combined else []
+
+
+def _future_slots(date):
+    slots = generate_time_slots()
+    now = datetime.now()
+    if date != now.strftime('%Y-%m-%d'):
+        return slots
+    return [slot for slot in slots if slot > now.strftime('%H:%M')]
+
+
+def _build_results(query):
+    results = []
+    if query.time is not None:
+        for tables in _tables_for_slot(query, query.time):
+            seats = sum(config.TABLE_SEATS.get(table, config.MAX_GUESTS) for table in tables)
+            results.append(_article(
+                f"{query.date}:{query.time}:{'-'.join(map(str, tables))}",
+                f"🪑 Столик №{format_tables(tables[0], tables[1:])} — {query.time}",
+                f"До {seats} гостей",
+                _slot_text(query.date, query.time, tables)
+            ))
+        if results:
+            return results[:MAX_RESULTS]
+
+        # Время занято — предлагаем ближайшие свободные слоты
+        for date, time, tables in find_nearest_slots(query.guests, query.date, query.time):
+            date_str = datetime.strptime(date, '%Y-%m-%d').strftime('%d.%m')
+            results.append(_article(
+                f"{date}:{time}:{'-'.join(map(str, tables))}",
+                f"🕒 {date_str} в {time} — столик №{format_tables(tables[0], tables[1:])}",
+                f"На {query.time} мест нет, ближайшее свободное время",
+                _slot_text(date, time, tables)
+            ))
+        return results[:MAX_RESULTS]
+
+    for time in _future_slots(query.date):
+        tables = _tables_for_slot(query, time)
+        if not tables:
+            continue
+        results.append(_article(
+            f"{query.date}:{time}",
+            f"⏰ {time} — свободно столиков: {len(tables)}",
+            f"Для компании из {query.guests}",
+            _slot_text(query.date, time, tables[0])
+        ))
+    return results[:MAX_RESULTS]
+
+
+def get_results(query):
+    """Результаты для разобранного запроса, из кэша, если занятость не менялась"""
+    key = (query, availability_index.version)
+    results = result_cache.get(key)
+    if results is None:
+        results = _build_results(query)
+        result_cache.put(key, results)
+    return results
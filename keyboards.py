@@ -1,7 +1,16 @@
 from aiogram.types import InlineKeyboardMarkup, InlineKeyboardButton, ReplyKeyboardMarkup, KeyboardButton
 from datetime import datetime, timedelta
 from config import config
-from utils import get_available_tables, is_within_working_hours, generate_time_slots
+from utils import get_available_tables, is_within_working_hours, generate_time_slots, get_max_party_size
+from availability_snapshot import availability_snapshot
+from callbacks import (
+    AdminCallCallback, AdminCancelCallback, AdminConfirmCallback, AdminDetailsCallback,
+    AutoTableCallback, BackToDatesCallback, BackToGuestsCallback, BackToTimesCallback,
+    CancelBookingCallback, ConfirmBookingCallback, DateCallback, GuestsCallback,
+    MoreGuestsCallback, NoTablesCallback, PickSlotCallback, RepeatDateCallback,
+    RepeatManualCallback, TableCallback, TimeCallback, WaitlistClaimCallback,
+    WaitlistDeclineCallback, WaitlistJoinCallback
+)
 
 
 # Основное меню (более интуитивное)
@@ -9,6 +18,7 @@ def get_main_menu():
     keyboard = ReplyKeyboardMarkup(
         keyboard=[
             [KeyboardButton(text="🎯 Забронировать столик")],
+            [KeyboardButton(text="🔁 Повторить бронь")],
             [KeyboardButton(text="📋 Мои бронирования"), KeyboardButton(text="ℹ️ О нас")],
             [KeyboardButton(text="🆘 Помощь"), KeyboardButton(text="📞 Контакты")]
         ],
@@ -33,14 +43,15 @@ def get_admin_menu():
 
 
 # Клавиатура для выбора даты (просто числа на 10 дней вперед)
-def get_date_selection():
+# callback_factory позволяет переиспользовать клавиатуру для повторной брони
+def get_date_selection(callback_factory=DateCallback):
     today = datetime.now()
 
     keyboard = []
     row = []
 
-    # Показываем 10 дней вперед, включая сегодня
-    for i in range(10):
+    # Показываем BOOKING_DAYS_AHEAD дней вперед, включая сегодня
+    for i in range(config.BOOKING_DAYS_AHEAD):
         day_date = today + timedelta(days=i)
         date_str = day_date.strftime('%Y-%m-%d')
 
@@ -55,17 +66,22 @@ def get_date_selection():
             if now_in_minutes > config.LAST_BOOKING_TIME_MINUTES:
                 continue  # Пропускаем сегодняшний день
 
+        # Полностью занятые дни не показываем
+        free_slots = availability_snapshot.free_slots(date_str)
+        if not free_slots:
+            continue
+
         # Эмодзи для сегодня и завтра
         if i == 0:
-            day_text = f"🟢 {day_num}"
+            day_text = f"🟢 {day_num} ({free_slots})"
         elif i == 1:
-            day_text = f"🟡 {day_num}"
+            day_text = f"🟡 {day_num} ({free_slots})"
         else:
-            day_text = f"⚪ {day_num}"
+            day_text = f"⚪ {day_num} ({free_slots})"
 
         row.append(InlineKeyboardButton(
             text=day_text,
-            callback_data=f"date_{date_str}"
+            callback_data=callback_factory.of(date_str).pack()
         ))
 
         if len(row) == 5:  # 5 кнопок в ряду
@@ -76,6 +92,11 @@ def get_date_selection():
     if row:
         keyboard.append(row)
 
+    if not keyboard:
+        keyboard.append([
+            InlineKeyboardButton(text="❌ Все ближайшие дни заняты", callback_data=NoTablesCallback().pack())
+        ])
+
     return InlineKeyboardMarkup(inline_keyboard=keyboard)
 
 
@@ -106,20 +127,19 @@ def get_time_slots(date, zone='main'):
                 continue  # Пропускаем прошедшее время
 
         if is_within_working_hours(time_str):
-            available_tables = get_available_tables(date, time_str, zone)
+            free_count = availability_snapshot.free_count(date, time_str, zone)
 
-            if available_tables:
-                free_count = len(available_tables)
+            if free_count:
                 button_text = f"{time_str} ({free_count} мест)"
                 row.append(InlineKeyboardButton(
                     text=button_text,
-                    callback_data=f"time_{time_str}"
+                    callback_data=TimeCallback.of(time_str).pack()
                 ))
             else:
                 button_text = f"{time_str} (нет мест)"
                 row.append(InlineKeyboardButton(
                     text=button_text,
-                    callback_data="no_tables"
+                    callback_data=NoTablesCallback.of(time_str).pack()
                 ))
 
         if len(row) == 2:  # 2 кнопки в ряду
@@ -134,13 +154,13 @@ def get_time_slots(date, zone='main'):
         keyboard.append([
             InlineKeyboardButton(
                 text="❌ Нет доступного времени на этот день",
-                callback_data="no_tables"
+                callback_data=NoTablesCallback().pack()
             )
         ])
 
     # Кнопка назад
     keyboard.append([
-        InlineKeyboardButton(text="↩️ Назад к выбору даты", callback_data="back_to_date_selection")
+        InlineKeyboardButton(text="↩️ Назад к выбору даты", callback_data=BackToDatesCallback().pack())
     ])
 
     return InlineKeyboardMarkup(inline_keyboard=keyboard)
@@ -170,7 +190,7 @@ def get_tables_keyboard(date, time, zone='main'):
     keyboard.append([
         InlineKeyboardButton(
             text=f"🕐 {time} | Выберите столик:",
-            callback_data="no_tables"
+            callback_data=NoTablesCallback().pack()
         )
     ])
 
@@ -188,19 +208,20 @@ def get_tables_keyboard(date, time, zone='main'):
         keyboard.append([
             InlineKeyboardButton(
                 text=message,
-                callback_data="no_tables"
+                callback_data=NoTablesCallback().pack()
             )
         ])
     else:
         row = []
 
         for table_num in config.TABLES.get(zone, []):
+            seats = config.TABLE_SEATS.get(table_num, config.MAX_GUESTS)
             if table_num in available_tables:
-                button_text = f"🟢 {table_num}"
-                callback_data = f"table_{table_num}"
+                button_text = f"🟢 {table_num} ({seats}👤)"
+                callback_data = TableCallback(number=table_num).pack()
             else:
-                button_text = f"🔴 {table_num}"
-                callback_data = "no_tables"
+                button_text = f"🔴 {table_num} ({seats}👤)"
+                callback_data = NoTablesCallback().pack()
 
             row.append(InlineKeyboardButton(text=button_text, callback_data=callback_data))
 
@@ -211,21 +232,87 @@ def get_tables_keyboard(date, time, zone='main'):
         if row:
             keyboard.append(row)
 
+        keyboard.append([
+            InlineKeyboardButton(text="🎲 Подобрать столик автоматически", callback_data=AutoTableCallback().pack())
+        ])
+
     # Кнопки навигации
     keyboard.append([
-        InlineKeyboardButton(text="↩️ Назад к выбору времени", callback_data="back_to_time_selection")
+        InlineKeyboardButton(text="↩️ Назад к выбору времени", callback_data=BackToTimesCallback().pack())
+    ])
+
+    return InlineKeyboardMarkup(inline_keyboard=keyboard)
+
+
+# Клавиатура выбора даты для повторной брони
+def get_repeat_date_selection():
+    markup = get_date_selection(callback_factory=RepeatDateCallback)
+    markup.inline_keyboard.append([
+        InlineKeyboardButton(text="✏️ Оформить заново", callback_data=RepeatManualCallback().pack())
+    ])
+    return markup
+
+
+# Клавиатура для записи в лист ожидания
+def get_waitlist_join_keyboard(date, time, nearest_slots=None):
+    keyboard = []
+    row = []
+
+    # Ближайшее свободное время — сразу к выбору столика
+    for slot_date, slot_time, _ in nearest_slots or []:
+        day_text = datetime.strptime(slot_date, '%Y-%m-%d').strftime('%d.%m')
+        row.append(InlineKeyboardButton(
+            text=f"🕐 {day_text} {slot_time}",
+            callback_data=PickSlotCallback.of(slot_date, slot_time).pack()
+        ))
+
+        if len(row) == 2:
+            keyboard.append(row)
+            row = []
+
+    if row:
+        keyboard.append(row)
+        row = []
+
+    for guests in range(1, config.MAX_GUESTS + 1):
+        row.append(InlineKeyboardButton(
+            text=f"👥 {guests}",
+            callback_data=WaitlistJoinCallback.of(date, time, guests).pack()
+        ))
+
+        if len(row) == 5:
+            keyboard.append(row)
+            row = []
+
+    if row:
+        keyboard.append(row)
+
+    keyboard.append([
+        InlineKeyboardButton(text="↩️ Назад к выбору времени", callback_data=BackToTimesCallback().pack())
     ])
 
     return InlineKeyboardMarkup(inline_keyboard=keyboard)
 
 
+# Клавиатура предложения столика из листа ожидания
+def get_waitlist_offer_keyboard(entry_id):
+    keyboard = [
+        [
+            InlineKeyboardButton(text="✅ Забронировать", callback_data=WaitlistClaimCallback(entry_id=entry_id).pack()),
+            InlineKeyboardButton(text="❌ Не нужно", callback_data=WaitlistDeclineCallback(entry_id=entry_id).pack())
+        ]
+    ]
+    return InlineKeyboardMarkup(inline_keyboard=keyboard)
+
+
 # Клавиатура для выбора количества гостей
 def get_guests_keyboard():
     keyboard = [
-        [InlineKeyboardButton(text="👤 1-2 гостя", callback_data="guests_2")],
-        [InlineKeyboardButton(text="👥 3-4 гостя", callback_data="guests_4")],
-        [InlineKeyboardButton(text="👨‍👩‍👧‍👦 5-6 гостей", callback_data="guests_6")],
-        [InlineKeyboardButton(text="👨‍👩‍👧‍👦👨‍👩‍👧‍👦 7+ гостей", callback_data="guests_more")]
+        [InlineKeyboardButton(text="👤 1-2 гостя", callback_data=GuestsCallback(count=2).pack())],
+        [InlineKeyboardButton(text="👥 3-4 гостя", callback_data=GuestsCallback(count=4).pack())],
+        [InlineKeyboardButton(text="👨‍👩‍👧‍👦 5-6 гостей", callback_data=GuestsCallback(count=6).pack())],
+        [InlineKeyboardButton(text="👨‍👩‍👧‍👦👨‍👩‍👧‍👦 7+ гостей", callback_data=MoreGuestsCallback().pack())],
+        [InlineKeyboardButton(text="↩️ Назад к выбору столика", callback_data=BackToTimesCallback().pack())]
     ]
     return InlineKeyboardMarkup(inline_keyboard=keyboard)
 
@@ -235,8 +322,9 @@ def get_more_guests_keyboard():
     keyboard = []
     row = []
 
-    for guests in range(7, config.MAX_GUESTS + 1):
-        row.append(InlineKeyboardButton(text=str(guests), callback_data=f"guests_{guests}"))
+    # Большие компании рассаживаются за сдвинутые столики
+    for guests in range(7, get_max_party_size() + 1):
+        row.append(InlineKeyboardButton(text=str(guests), callback_data=GuestsCallback(count=guests).pack()))
 
         if len(row) == 4:
             keyboard.append(row)
@@ -246,7 +334,7 @@ def get_more_guests_keyboard():
         keyboard.append(row)
 
     keyboard.append([
-        InlineKeyboardButton(text="↩️ Назад", callback_data="back_to_guests")
+        InlineKeyboardButton(text="↩️ Назад", callback_data=BackToGuestsCallback().pack())
     ])
 
     return InlineKeyboardMarkup(inline_keyboard=keyboard)
@@ -255,7 +343,7 @@ def get_more_guests_keyboard():
 # Клавиатура для ввода имени
 def get_name_input_keyboard():
     keyboard = [[
-        InlineKeyboardButton(text="↩️ Назад", callback_data="back_to_guests")
+        InlineKeyboardButton(text="↩️ Назад", callback_data=BackToGuestsCallback().pack())
     ]]
     return InlineKeyboardMarkup(inline_keyboard=keyboard)
 
@@ -279,8 +367,8 @@ def get_contact_keyboard():
 def get_confirm_keyboard():
     keyboard = [
         [
-            InlineKeyboardButton(text="✅ Подтвердить бронь", callback_data="confirm_booking"),
-            InlineKeyboardButton(text="❌ Отменить", callback_data="cancel_booking")
+            InlineKeyboardButton(text="✅ Подтвердить бронь", callback_data=ConfirmBookingCallback().pack()),
+            InlineKeyboardButton(text="❌ Отменить", callback_data=CancelBookingCallback().pack())
         ]
     ]
     return InlineKeyboardMarkup(inline_keyboard=keyboard)
@@ -290,12 +378,12 @@ def get_confirm_keyboard():
 def get_booking_actions(booking_id):
     keyboard = [
         [
-            InlineKeyboardButton(text="✅ Подтвердить", callback_data=f"admin_confirm_{booking_id}"),
-            InlineKeyboardButton(text="❌ Отклонить", callback_data=f"admin_cancel_{booking_id}")
+            InlineKeyboardButton(text="✅ Подтвердить", callback_data=AdminConfirmCallback(booking_id=booking_id).pack()),
+            InlineKeyboardButton(text="❌ Отклонить", callback_data=AdminCancelCallback(booking_id=booking_id).pack())
         ],
         [
-            InlineKeyboardButton(text="📞 Позвонить", callback_data=f"admin_call_{booking_id}"),
-            InlineKeyboardButton(text="ℹ️ Детали", callback_data=f"admin_details_{booking_id}")
+            InlineKeyboardButton(text="📞 Позвонить", callback_data=AdminCallCallback(booking_id=booking_id).pack()),
+            InlineKeyboardButton(text="ℹ️ Детали", callback_data=AdminDetailsCallback(booking_id=booking_id).pack())
         ]
     ]
     return InlineKeyboardMarkup(inline_keyboard=keyboard)
@@ -304,14 +392,14 @@ def get_booking_actions(booking_id):
 # Клавиатуры "Назад" для каждого этапа
 def get_back_to_dates_keyboard():
     keyboard = [[
-        InlineKeyboardButton(text="↩️ Назад к выбору даты", callback_data="back_to_date_selection")
+        InlineKeyboardButton(text="↩️ Назад к выбору даты", callback_data=BackToDatesCallback().pack())
     ]]
     return InlineKeyboardMarkup(inline_keyboard=keyboard)
 
 
 def get_back_to_times_keyboard():
     keyboard = [[
-        InlineKeyboardButton(text="↩️ Назад к выбору времени", callback_data="back_to_time_selection")
+        InlineKeyboardButton(text="↩️ Назад к выбору времени", callback_data=BackToTimesCallback().pack())
     ]]
     return InlineKeyboardMarkup(inline_keyboard=keyboard)
 
@@ -320,14 +408,14 @@ def get_back_to_times_keyboard():
 
 def get_back_to_tables_keyboard():
     keyboard = [[
-        InlineKeyboardButton(text="↩️ Назад к выбору столика", callback_data="back_to_time_selection")
+        InlineKeyboardButton(text="↩️ Назад к выбору столика", callback_data=BackToTimesCallback().pack())
     ]]
     return InlineKeyboardMarkup(inline_keyboard=keyboard)
 
 
 def get_back_to_guests_keyboard():
     keyboard = [[
-        InlineKeyboardButton(text="↩️ Назад к выбору гостей", callback_data="back_to_guests")
+        InlineKeyboardButton(text="↩️ Назад к выбору гостей", callback_data=BackToGuestsCallback().pack())
     ]]
     return InlineKeyboardMarkup(inline_keyboard=keyboard)
 
@@ -0,0 +1,110 @@
+"""
+Сторож цикла событий
+Обработчики работают с SQLite синхронно, и долгий запрос или расчет
+останавливает весь бот. Сердцебиение в цикле событий просыпается каждые
+HEARTBEAT_INTERVAL секунд и меряет опоздание (lag). Отдельный поток следит
+за сердцебиением: если цикл стоит дольше LOOP_STALL_MS, он снимает стек
+основного потока — то место, где цикл застрял, — и пишет его в журнал
+вместе с задачей и обновлением/обработчиком, которому она принадлежит.
+"""
+import asyncio
+import logging
+import sys
+import threading
+import time
+import traceback
+
+import metrics
+from config import config
+from middlewares import update_for_task
+
+logger = logging.getLogger(__name__)
+
+HEARTBEAT_INTERVAL = 0.1  # секунд между проверками цикла
+STACK_LIMIT = 25  # кадров стека в журнале
+
+
+class LoopWatchdog:
+    def __init__(self, threshold, interval=HEARTBEAT_INTERVAL):
+        self.threshold = threshold
+        self.interval = interval
+        self._loop = None
+        self._loop_thread_id = None
+        self._beat = time.monotonic()
+        self._culprit = None  # обработчик, на котором поток застал зависание
+        self._heartbeat_task = None
+        self._thread = None
+        self._stop = threading.Event()
+
+    def start(self):
+        """Запустить из работающего цикла событий"""
+        self._loop = asyncio.get_running_loop()
+        self._loop_thread_id = threading.get_ident()
+        self._beat = time.monotonic()
+        self._heartbeat_task = asyncio.create_task(self._heartbeat())
+        self._thread = threading.Thread(target=self._watch, name="loop-watchdog", daemon=True)
+        self._thread.start()
+        logger.info(f"Сторож цикла событий: зависания дольше {self.threshold * 1000:.0f} мс")
+
+    def stop(self):
+        self._stop.set()
+        if self._heartbeat_task is not None:
+            self._heartbeat_task.cancel()
+
+    async def _heartbeat(self):
+        loop = asyncio.get_running_loop()
+        while True:
+            started = loop.time()
+            self._beat = time.monotonic()
+            await asyncio.sleep(self.interval)
+            lag = max(0.0, loop.time() - started - self.interval)
+            metrics.loop_lag.observe(lag)
+
+            if lag >= self.threshold:
+                culprit = self._culprit or "-"
+                metrics.loop_stalls.inc(culprit)
+                metrics.loop_stall_seconds.observe(lag)
+                logger.warning(f"Цикл событий простоял {lag * 1000:.0f} мс ({culprit})")
+            self._culprit = None
+
+    def _watch(self):
+        reported_beat = None
+        while not self._stop.wait(self.interval / 2):
+            beat = self._beat
+            stalled = time.monotonic() - beat - self.interval
+            # О каждом зависании сообщаем один раз, пока сердцебиение не вернулось
+            if stalled >= self.threshold and beat != reported_beat:
+                reported_beat = beat
+                try:
+                    self._report(stalled)
+                except Exception as e:
+                    logger.error(f"Сторож цикла не смог снять стек: {e}")
+
+    def _report(self, stalled):
+        task = asyncio.current_task(self._loop)
+        context = update_for_task(task) if task is not None else None
+        if context is not None:
+            self._culprit = context.handler or context.event_type
+        elif task is not None:
+            self._culprit = task.get_coro().__qualname__
+        else:
+            self._culprit = "вне задачи"
+
+        frame = sys._current_frames().get(self._loop_thread_id)
+        stack = "".join(traceback.format_stack(frame, limit=STACK_LIMIT)) if frame is not None else "  стек недоступен\n"
+        task_text = f"задача {task.get_name()} ({task.get_coro().__qualname__})" if task is not None else "вне задачи"
+        logger.warning(
+            f"Цикл событий стоит уже {stalled * 1000:.0f} мс: {task_text}, "
+            f"{context or 'не обработка обновления'}\n{stack.rstrip()}"
+        )
+
+
+loop_watchdog = LoopWatchdog(config.LOOP_STALL_MS / 1000)
+
+
+def start_watchdog():
+    """Включить сторожа, если LOOP_STALL_MS задан. Возвращает его или None"""
+    if config.LOOP_STALL_MS <= 0:
+        return None
+    loop_watchdog.start()
+    return loop_watchdog
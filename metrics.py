@@ -0,0 +1,260 @@
+"""
+Метрики бота в текстовом формате Prometheus
+Задержки и ошибки обработчиков, запросы к БД, вызовы Bot API и глубина
+очереди рассылки. Метрики отдаются на локальном порту METRICS_PORT
+(GET /metrics) и кратко — админской командой /metrics.
+"""
+import bisect
+import logging
+import time
+
+from aiohttp import web
+
+from config import config
+from sender import sender
+
+logger = logging.getLogger(__name__)
+
+LATENCY_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0)
+DB_BUCKETS = (0.0005, 0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.5, 1.0)
+
+
+def _format_labels(names, values, extra=None):
+    pairs = list(zip(names, values))
+    if extra:
+        pairs.append(extra)
+    if not pairs:
+        return ""
+    escaped = (str(value).replace('\\', '\\\\').replace('"', '\\"').replace('\n', '\\n') for _, value in pairs)
+    return "{" + ",".join(f'{name}="{value}"' for (name, _), value in zip(pairs, escaped)) + "}"
+
+
+def _format_value(value):
+    return repr(float(value)) if value != int(value) else str(int(value))
+
+
+class Counter:
+    """Монотонный счетчик с метками"""
+
+    kind = "counter"
+
+    def __init__(self, name, help_text, labels=()):
+        self.name = name
+        self.help = help_text
+        self.labels = labels
+        self._values = {}
+
+    def inc(self, *label_values, amount=1):
+        self._values[label_values] = self._values.get(label_values, 0) + amount
+
+    def value(self, *label_values):
+        return self._values.get(label_values, 0)
+
+    def items(self):
+        return sorted(self._values.items())
+
+    def samples(self):
+        for label_values, value in self.items():
+            yield self.name, _format_labels(self.labels, label_values), value
+
+
+class Gauge:
+    """Значение, которое читается функцией в момент выдачи метрик"""
+
+    kind = "gauge"
+
+    def __init__(self, name, help_text, read):
+        self.name = name
+        self.help = help_text
+        self.read = read
+
+    def samples(self):
+        yield self.name, "", self.read()
+
+
+class Histogram:
+    """Гистограмма с накопительными корзинами, как в Prometheus"""
+
+    kind = "histogram"
+
+    def __init__(self, name, help_text, labels=(), buckets=LATENCY_BUCKETS):
+        self.name = name
+        self.help = help_text
+        self.labels = labels
+        self.buckets = tuple(buckets)
+        self._series = {}  # метки -> [счетчики корзин..., +Inf], сумма
+
+    def observe(self, value, *label_values):
+        series = self._series.get(label_values)
+        if series is None:
+            series = self._series[label_values] = [[0] * (len(self.buckets) + 1), 0.0]
+        series[0][bisect.bisect_left(self.buckets, value)] += 1
+        series[1] += value
+
+    def count(self, *label_values):
+        series = self._series.get(label_values)
+        return sum(series[0]) if series else 0
+
+    def quantile(self, fraction, *label_values):
+        """Оценка квантиля: верхняя граница корзины, где набралась нужная доля"""
+        series = self._series.get(label_values)
+        if not series:
+            return 0.0
+        target = fraction * sum(series[0])
+        cumulative = 0
+        for index, count in enumerate(series[0]):
+            cumulative += count
+            if cumulative >= target:
+                return self.buckets[index] if index < len(self.buckets) else float('inf')
+        return float('inf')
+
+    def items(self):
+        """[(метки, число, сумма)]"""
+        return [(label_values, sum(series[0]), series[1]) for label_values, series in sorted(self._series.items())]
+
+    def samples(self):
+        for label_values, (counts, total) in sorted(self._series.items()):
+            cumulative = 0
+            for bound, count in zip(self.buckets + (float('inf'),), counts):
+                cumulative += count
+                le = "+Inf" if bound == float('inf') else _format_value(bound)
+                yield f"{self.name}_bucket", _format_labels(self.labels, label_values, ("le", le)), cumulative
+            yield f"{self.name}_sum", _format_labels(self.labels, label_values), total
+            yield f"{self.name}_count", _format_labels(self.labels, label_values), cumulative
+
+
+class Registry:
+    def __init__(self):
+        self._metrics = []
+
+    def register(self, metric):
+        self._metrics.append(metric)
+        return metric
+
+    def render(self):
+        """Все метрики в текстовом формате Prometheus 0.0.4"""
+        lines = []
+        for metric in self._metrics:
+            lines.append(f"# HELP {metric.name} {metric.help}")
+            lines.append(f"# TYPE {metric.name} {metric.kind}")
+            for name, labels, value in metric.samples():
+                lines.append(f"{name}{labels} {_format_value(value)}")
+        return "\n".join(lines) + "\n"
+
+
+registry = Registry()
+_started_at = time.time()
+
+LOOP_LAG_BUCKETS = (0.001, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0)
+
+handler_seconds = registry.register(Histogram(
+    "bot_handler_seconds", "Время работы обработчика", labels=("event", "handler")
+))
+handler_errors = registry.register(Counter(
+    "bot_handler_errors_total", "Исключения в обработчиках", labels=("event", "handler")
+))
+db_queries = registry.register(Counter(
+    "bot_db_queries_total", "Запросы к базе данных"
+))
+db_query_seconds = registry.register(Histogram(
+    "bot_db_query_seconds", "Время выполнения запроса к базе данных", buckets=DB_BUCKETS
+))
+api_calls = registry.register(Counter(
+    "bot_api_calls_total", "Вызовы Telegram Bot API", labels=("method",)
+))
+api_errors = registry.register(Counter(
+    "bot_api_errors_total", "Ошибки вызовов Telegram Bot API", labels=("method",)
+))
+api_seconds = registry.register(Histogram(
+    "bot_api_seconds", "Время вызова Telegram Bot API", labels=("method",)
+))
+loop_lag = registry.register(Histogram(
+    "bot_loop_lag_seconds", "Опоздание сердцебиения цикла событий", buckets=LOOP_LAG_BUCKETS
+))
+loop_stalls = registry.register(Counter(
+    "bot_loop_stalls_total", "Зависания цикла событий дольше LOOP_STALL_MS", labels=("handler",)
+))
+loop_stall_seconds = registry.register(Histogram(
+    "bot_loop_stall_seconds", "Длительность зависаний цикла событий", buckets=LOOP_LAG_BUCKETS
+))
+send_queue_depth = registry.register(Gauge(
+    "bot_send_queue_depth", "Сообщений в очереди рассылки", lambda: sender.queue_depth
+))
+registry.register(Gauge(
+    "bot_uptime_seconds", "Время с запуска процесса", lambda: round(time.time() - _started_at, 3)
+))
+
+
+def instrument_engine(engine):
+    """Считать запросы и время БД через события SQLAlchemy"""
+    from sqlalchemy import event
+
+    @event.listens_for(engine, "before_cursor_execute")
+    def _before(conn, cursor, statement, parameters, context, executemany):
+        conn.info.setdefault('metrics_started', []).append(time.perf_counter())
+
+    @event.listens_for(engine, "after_cursor_execute")
+    def _after(conn, cursor, statement, parameters, context, executemany):
+        started = conn.info.get('metrics_started')
+        if started:
+            db_queries.inc()
+            db_query_seconds.observe(time.perf_counter() - started.pop())
+
+
+def summary_text(limit=15):
+    """Краткая сводка для /metrics: самые медленные обработчики и счетчики"""
+    handlers = sorted(
+        handler_seconds.items(),
+        key=lambda item: handler_seconds.quantile(0.95, *item[0]),
+        reverse=True
+    )
+    lines = ["📈 <b>Метрики бота</b>", ""]
+    if handlers:
+        lines.append("<b>Обработчики</b> (вызовы · среднее · p95 · ошибки):")
+        for label_values, count, total in handlers[:limit]:
+            p95 = handler_seconds.quantile(0.95, *label_values)
+            p95_text = f"≤{p95 * 1000:g} мс" if p95 != float('inf') else f">{LATENCY_BUCKETS[-1]:g} с"
+            lines.append(
+                f"• <code>{label_values[1]}</code>: {count} · {total / count * 1000:.0f} мс · "
+                f"{p95_text} · {handler_errors.value(*label_values)}"
+            )
+        if len(handlers) > limit:
+            lines.append(f"<i>…и еще {len(handlers) - limit}</i>")
+    else:
+        lines.append("<i>Обработчики еще не вызывались</i>")
+
+    queries = db_queries.value()
+    db_average = sum(total for _, _, total in db_query_seconds.items()) / queries * 1000 if queries else 0
+    calls = sum(value for _, value in api_calls.items())
+    errors = sum(value for _, value in api_errors.items())
+    lines += [
+        "",
+        f"🗄 Запросов к БД: {queries} (среднее {db_average:.2f} мс)",
+        f"📡 Вызовов Bot API: {calls}, ошибок: {errors}",
+        f"📤 В очереди рассылки: {send_queue_depth.read()}",
+        f"⏱ Зависаний цикла событий: {sum(value for _, value in loop_stalls.items())}"
+        f" (p95 опоздания ≤{loop_lag.quantile(0.95) * 1000:g} мс)",
+    ]
+    culprits = sorted(loop_stalls.items(), key=lambda item: -item[1])[:5]
+    if culprits:
+        lines.append("  " + ", ".join(f"<code>{labels[0]}</code>: {count}" for labels, count in culprits))
+    return "\n".join(lines)
+
+
+async def metrics_handler(request):
+    return web.Response(text=registry.render(), content_type='text/plain', charset='utf-8',
+                        headers={"Cache-Control": "no-cache"})
+
+
+async def start_metrics_server():
+    """Отдавать /metrics на METRICS_PORT, если он задан. Возвращает runner или None"""
+    if not config.METRICS_PORT:
+        return None
+
+    app = web.Application()
+    app.router.add_get('/metrics', metrics_handler)
+    runner = web.AppRunner(app, access_log=None)
+    await runner.setup()
+    await web.TCPSite(runner, config.METRICS_HOST, config.METRICS_PORT).start()
+    logger.info(f"Метрики Prometheus: http://{config.METRICS_HOST}:{config.METRICS_PORT}/metrics")
+    return runner
@@ -0,0 +1,129 @@
+"""
+Промежуточные обработчики диспетчера
+UpdateRecorder пишет каждое входящее обновление строкой JSONL с отметкой
+времени: записанный трафик потом воспроизводится benchmarks/replay.py.
+HandlerMetrics и ApiCallMetrics считают задержки и ошибки обработчиков
+и вызовов Bot API для metrics.py. track_update запоминает в контексте,
+какое обновление и какой обработчик сейчас выполняются — это видно
+журналу медленных запросов и сторожу цикла событий.
+"""
+import asyncio
+import json
+import logging
+import time
+from contextvars import ContextVar
+
+from aiogram.client.session.middlewares.base import BaseRequestMiddleware
+from aiogram.types import CallbackQuery, Update
+
+import metrics
+from callbacks import callbacks
+
+logger = logging.getLogger(__name__)
+
+
+class UpdateRecorder:
+    """Outer-middleware для dp.update: {"ts": unix-время, "update": {...}} в файл"""
+
+    def __init__(self, path):
+        self.path = path
+        self._file = open(path, 'a', encoding='utf-8', buffering=1)  # построчная запись
+        self.recorded = 0
+        logger.info(f"Входящие обновления записываются в {path}")
+
+    async def __call__(self, handler, event: Update, data):
+        try:
+            record = {"ts": time.time(), "update": event.model_dump(mode='json', exclude_none=True, by_alias=True)}
+            self._file.write(json.dumps(record, ensure_ascii=False) + '\n')
+            self.recorded += 1
+        except Exception as e:
+            # Запись не должна мешать обработке обновления
+            logger.error(f"Не удалось записать обновление {event.update_id}: {e}")
+        return await handler(event, data)
+
+    def close(self):
+        self._file.close()
+
+
+class UpdateContext:
+    """Обновление, которое обрабатывается в текущей задаче"""
+
+    __slots__ = ("update_id", "event_type", "handler", "started")
+
+    def __init__(self, update_id, event_type):
+        self.update_id = update_id
+        self.event_type = event_type
+        self.handler = None  # заполняет HandlerMetrics, когда обработчик найден
+        self.started = time.perf_counter()
+
+    def __str__(self):
+        return f"обновление {self.update_id} ({self.event_type}, {self.handler or 'обработчик не выбран'})"
+
+
+current_update = ContextVar("current_update", default=None)
+
+# Задача -> UpdateContext: контекст чужой задачи не прочитать из другого потока
+_running_updates = {}
+
+
+async def track_update(handler, event: Update, data):
+    """Outer-middleware для dp.update: UpdateContext на время обработки"""
+    context = UpdateContext(event.update_id, event.event_type)
+    token = current_update.set(context)
+    task = asyncio.current_task()
+    _running_updates[task] = context
+    try:
+        return await handler(event, data)
+    finally:
+        current_update.reset(token)
+        _running_updates.pop(task, None)
+
+
+def update_for_task(task):
+    """Обновление, которое обрабатывает задача, или None"""
+    return _running_updates.get(task)
+
+
+def handler_name(handler, event):
+    """Имя функции-обработчика; для нажатий — того, куда их отправит callbacks"""
+    callback = handler.callback
+    if callback == callbacks.dispatch and isinstance(event, CallbackQuery):
+        routed = callbacks.handler_for(event.data)
+        if routed is not None:
+            callback = routed
+    return getattr(callback, '__name__', type(callback).__name__)
+
+
+class HandlerMetrics:
+    """Inner-middleware: время и исключения каждого обработчика"""
+
+    async def __call__(self, handler, event, data):
+        update = data.get('event_update')
+        labels = (update.event_type if update else type(event).__name__, handler_name(data['handler'], event))
+        context = current_update.get()
+        if context is not None:
+            context.handler = labels[1]
+        started = time.perf_counter()
+        try:
+            return await handler(event, data)
+        except Exception:
+            metrics.handler_errors.inc(*labels)
+            raise
+        finally:
+            metrics.handler_seconds.observe(time.perf_counter() - started, *labels)
+
+
+class ApiCallMetrics(BaseRequestMiddleware):
+    """Middleware сессии бота: число, время и ошибки вызовов Bot API"""
+
+    async def __call__(self, make_request, bot, method):
+        name = type(method).__name__
+        metrics.api_calls.inc(name)
+        started = time.perf_counter()
+        try:
+            return await make_request(bot, method)
+        except Exception:
+            metrics.api_errors.inc(name)
+            raise
+        finally:
+            metrics.api_seconds.observe(time.perf_counter() - started, name)
@@ -0,0 +1,264 @@
+"""
+Аналитика загрузки столиков
+Брони за период (текущие и архивные) читаются одним запросом и
+раскладываются в массив NumPy день × слот × столик: доля минут слота,
+когда столик занят. Все показатели считаются по осям этого массива.
+"""
+import io
+import logging
+import time as time_module
+from datetime import datetime, timedelta
+
+from sqlalchemy import select, union_all
+
+from availability import ACTIVE_STATUSES, booking_tables, time_to_minutes
+from config import config
+from database import get_session, Booking, BookingArchive
+
+try:
+    import numpy as np
+except ImportError:  # аналитика недоступна, остальной бот работает
+    np = None
+
+try:
+    import matplotlib
+    matplotlib.use("Agg")
+    import matplotlib.pyplot as plt
+except ImportError:  # PNG необязателен, текстовая тепловая карта есть всегда
+    plt = None
+
+logger = logging.getLogger(__name__)
+
+DEFAULT_PERIOD_DAYS = 30
+MAX_PERIOD_DAYS = 366
+WEEKDAYS = ["Пн", "Вт", "Ср", "Чт", "Пт", "Сб", "Вс"]
+HEAT_LEVELS = " ░▒▓█"
+PEAK_SLOTS = 3
+
+
+def _parse_date(value):
+    for date_format in ('%Y-%m-%d', '%d.%m.%Y'):
+        try:
+            return datetime.strptime(value, date_format).date()
+        except ValueError:
+            continue
+    return None
+
+
+def parse_occupancy_args(args):
+    """'/occupancy 01.09.2026 30.09.2026 png' -> (с, по, нужен ли PNG)
+
+    Без дат — последние DEFAULT_PERIOD_DAYS дней по сегодня включительно.
+    """
+    date_from, date_to, png = None, None, False
+
+    for arg in (args or '').split():
+        if arg.lower() == 'png':
+            png = True
+        elif _parse_date(arg):
+            if date_from is None:
+                date_from = _parse_date(arg)
+            elif date_to is None:
+                date_to = _parse_date(arg)
+            else:
+                raise ValueError("Укажите не больше двух дат: начало и конец периода")
+        else:
+            raise ValueError(f"Непонятный аргумент: {arg}")
+
+    if date_from is None:
+        date_to = datetime.now().date()
+        date_from = date_to - timedelta(days=DEFAULT_PERIOD_DAYS - 1)
+    elif date_to is None:
+        date_to = date_from
+    if date_from > date_to:
+        date_from, date_to = date_to, date_from
+    if (date_to - date_from).days >= MAX_PERIOD_DAYS:
+        raise ValueError(f"Период не длиннее {MAX_PERIOD_DAYS} дней")
+    return date_from, date_to, png
+
+
+def _load_bookings(date_from, date_to):
+    """Брони периода из bookings и bookings_archive одним запросом"""
+    queries = []
+    for model in (Booking, BookingArchive):
+        queries.append(
+            select(
+                (model.booking_id if model is BookingArchive else model.id).label('id'), model.zone, model.table_number, model.extra_tables,
+                model.date, model.time, model.duration, model.guests
+            ).where(
+                model.date >= date_from.strftime('%Y-%m-%d'),
+                model.date <= date_to.strftime('%Y-%m-%d'),
+                model.status.in_(ACTIVE_STATUSES)
+            )
+        )
+
+    session = get_session()
+    try:
+        return session.execute(union_all(*queries)).all()
+    finally:
+        session.close()
+
+
+class OccupancyReport:
+    """Загрузка за период: occupancy[день, слот, столик] в долях от 0 до 1"""
+
+    def __init__(self, date_from, date_to, occupancy, bookings_count):
+        self.date_from = date_from
+        self.date_to = date_to
+        self.occupancy = occupancy
+        self.bookings_count = bookings_count
+        self.tables = [(zone, number) for zone, number, _ in config.TABLE_LAYOUT]
+        self.slots = [
+            f"{minute // 60:02d}:{minute % 60:02d}"
+            for minute in range(config.OPEN_TIME_MINUTES, config.CLOSE_TIME_MINUTES, config.TIME_INTERVAL)
+        ]
+
+        first_day = np.datetime64(date_from, 'D')
+        days = first_day + np.arange(occupancy.shape[0])
+        # 1970-01-01 — четверг, сдвигаем так, чтобы понедельник был 0
+        self.weekdays = (days.astype('int64') + 3) % 7
+
+    @property
+    def rate(self):
+        """Общая загрузка: доля занятого столико-времени"""
+        return float(self.occupancy.mean()) if self.occupancy.size else 0.0
+
+    def by_slot(self):
+        """Средняя загрузка по слотам"""
+        return self.occupancy.mean(axis=(0, 2))
+
+    def by_table(self):
+        """Средняя загрузка каждого столика"""
+        return self.occupancy.mean(axis=(0, 1))
+
+    def by_weekday(self):
+        """Средняя загрузка по дням недели (NaN — таких дней в периоде не было)"""
+        totals = np.bincount(self.weekdays, weights=self.occupancy.mean(axis=(1, 2)), minlength=7)
+        counts = np.bincount(self.weekdays, minlength=7)
+        with np.errstate(invalid='ignore', divide='ignore'):
+            return totals / counts
+
+    def by_weekday_slot(self):
+        """Загрузка день недели × слот (NaN — таких дней в периоде не было)"""
+        per_day = self.occupancy.mean(axis=2)
+        totals = np.zeros((7, per_day.shape[1]))
+        np.add.at(totals, self.weekdays, per_day)
+        counts = np.bincount(self.weekdays, minlength=7)[:, None]
+        with np.errstate(invalid='ignore', divide='ignore'):
+            return totals / counts
+
+    def peak_slots(self, limit=PEAK_SLOTS):
+        by_slot = self.by_slot()
+        order = np.argsort(by_slot)[::-1][:limit]
+        return [(self.slots[i], float(by_slot[i])) for i in order if by_slot[i] > 0]
+
+    def summary_text(self):
+        period = f"{self.date_from:%d.%m.%Y} — {self.date_to:%d.%m.%Y}"
+        lines = [
+            f"📈 <b>ЗАГРУЗКА ЗАЛА</b>",
+            f"📅 {period} ({self.occupancy.shape[0]} дн.)",
+            f"📋 Бронирований: {self.bookings_count}",
+            f"📊 Средняя загрузка: {self.rate:.0%}",
+            "",
+        ]
+
+        peaks = self.peak_slots()
+        if peaks:
+            lines.append("🔥 <b>Пиковые слоты:</b> " + ", ".join(f"{slot} ({rate:.0%})" for slot, rate in peaks))
+
+        by_weekday = self.by_weekday()
+        weekday_parts = [
+            f"{WEEKDAYS[i]} {rate:.0%}" for i, rate in enumerate(by_weekday) if not np.isnan(rate)
+        ]
+        lines.append("📆 <b>По дням недели:</b> " + ", ".join(weekday_parts))
+
+        by_table = self.by_table()
+        lines.append("🪑 <b>По столикам:</b> " + ", ".join(
+            f"№{number} {by_table[i]:.0%}" for i, (_, number) in enumerate(self.tables)
+        ))
+        return "\n".join(lines)
+
+    def heatmap_text(self):
+        """Тепловая карта слот × день недели для <pre>"""
+        matrix = self.by_weekday_slot()
+        levels = np.clip(np.nan_to_num(matrix) * (len(HEAT_LEVELS) - 1), 0, len(HEAT_LEVELS) - 1)
+        levels = np.rint(levels).astype(int)
+        by_slot = self.by_slot()
+
+        lines = ["      " + " ".join(WEEKDAYS) + "  Все"]
+        for slot_index, slot in enumerate(self.slots):
+            cells = " ".join(
+                "··" if np.isnan(matrix[weekday, slot_index]) else HEAT_LEVELS[levels[weekday, slot_index]] * 2
+                for weekday in range(7)
+            )
+            lines.append(f"{slot} {cells} {by_slot[slot_index]:4.0%}")
+        return "\n".join(lines)
+
+    def heatmap_png(self):
+        """PNG тепловой карты или None без matplotlib"""
+        if plt is None:
+            return None
+
+        figure, axes = plt.subplots(figsize=(6, max(3, len(self.slots) * 0.3)))
+        image = axes.imshow(np.nan_to_num(self.by_weekday_slot()).T, aspect='auto', cmap='YlOrRd', vmin=0, vmax=1)
+        axes.set_xticks(range(7), WEEKDAYS)
+        axes.set_yticks(range(len(self.slots)), self.slots)
+        axes.set_title(f"{self.date_from:%d.%m.%Y} — {self.date_to:%d.%m.%Y}")
+        figure.colorbar(image, ax=axes, format=lambda value, _: f"{value:.0%}")
+        figure.tight_layout()
+
+        buffer = io.BytesIO()
+        figure.savefig(buffer, format='png', dpi=120)
+        plt.close(figure)
+        return buffer.getvalue()
+
+
+def build_occupancy(date_from, date_to):
+    """Собрать OccupancyReport за период [date_from, date_to]"""
+    if np is None:
+        raise RuntimeError("Для аналитики загрузки нужен numpy")
+
+    started = time_module.perf_counter()
+    bookings = _load_bookings(date_from, date_to)
+
+    table_index = {(zone, number): i for i, (zone, number, _) in enumerate(config.TABLE_LAYOUT)}
+    day_count = (date_to - date_from).days + 1
+    span = config.CLOSE_TIME_MINUTES - config.OPEN_TIME_MINUTES
+    slot_count = -(-span // config.TIME_INTERVAL)
+
+    # Индексы интервалов: по строке на каждый столик брони (объединенные — несколько)
+    dates, starts, ends, tables = [], [], [], []
+    for booking in bookings:
+        try:
+            start = time_to_minutes(booking.time) - config.OPEN_TIME_MINUTES
+        except (ValueError, AttributeError):
+            logger.error(f"Некорректное время у брони #{booking.id}")
+            continue
+        end = start + (booking.duration or config.get_booking_duration(booking.guests, booking.time))
+        for table_number in booking_tables(booking):
+            index = table_index.get((booking.zone or 'main', table_number))
+            if index is not None:
+                dates.append(booking.date)
+                starts.append(start)
+                ends.append(end)
+                tables.append(index)
+
+    # Занятость по минутам через разностный массив: +1 в начале, −1 в конце, затем cumsum
+    minutes = np.zeros((day_count, slot_count * config.TIME_INTERVAL + 1, len(table_index)), dtype=np.int16)
+    if dates:
+        day = (np.array(dates, dtype='datetime64[D]') - np.datetime64(date_from, 'D')).astype(int)
+        start = np.clip(np.array(starts), 0, span)
+        end = np.clip(np.array(ends), 0, span)
+        table = np.array(tables)
+        np.add.at(minutes, (day, start, table), 1)
+        np.add.at(minutes, (day, end, table), -1)
+
+    busy = np.cumsum(minutes, axis=1)[:, :-1] > 0
+    busy[:, span:] = False  # хвост последнего неполного слота после закрытия
+    occupancy = busy.reshape(day_count, slot_count, config.TIME_INTERVAL, -1).mean(axis=2)
+
+    logger.info(
+        f"Загрузка за {day_count} дн.: {len(bookings)} броней, "
+        f"{(time_module.perf_counter() - started) * 1000:.0f} мс"
+    )
+    return OccupancyReport(date_from, date_to, occupancy, len(bookings))
@@ -0,0 +1,127 @@
+"""
+Профилирование SQL-запросов
+События SQLAlchemy считают запросы и время БД на каждое обновление:
+обновление, сделавшее больше UPDATE_QUERY_WARN запросов (типичный N+1,
+например запрос на каждый слот), попадает в журнал. Запросы дольше
+SLOW_QUERY_MS пишутся с параметрами и обработчиком, который их выполнил.
+
+query_budget ограничивает число запросов в блоке кода — так
+benchmarks/query_budget.py проверяет основной путь бронирования.
+"""
+import logging
+import time
+from collections import Counter
+from contextlib import contextmanager
+from contextvars import ContextVar
+
+import metrics
+from config import config
+from middlewares import current_update
+
+logger = logging.getLogger(__name__)
+
+MAX_LOGGED_PARAMETERS = 200  # символов параметров в журнале медленных запросов
+
+update_queries = metrics.registry.register(metrics.Histogram(
+    "bot_update_db_queries", "Запросов к БД на одно обновление", labels=("handler",),
+    buckets=(1, 2, 5, 10, 20, 50, 100, 200)
+))
+slow_queries = metrics.registry.register(metrics.Counter(
+    "bot_db_slow_queries_total", "Запросы к БД дольше SLOW_QUERY_MS", labels=("handler",)
+))
+
+
+class QueryBudgetExceeded(AssertionError):
+    """Блок кода сделал больше запросов, чем разрешено"""
+
+
+class QueryProfile:
+    """Запросы и время БД внутри обновления или блока query_budget"""
+
+    def __init__(self, label, keep_statements=False):
+        self.label = label
+        self.queries = 0
+        self.seconds = 0.0
+        self.statements = Counter() if keep_statements else None
+
+    def add(self, statement, elapsed):
+        self.queries += 1
+        self.seconds += elapsed
+        if self.statements is not None:
+            self.statements[statement] += 1
+
+    def top_statements(self, limit=5):
+        if not self.statements:
+            return ""
+        return "\n".join(
+            f"  {count} × {' '.join(statement.split())[:160]}" for statement, count in self.statements.most_common(limit)
+        )
+
+
+# Профили, в которые сейчас идут запросы: обновление и вложенные бюджеты
+_active_profiles = ContextVar("active_profiles", default=())
+
+
+def _handler_label():
+    context = current_update.get()
+    return (context.handler if context else None) or "-"
+
+
+def install(engine):
+    """Подключить счетчики к движку SQLAlchemy"""
+    from sqlalchemy import event
+
+    @event.listens_for(engine, "before_cursor_execute")
+    def _before(conn, cursor, statement, parameters, context, executemany):
+        conn.info.setdefault('profiler_started', []).append(time.perf_counter())
+
+    @event.listens_for(engine, "after_cursor_execute")
+    def _after(conn, cursor, statement, parameters, context, executemany):
+        started = conn.info.get('profiler_started')
+        if not started:
+            return
+        elapsed = time.perf_counter() - started.pop()
+
+        for profile in _active_profiles.get():
+            profile.add(statement, elapsed)
+
+        if elapsed * 1000 >= config.SLOW_QUERY_MS:
+            handler = _handler_label()
+            slow_queries.inc(handler)
+            logger.warning(
+                f"Медленный запрос {elapsed * 1000:.0f} мс в {current_update.get() or handler}: "
+                f"{' '.join(statement.split())} | параметры: {str(parameters)[:MAX_LOGGED_PARAMETERS]}"
+            )
+
+
+async def profile_updates(handler, event, data):
+    """Outer-middleware для dp.update: счетчик запросов на обновление"""
+    profile = QueryProfile(f"обновление {event.update_id}", keep_statements=True)
+    token = _active_profiles.set(_active_profiles.get() + (profile,))
+    try:
+        return await handler(event, data)
+    finally:
+        _active_profiles.reset(token)
+        handler_label = _handler_label()
+        update_queries.observe(profile.queries, handler_label)
+        if profile.queries > config.UPDATE_QUERY_WARN:
+            logger.warning(
+                f"{handler_label}: {profile.queries} запросов к БД за {profile.seconds * 1000:.0f} мс "
+                f"в {profile.label}\n{profile.top_statements()}"
+            )
+
+
+@contextmanager
+def query_budget(max_queries, label="блок"):
+    """Не больше max_queries запросов внутри with, иначе QueryBudgetExceeded"""
+    profile = QueryProfile(label, keep_statements=True)
+    token = _active_profiles.set(_active_profiles.get() + (profile,))
+    try:
+        yield profile
+    finally:
+        _active_profiles.reset(token)
+
+    if profile.queries > max_queries:
+        raise QueryBudgetExceeded(
+            f"{label}: {profile.queries} запросов при бюджете {max_queries}\n{profile.top_statements()}"
+        )
@@ -0,0 +1,157 @@
+"""
+Напоминания гостям перед визитом
+Напоминания хранятся в таблице scheduled_jobs. Планировщик будит обработчик
+один раз на ближайшую минуту с напоминаниями, и все напоминания этой минуты
+уходят одной пачкой через очередь отправки.
+"""
+import logging
+from datetime import datetime, timedelta
+
+from sqlalchemy import func
+
+from booking_events import on, BOOKING_CREATED, BOOKING_RELEASED
+from config import config
+from database import get_session, Booking, ScheduledJob
+from scheduler import scheduler
+from sender import sender
+from utils import get_booking_start, format_tables
+
+logger = logging.getLogger(__name__)
+
+REMINDERS_JOB_KEY = "reminders"
+BATCH_SIZE = 1000
+
+
+def _minute_start(moment):
+    return moment.replace(second=0, microsecond=0)
+
+
+def format_reminder(booking, offset_minutes):
+    """Текст напоминания"""
+    if offset_minutes >= 24 * 60:
+        when = "завтра" if offset_minutes == 24 * 60 else f"через {offset_minutes // (24 * 60)} дн."
+    elif offset_minutes >= 60:
+        when = f"через {offset_minutes // 60} ч."
+    else:
+        when = f"через {offset_minutes} мин."
+
+    date_obj = datetime.strptime(booking.date, '%Y-%m-%d')
+    return (
+        f"⏰ <b>Напоминание о бронировании</b>\n\n"
+        f"Ждем вас {when}: {date_obj.strftime('%d.%m.%Y')} в {booking.time}\n"
+        f"🪑 Столик №{format_tables(booking.table_number, booking.extra_tables)}\n"
+        f"👥 Гостей: {booking.guests}\n\n"
+        f"📍 {config.RESTAURANT_ADDRESS}\n"
+        f"<i>Если планы изменились, позвоните нам: {config.RESTAURANT_PHONE}</i>"
+    )
+
+
+def schedule_reminders():
+    """Запланировать пробуждение на минуту ближайшего напоминания"""
+    session = get_session()
+    try:
+        next_run = session.query(func.min(ScheduledJob.run_at)).filter(
+            ScheduledJob.status == 'pending',
+            ScheduledJob.kind == 'reminder'
+        ).scalar()
+    finally:
+        session.close()
+
+    if next_run is None:
+        scheduler.cancel(REMINDERS_JOB_KEY)
+    else:
+        scheduler.schedule(REMINDERS_JOB_KEY, _minute_start(next_run), send_due_reminders)
+
+
+@on(BOOKING_CREATED)
+def create_reminders(booking):
+    """Создать напоминания для новой брони"""
+    if not booking.user_id:
+        # Телефонная бронь из импорта — писать некому
+        return
+
+    start = get_booking_start(booking)
+    now = datetime.now()
+
+    jobs = []
+    for offset_minutes in config.REMINDER_OFFSETS:
+        run_at = start - timedelta(minutes=offset_minutes)
+        if run_at > now:
+            jobs.append(ScheduledJob(
+                kind='reminder',
+                booking_id=booking.id,
+                user_id=booking.user_id,
+                run_at=run_at,
+                offset_minutes=offset_minutes
+            ))
+
+    if not jobs:
+        return
+
+    next_deadline = min(_minute_start(job.run_at) for job in jobs)
+
+    session = get_session()
+    try:
+        session.add_all(jobs)
+        session.commit()
+    finally:
+        session.close()
+
+    # Пересчитываем пробуждение, только если новое напоминание раньше текущего
+    current_deadline = scheduler.get_deadline(REMINDERS_JOB_KEY)
+    if current_deadline is None or next_deadline < current_deadline:
+        scheduler.schedule(REMINDERS_JOB_KEY, next_deadline, send_due_reminders)
+
+
+@on(BOOKING_RELEASED)
+def cancel_reminders(booking):
+    """Отменить напоминания освобожденной брони"""
+    session = get_session()
+    try:
+        cancelled = session.query(ScheduledJob).filter(
+            ScheduledJob.booking_id == booking.id,
+            ScheduledJob.status == 'pending'
+        ).update({ScheduledJob.status: 'cancelled'}, synchronize_session=False)
+        session.commit()
+    finally:
+        session.close()
+
+    if cancelled:
+        logger.info(f"Отменено напоминаний для брони #{booking.id}: {cancelled}")
+
+
+def send_due_reminders():
+    """Отправить пачкой все напоминания, наступившие к концу текущей минуты"""
+    batch_end = _minute_start(datetime.now()) + timedelta(minutes=1)
+    session = get_session()
+    try:
+        while True:
+            rows = session.query(ScheduledJob, Booking).outerjoin(
+                Booking, Booking.id == ScheduledJob.booking_id
+            ).filter(
+                ScheduledJob.status == 'pending',
+                ScheduledJob.kind == 'reminder',
+                ScheduledJob.run_at < batch_end
+            ).order_by(ScheduledJob.run_at).limit(BATCH_SIZE).all()
+
+            if not rows:
+                break
+
+            sent = 0
+            for job, booking in rows:
+                if booking is None or booking.status not in ('pending', 'confirmed'):
+                    job.status = 'cancelled'
+                    continue
+
+                sender.enqueue(booking.user_id, format_reminder(booking, job.offset_minutes), parse_mode="HTML")
+                job.status = 'sent'
+                sent += 1
+
+            session.commit()
+            logger.info(f"Отправлено в очередь напоминаний: {sent}")
+    except Exception as e:
+        logger.error(f"Ошибка при отправке напоминаний: {e}")
+    finally:
+        session.close()
+
+    schedule_reminders()
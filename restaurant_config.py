@@ -13,13 +13,59 @@ RESTAURANT_CONFIG = {
     "open_time": "2:00",  # время открытия (формат ЧЧ:ММ)
     "close_time": "23:00",  # время закрытия (формат ЧЧ:ММ)
 
-    # Столики
-    "tables": [1, 2, 3, 4, 5, 6, 7, 8, 9, 10],  # номера столиков
+    # Столики: номер, количество мест и зона (можно указать просто номер —
+    # тогда столик считается рассчитанным на max_guests гостей в основном зале)
+    "tables": [
+        {"number": 1, "seats": 2, "zone": "main"},
+        {"number": 2, "seats": 2, "zone": "main"},
+        {"number": 3, "seats": 2, "zone": "main"},
+        {"number": 4, "seats": 4, "zone": "main"},
+        {"number": 5, "seats": 4, "zone": "main"},
+        {"number": 6, "seats": 4, "zone": "main"},
+        {"number": 7, "seats": 6, "zone": "main"},
+        {"number": 8, "seats": 6, "zone": "main"},
+        {"number": 9, "seats": 8, "zone": "main"},
+        {"number": 10, "seats": 10, "zone": "main"},
+    ],
     "max_guests": 10,  # максимальное количество гостей за столом
 
+    # Столики, которые можно сдвинуть для большой компании:
+    # каждая группа — ряд столиков по порядку, соседние можно объединять
+    "table_groups": [
+        [1, 2, 3],
+        [4, 5, 6],
+        [7, 8],
+        [9, 10],
+    ],
+
     # Интервал времени для бронирования (в минутах)
     "time_interval": 60,  # 1 час
 
+    # На сколько дней вперед можно бронировать (включая сегодня)
+    "booking_days_ahead": 10,
+
+    # Поиск ближайшего свободного времени, если выбранное занято
+    "slot_search": {
+        "tolerance": 3 * 60,  # не дальше чем на 3 часа от желаемого времени
+        "limit": 6,  # сколько вариантов предложить
+    },
+
+    # Продолжительность брони (в минутах)
+    "booking_duration": {
+        "default": 120,  # 2 часа
+        "by_guests": {6: 150, 8: 180},  # от N гостей — дольше
+        "by_time": {"22:00": 60},  # для отдельных слотов (например, перед закрытием)
+    },
+
+    # Сколько минут бронь может ждать подтверждения администратора
+    "pending_timeout": 60,  # 0 — не отменять автоматически
+
+    # Сколько минут гость из листа ожидания может думать над предложением
+    "waitlist_offer_timeout": 15,
+
+    # Напоминания гостям (за сколько минут до визита)
+    "reminders": [24 * 60, 2 * 60],  # за сутки и за 2 часа
+
     # Зоны
     "zones": {
         "main": "🍽️ Основной зал"
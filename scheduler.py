@@ -0,0 +1,107 @@
+"""
+Планировщик задач по дедлайнам
+Все отложенные действия бота (удаление прошедших броней, таймауты, напоминания)
+хранятся в одной min-куче и выполняются ровно в свой срок, без опроса по таймеру.
+"""
+import asyncio
+import heapq
+import itertools
+import logging
+from datetime import datetime
+
+logger = logging.getLogger(__name__)
+
+
+class DeadlineScheduler:
+    """Min-куча задач, ключ — время срабатывания"""
+
+    def __init__(self):
+        self._heap = []  # (when, seq, key)
+        self._jobs = {}  # key -> (when, seq, callback, args)
+        self._seq = itertools.count()
+        self._wakeup = asyncio.Event()
+
+    def schedule(self, key, when, callback, *args):
+        """Запланировать задачу (задача с тем же ключом заменяется)"""
+        seq = next(self._seq)
+        self._jobs[key] = (when, seq, callback, args)
+        heapq.heappush(self._heap, (when, seq, key))
+
+        # Будим цикл, только если новая задача стала ближайшей
+        if self._heap[0][1] == seq:
+            self._wakeup.set()
+
+    def cancel(self, key):
+        """Отменить задачу (запись в куче удаляется лениво)"""
+        job = self._jobs.pop(key, None)
+        if job and len(self._heap) > 2 * len(self._jobs) + 64:
+            self._compact()
+        return job is not None
+
+    def has_job(self, key):
+        return key in self._jobs
+
+    def get_deadline(self, key):
+        """Время срабатывания задачи или None"""
+        job = self._jobs.get(key)
+        return job[0] if job else None
+
+    def next_deadline(self):
+        """Время ближайшей задачи или None"""
+        self._drop_stale()
+        return self._heap[0][0] if self._heap else None
+
+    def __len__(self):
+        return len(self._jobs)
+
+    def _is_stale(self, entry):
+        job = self._jobs.get(entry[2])
+        return job is None or job[1] != entry[1]
+
+    def _drop_stale(self):
+        while self._heap and self._is_stale(self._heap[0]):
+            heapq.heappop(self._heap)
+
+    def _compact(self):
+        self._heap = [entry for entry in self._heap if not self._is_stale(entry)]
+        heapq.heapify(self._heap)
+
+    async def run(self):
+        """Основной цикл: спим до ближайшего дедлайна и выполняем задачи"""
+        while True:
+            self._wakeup.clear()
+            next_deadline = self.next_deadline()
+
+            if next_deadline is None:
+                await self._wakeup.wait()
+                continue
+
+            delay = (next_deadline - datetime.now()).total_seconds()
+            if delay > 0:
+                try:
+                    await asyncio.wait_for(self._wakeup.wait(), timeout=delay)
+                    continue  # Расписание изменилось — пересчитываем
+                except asyncio.TimeoutError:
+                    pass
+
+            await self._run_due()
+
+    async def _run_due(self):
+        now = datetime.now()
+        while self._heap and self._heap[0][0] <= now:
+            when, seq, key = heapq.heappop(self._heap)
+            job = self._jobs.get(key)
+            if job is None or job[1] != seq:
+                continue
+
+            del self._jobs[key]
+            _, _, callback, args = job
+            try:
+                result = callback(*args)
+                if asyncio.iscoroutine(result):
+                    await result
+            except Exception as e:
+                logger.error(f"Ошибка при выполнении задачи {key}: {e}")
+
+
+scheduler = DeadlineScheduler()
@@ -0,0 +1,212 @@
+"""
+Полнотекстовый поиск администратора по броням и гостям (SQLite FTS5)
+Индексы bookings_fts и users_fts ведут триггеры в самой БД, поэтому их
+не нужно обновлять в коде. Текущие и архивные брони живут в одном
+индексе под разными rowid: 2·id у текущей и 2·id+1 у архивной (у архива
+свой ключ), а номер брони хранится в booking_ref. Телефон хранится цифрами: последние
+10 цифр и отдельно последние 4, чтобы находить и по началу, и по хвосту.
+"""
+import logging
+import re
+import time as time_module
+
+from sqlalchemy import text
+from sqlalchemy.exc import OperationalError
+
+from database import engine, get_session, Booking, BookingArchive, User
+
+logger = logging.getLogger(__name__)
+
+SEARCH_LIMIT = 10
+MIN_PHONE_DIGITS = 3
+TOKENIZER = "unicode61 remove_diacritics 2"
+
+
+def _digits_sql(column):
+    """SQL: телефон без форматирования -> 'последние 10 цифр' 'последние 4'"""
+    digits = f"coalesce({column}, '')"
+    for char in (' ', '-', '(', ')', '+', '.'):
+        digits = f"replace({digits}, '{char}', '')"
+    return f"substr({digits}, -10) || ' ' || substr({digits}, -4)"
+
+
+def _booking_rowid_sql(row, archived):
+    return f"{row}.id * 2 + 1" if archived else f"{row}.id * 2"
+
+
+def _booking_trigger_values(row, archived=False):
+    booking_ref = f"{row}.booking_id" if archived else f"{row}.id"
+    return (
+        f"{_booking_rowid_sql(row, archived)}, {booking_ref}, {row}.full_name, coalesce({row}.username, ''), "
+        f"{_digits_sql(f'{row}.phone')}"
+    )
+
+
+def _user_trigger_values(row):
+    return (
+        f"{row}.id, {row}.user_id, {row}.full_name, coalesce({row}.username, ''), "
+        f"{_digits_sql(f'{row}.phone')}"
+    )
+
+
+SEARCH_SCHEMA = [
+    f"""CREATE VIRTUAL TABLE IF NOT EXISTS bookings_fts USING fts5(
+        booking_ref, full_name, username, phone_digits, tokenize="{TOKENIZER}", prefix='2 3'
+    )""",
+    f"""CREATE VIRTUAL TABLE IF NOT EXISTS users_fts USING fts5(
+        user_ref, full_name, username, phone_digits, tokenize="{TOKENIZER}", prefix='2 3'
+    )""",
+
+    # Текущие брони
+    f"""CREATE TRIGGER IF NOT EXISTS bookings_fts_insert AFTER INSERT ON bookings BEGIN
+        INSERT OR REPLACE INTO bookings_fts(rowid, booking_ref, full_name, username, phone_digits)
+        VALUES ({_booking_trigger_values('new')});
+    END""",
+    f"""CREATE TRIGGER IF NOT EXISTS bookings_fts_update AFTER UPDATE OF full_name, phone, username ON bookings BEGIN
+        INSERT OR REPLACE INTO bookings_fts(rowid, booking_ref, full_name, username, phone_digits)
+        VALUES ({_booking_trigger_values('new')});
+    END""",
+    f"""CREATE TRIGGER IF NOT EXISTS bookings_fts_delete AFTER DELETE ON bookings BEGIN
+        DELETE FROM bookings_fts WHERE rowid = {_booking_rowid_sql('old', False)};
+    END""",
+
+    # Архив
+    f"""CREATE TRIGGER IF NOT EXISTS bookings_archive_fts_insert AFTER INSERT ON bookings_archive BEGIN
+        INSERT OR REPLACE INTO bookings_fts(rowid, booking_ref, full_name, username, phone_digits)
+        VALUES ({_booking_trigger_values('new', archived=True)});
+    END""",
+    f"""CREATE TRIGGER IF NOT EXISTS bookings_archive_fts_delete AFTER DELETE ON bookings_archive BEGIN
+        DELETE FROM bookings_fts WHERE rowid = {_booking_rowid_sql('old', True)};
+    END""",
+
+    # Пользователи
+    f"""CREATE TRIGGER IF NOT EXISTS users_fts_insert AFTER INSERT ON users BEGIN
+        INSERT OR REPLACE INTO users_fts(rowid, user_ref, full_name, username, phone_digits)
+        VALUES ({_user_trigger_values('new')});
+    END""",
+    f"""CREATE TRIGGER IF NOT EXISTS users_fts_update AFTER UPDATE OF full_name, phone, username ON users BEGIN
+        INSERT OR REPLACE INTO users_fts(rowid, user_ref, full_name, username, phone_digits)
+        VALUES ({_user_trigger_values('new')});
+    END""",
+    """CREATE TRIGGER IF NOT EXISTS users_fts_delete AFTER DELETE ON users BEGIN
+        DELETE FROM users_fts WHERE rowid = old.id;
+    END""",
+]
+
+# Заполнение индексов для базы, где их еще не было
+BOOKINGS_BACKFILL = [
+    f"""INSERT OR REPLACE INTO bookings_fts(rowid, booking_ref, full_name, username, phone_digits)
+        SELECT {_booking_trigger_values('bookings_archive', archived=True)} FROM bookings_archive""",
+    f"""INSERT OR REPLACE INTO bookings_fts(rowid, booking_ref, full_name, username, phone_digits)
+        SELECT {_booking_trigger_values('bookings')} FROM bookings""",
+]
+USERS_BACKFILL = [
+    f"""INSERT OR REPLACE INTO users_fts(rowid, user_ref, full_name, username, phone_digits)
+        SELECT {_user_trigger_values('users')} FROM users""",
+]
+
+BOOKING_TRIGGERS = (
+    'bookings_fts_insert', 'bookings_fts_update', 'bookings_fts_delete',
+    'bookings_archive_fts_insert', 'bookings_archive_fts_delete',
+)
+
+
+def _drop_legacy_booking_index(connection):
+    """Индекс с rowid = id брони (до своего ключа у архива) собираем заново. True — был такой"""
+    row = connection.execute(text("SELECT sql FROM sqlite_master WHERE name = 'bookings_fts_delete'")).first()
+    if row is None or '* 2' in row.sql:
+        return False
+    for trigger in BOOKING_TRIGGERS:
+        connection.execute(text(f"DROP TRIGGER IF EXISTS {trigger}"))
+    connection.execute(text("DELETE FROM bookings_fts"))
+    return True
+
+
+def _create_search_index():
+    """Создать индексы и триггеры. False — SQLite собран без FTS5"""
+    try:
+        with engine.begin() as connection:
+            exists = connection.execute(
+                text("SELECT 1 FROM sqlite_master WHERE name = 'bookings_fts'")
+            ).first()
+            rebuild_bookings = exists and _drop_legacy_booking_index(connection)
+            for statement in SEARCH_SCHEMA:
+                connection.execute(text(statement))
+            if not exists or rebuild_bookings:
+                for statement in BOOKINGS_BACKFILL + ([] if exists else USERS_BACKFILL):
+                    connection.execute(text(statement))
+                logger.info("Поисковый индекс построен")
+    except OperationalError as e:
+        logger.error(f"Полнотекстовый поиск недоступен: {e}")
+        return False
+    return True
+
+
+SEARCH_AVAILABLE = _create_search_index()
+
+
+def build_match(query, ref_column='booking_ref'):
+    """Запрос администратора -> выражение MATCH или None, если искать нечего
+
+    Слова ищутся по началу в имени и username, числа — по цифрам
+    телефона (с начала последних 10 или последние 4) и по номеру брони.
+    """
+    terms = []
+    for token in re.findall(r"\w+", query.lower()):
+        if token.isdigit():
+            if len(token) > 10:
+                token = token[-10:]
+            parts = [f'{ref_column}: "{token}"']
+            if len(token) >= MIN_PHONE_DIGITS:
+                parts.append(f'phone_digits: "{token}"*')
+            terms.append(f"({' OR '.join(parts)})")
+        else:
+            terms.append(f'{{full_name username}}: "{token}"*')
+    return " AND ".join(terms) or None
+
+
+def _match_ids(table, match, limit):
+    with engine.connect() as connection:
+        rows = connection.execute(
+            text(f"SELECT rowid FROM {table} WHERE {table} MATCH :match ORDER BY rank, rowid DESC LIMIT :limit"),
+            {"match": match, "limit": limit}
+        ).all()
+    return [row.rowid for row in rows]
+
+
+def search(query, limit=SEARCH_LIMIT):
+    """Найти брони (текущие и архивные) и гостей. -> (брони, пользователи)
+
+    Брони — список (Booking или BookingArchive) в порядке релевантности.
+    """
+    if not SEARCH_AVAILABLE or build_match(query) is None:
+        return [], []
+
+    started = time_module.perf_counter()
+    booking_rowids = _match_ids('bookings_fts', build_match(query, 'booking_ref'), limit)
+    user_ids = _match_ids('users_fts', build_match(query, 'user_ref'), limit)
+
+    session = get_session()
+    try:
+        # rowid индекса -> бронь: четные — текущие, нечетные — архивные
+        found = {}
+        for model, parity in ((Booking, 0), (BookingArchive, 1)):
+            ids = [rowid // 2 for rowid in booking_rowids if rowid % 2 == parity]
+            if ids:
+                for booking in session.query(model).filter(model.id.in_(ids)):
+                    found[booking.id * 2 + parity] = booking
+        users = {}
+        if user_ids:
+            users = {user.id: user for user in session.query(User).filter(User.id.in_(user_ids))}
+        session.expunge_all()
+    finally:
+        session.close()
+
+    logger.info(
+        f"Поиск {query!r}: {len(found)} броней, {len(users)} гостей "
+        f"за {(time_module.perf_counter() - started) * 1000:.1f} мс"
+    )
+    return (
+        [found[rowid] for rowid in booking_rowids if rowid in found],
+        [users[user_id] for user_id in user_ids if user_id in users],
+    )
@@ -0,0 +1,70 @@
+"""
+Отправка сообщений с ограничением скорости
+Telegram допускает около 30 сообщений в секунду, поэтому массовые рассылки
+(напоминания, обновления клавиатур и т.п.) идут через общую очередь
+с равномерным темпом.
+"""
+import asyncio
+import logging
+
+from aiogram.exceptions import TelegramBadRequest, TelegramRetryAfter
+
+logger = logging.getLogger(__name__)
+
+
+class RateLimitedSender:
+    """Очередь исходящих сообщений не быстрее rate сообщений в секунду"""
+
+    def __init__(self, rate=25):
+        self.rate = rate
+        self._queue = asyncio.Queue()
+        self._in_flight = asyncio.Semaphore(rate)
+
+    @property
+    def queue_depth(self):
+        """Сколько сообщений ждут отправки"""
+        return self._queue.qsize()
+
+    def enqueue(self, chat_id, text, **kwargs):
+        """Поставить сообщение в очередь на отправку"""
+        self.enqueue_call("send_message", chat_id=chat_id, text=text, **kwargs)
+
+    def enqueue_call(self, method, **params):
+        """Поставить в очередь любой вызов API бота, например edit_message_reply_markup"""
+        self._queue.put_nowait((method, params))
+
+    async def run(self, bot):
+        """Цикл отправки: запускаем не больше rate отправок в секунду"""
+        loop = asyncio.get_running_loop()
+        interval = 1 / self.rate
+        next_slot = loop.time()
+
+        while True:
+            method, params = await self._queue.get()
+
+            delay = next_slot - loop.time()
+            if delay > 0:
+                await asyncio.sleep(delay)
+            next_slot = max(next_slot, loop.time()) + interval
+
+            await self._in_flight.acquire()
+            asyncio.create_task(self._send(bot, method, params))
+
+    async def _send(self, bot, method, params):
+        try:
+            await getattr(bot, method)(**params)
+        except TelegramRetryAfter as e:
+            logger.warning(f"Лимит Telegram, повтор через {e.retry_after} с")
+            await asyncio.sleep(e.retry_after)
+            self.enqueue_call(method, **params)
+        except TelegramBadRequest as e:
+            if "message is not modified" not in str(e):
+                logger.error(f"Telegram отклонил {method} для {params.get('chat_id')}: {e}")
+        except Exception as e:
+            logger.error(f"Не удалось выполнить {method} для {params.get('chat_id')}: {e}")
+        finally:
+            self._in_flight.release()
+            self._queue.task_done()
+
+
+sender = RateLimitedSender()
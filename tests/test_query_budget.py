@@ -0,0 +1,19 @@
+"""
+Бюджет SQL-запросов на пути бронирования (benchmarks/query_budget.py)
+Бот импортируется один раз на процесс, поэтому проверка идет одним тестом
+на временной базе.
+"""
+import asyncio
+import shutil
+
+from benchmarks.environment import prepare_environment
+from benchmarks.query_budget import check, parse_args
+
+
+def test_booking_flow_within_query_budget():
+    args = parse_args([])
+    database_dir = prepare_environment("query_budget", args.admin_ids)
+    try:
+        assert asyncio.run(check(args)) == 0
+    finally:
+        shutil.rmtree(database_dir, ignore_errors=True)
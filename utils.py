@@ -1,6 +1,13 @@
 from datetime import datetime, timedelta
-from database import get_session, Booking
+from database import Booking
 from config import config
+from availability import availability_index, time_to_minutes, parse_extra_tables
+from allocation import table_allocator, table_combiner
+
+
+def format_tables(table_number, extra_tables=None):
+    """Номера столиков брони для отображения: '7' или '7 + 8'"""
+    return " + ".join(str(table) for table in [table_number] + parse_extra_tables(extra_tables))
 
 
 def format_booking(booking):
@@ -18,7 +25,7 @@ def format_booking(booking):
         f"📅 Дата: {booking.date}\n"
         f"⏰ Время: {booking.time}\n"
         f"🎯 Зона: {zone_name}\n"
-        f"🪑 Столик: {booking.table_number}\n"
+        f"🪑 Столик: {format_tables(booking.table_number, booking.extra_tables)}\n"
         f"👥 Гостей: {booking.guests}\n"
         f"📞 Телефон: {booking.phone}\n"
         f"👤 Имя: {booking.full_name}\n"
@@ -27,23 +34,24 @@ def format_booking(booking):
     )
 
 
-def get_booked_tables(date, time, zone='main'):
-    session = get_session()
-    try:
-        query = session.query(Booking).filter(
-            Booking.date == date,
-            Booking.time == time,
-            Booking.status.in_(['pending', 'confirmed']),
-            Booking.zone == zone
-        )
+def get_booking_start(booking):
+    """Дата и время начала брони"""
+    return datetime.strptime(f"{booking.date} {booking.time}", '%Y-%m-%d %H:%M')
+
+
+def get_booking_end(booking):
+    """Дата и время окончания брони"""
+    duration = booking.duration or config.get_booking_duration(booking.guests, booking.time)
+    return get_booking_start(booking) + timedelta(minutes=duration)
+
 
-        bookings = query.all()
-        return [booking.table_number for booking in bookings]
-    finally:
-        session.close()
+def get_booked_tables(date, time, zone='main', guests=None):
+    """Столики, занятые хотя бы частично на время брони, начинающейся в time"""
+    duration = config.get_booking_duration(guests, time)
+    return availability_index.booked_tables(date, time, zone, duration)
 
 
-def get_available_tables(date, time, zone='main'):
+def get_available_tables(date, time, zone='main', guests=None):
     # Проверяем, не позже ли времени последней брони
     try:
         hour, minute = map(int, time.split(':'))
@@ -55,27 +63,122 @@ def get_available_tables(date, time, zone='main'):
     except:
         pass
 
-    booked_tables = get_booked_tables(date, time, zone)
-    all_tables = config.TABLES.get(zone, [])
-    return [table for table in all_tables if table not in booked_tables]
+    duration = config.get_booking_duration(guests, time)
+    free_tables = availability_index.free_tables(date, time, zone, duration)
+    if guests:
+        # Только столики, за которыми поместится компания
+        free_tables = [table for table in free_tables if config.TABLE_SEATS.get(table, config.MAX_GUESTS) >= guests]
+    return free_tables
+
+
+def allocate_table(date, time, guests, zone='main'):
+    """Подобрать самый подходящий свободный столик для компании"""
+    start = time_to_minutes(time)
+    end = start + config.get_booking_duration(guests, time)
+    return table_allocator.allocate(
+        guests,
+        lambda table_number: availability_index.is_table_free(date, zone, table_number, start, end),
+        zone
+    )
+
+
+def tables_free(date, time, tables, zone='main', guests=None, duration=None, ignore_booking=None):
+    """Свободны ли все столики на время брони
+
+    ignore_booking — не считать занятостью саму эту бронь
+    """
+    start = time_to_minutes(time)
+    end = start + (duration or config.get_booking_duration(guests, time))
+    return all(
+        availability_index.is_table_free(date, zone, table, start, end, ignore_booking)
+        for table in tables
+    )
+
+
+def allocate_tables(date, time, guests, zone='main', must_include=None):
+    """Столик или наименьшее сочетание соседних столиков для компании
+
+    Возвращает список номеров столиков или None.
+    must_include — столик, который гость уже выбрал сам
+    """
+    if must_include is None:
+        table_number = allocate_table(date, time, guests, zone)
+        if table_number is not None:
+            return [table_number]
+
+    duration = config.get_booking_duration(guests, time)
+    free_tables = availability_index.free_tables(date, time, zone, duration)
+    return table_combiner.find(guests, free_tables, zone, must_include)
+
+
+def find_nearest_slots(guests, date, time, tolerance=None, limit=None, zone='main'):
+    """Ближайшие к желаемым дате и времени свободные слоты для компании
+
+    Просматривает весь горизонт бронирования по индексу занятости: сначала тот же день,
+    потом соседние, в каждом дне — от ближайшего времени. Время отличается от желаемого
+    не больше чем на tolerance минут. Возвращает [(дата, время, [столики])]
+    """
+    tolerance = config.SLOT_SEARCH_TOLERANCE_MINUTES if tolerance is None else tolerance
+    limit = limit or config.SLOT_SEARCH_LIMIT
+    guests = guests or 1
+
+    preferred_day = datetime.strptime(date, '%Y-%m-%d').date()
+    preferred_minutes = time_to_minutes(time)
+    now = datetime.now()
+    now_minutes = now.hour * 60 + now.minute
+
+    candidates = []
+    for offset in range(config.BOOKING_DAYS_AHEAD):
+        day = now.date() + timedelta(days=offset)
+        day_str = day.strftime('%Y-%m-%d')
+        day_distance = abs((day - preferred_day).days)
+
+        for slot in generate_time_slots():
+            slot_minutes = time_to_minutes(slot)
+            time_distance = abs(slot_minutes - preferred_minutes)
+            if time_distance > tolerance:
+                continue
+            if offset == 0 and slot_minutes <= now_minutes:
+                continue
+            if day_str == date and slot == time:
+                continue
+            candidates.append((day_distance, time_distance, slot_minutes, day_str, slot))
+
+    candidates.sort()
+
+    found = []
+    for _, _, _, day_str, slot in candidates:
+        tables = allocate_tables(day_str, slot, guests, zone)
+        if tables:
+            found.append((day_str, slot, tables))
+            if len(found) >= limit:
+                break
+    return found
+
+
+def get_max_party_size(zone='main'):
+    """Наибольшая компания: один стол или сдвинутые столики"""
+    return max(config.MAX_GUESTS, table_combiner.max_capacity(zone))
 
 
 def validate_date(date_str):
     try:
         date = datetime.strptime(date_str, '%Y-%m-%d').date()
         today = datetime.now().date()
-        max_date = today + timedelta(days=10)  # Бронирование максимум на 10 дней вперед
+        # Горизонт считая сегодня: последний доступный день — BOOKING_DAYS_AHEAD - 1
+        max_days = config.BOOKING_DAYS_AHEAD - 1
+        max_date = today + timedelta(days=max_days)
 
         if date < today:
             return False, "Нельзя бронировать на прошедшую дату"
         if date > max_date:
-            return False, f"Бронирование возможно максимум на 10 дней вперед (до {max_date.strftime('%d.%m.%Y')})"
+            return False, f"Бронирование возможно максимум на {max_days} дн. вперед (до {max_date.strftime('%d.%m.%Y')})"
         return True, date_str
     except ValueError:
         return False, "Неверный формат даты"
 
 
-def validate_time(time_str):
+def validate_time(time_str, date=None):
     try:
         hour, minute = map(int, time_str.split(':'))
         time_in_minutes = hour * 60 + minute
@@ -83,7 +186,7 @@ def validate_time(time_str):
         # Проверяем, что время в будущем, если выбрана сегодняшняя дата
         today = datetime.now().date()
 
-        if 'date' in locals() or 'date' in globals():
+        if date is not None:
             # Если дата передана, проверяем для сегодняшнего дня
             if date == today.strftime('%Y-%m-%d'):
                 now = datetime.now()
@@ -102,8 +205,8 @@ def validate_time(time_str):
         if time_in_minutes > config.LAST_BOOKING_TIME_MINUTES:
             return False, f"Последняя бронь возможна до {config.LAST_BOOKING_TIME_STR}"
 
-        # Проверяем, что время соответствует интервалу
-        if minute % (config.TIME_INTERVAL % 60) != 0:
+        # Проверяем, что время совпадает со слотом: слоты идут от открытия с шагом интервала
+        if (time_in_minutes - config.OPEN_TIME_MINUTES) % config.TIME_INTERVAL != 0:
             interval_str = f"{config.TIME_INTERVAL} минут"
             if config.TIME_INTERVAL == 60:
                 interval_str = "целый час"
@@ -128,7 +231,7 @@ def format_booking_data(data):
             f"📅 Дата: {data.date}\n"
             f"⏰ Время: {data.time}\n"
             f"🎯 Зона: {zone_name}\n"
-            f"🪑 Столик: {data.table_number}\n"
+            f"🪑 Столик: {format_tables(data.table_number, data.extra_tables)}\n"
             f"👥 Гостей: {data.guests}\n"
             f"📞 Телефон: {data.phone}\n"
             f"👤 Имя: {data.full_name}\n"
@@ -140,7 +243,7 @@ def format_booking_data(data):
             f"📅 Дата: {data['date']}\n"
             f"⏰ Время: {data['time']}\n"
             f"🎯 Зона: {zone_name}\n"
-            f"🪑 Столик: {data['table_number']}\n"
+            f"🪑 Столик: {format_tables(data['table_number'], data.get('extra_tables'))}\n"
             f"👥 Гостей: {data['guests']}\n"
             f"📞 Телефон: {data['phone']}\n"
             f"👤 Имя: {data['full_name']}\n"
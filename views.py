@@ -0,0 +1,246 @@
+"""
+Живые клавиатуры выбора времени и столика
+Сообщения с клавиатурами времени и столиков регистрируются здесь. Когда
+бронь на эту дату меняется, клавиатуры перерисовываются и обновляются
+у всех, кто на них смотрит. Обновления копятся и уходят не чаще раза
+в REFRESH_INTERVAL секунд на сообщение.
+
+Для каждого сообщения помним хэш последнего текста и клавиатуры:
+правка, которая ничего не меняет, в Telegram не отправляется. Хэши
+обновляет middleware сессии бота на любой правке сообщения, а не только
+в edit_view, — иначе после обычного edit_text кэш расходится с экраном.
+"""
+import hashlib
+import logging
+from collections import OrderedDict, defaultdict, namedtuple
+from datetime import datetime, timedelta
+
+from aiogram.client.session.middlewares.base import BaseRequestMiddleware
+from aiogram.exceptions import TelegramBadRequest
+from aiogram.methods import EditMessageReplyMarkup, EditMessageText
+from aiogram.types import CallbackQuery
+
+from booking_events import on, BOOKING_CREATED, BOOKING_RELEASED
+from keyboards import get_time_slots, get_tables_keyboard
+from scheduler import scheduler
+from sender import sender
+
+logger = logging.getLogger(__name__)
+
+REFRESH_INTERVAL = 3  # секунд между обновлениями одного сообщения
+VIEW_TTL = timedelta(minutes=30)  # через сколько перестаем следить за сообщением
+REFRESH_JOB_KEY = "views:refresh"
+
+RENDERED_CACHE_SIZE = 10000  # сколько последних сообщений помним
+
+VIEW_TIMES = "times"
+VIEW_TABLES = "tables"
+
+View = namedtuple("View", ["kind", "zone", "date", "time", "registered_at"])
+
+
+def render_hash(value):
+    """Хэш текста или клавиатуры сообщения"""
+    if value is None:
+        return None
+    if not isinstance(value, str):
+        value = value.model_dump_json(exclude_none=True)
+    return hashlib.blake2b(value.encode(), digest_size=8).digest()
+
+
+class RenderedMessages:
+    """Хэши последнего отправленного содержимого: (chat_id, message_id) -> (текст, клавиатура)"""
+
+    def __init__(self, max_size=RENDERED_CACHE_SIZE):
+        self.max_size = max_size
+        self._hashes = OrderedDict()
+
+    def get(self, key):
+        return self._hashes.get(key, (None, None))
+
+    def remember(self, key, text_hash, markup_hash):
+        self._hashes[key] = (text_hash, markup_hash)
+        self._hashes.move_to_end(key)
+        if len(self._hashes) > self.max_size:
+            self._hashes.popitem(last=False)
+
+    def forget(self, key):
+        self._hashes.pop(key, None)
+
+
+rendered = RenderedMessages()
+
+
+def _is_not_modified(error):
+    return "message is not modified" in str(error)
+
+
+class TrackRenderedEdits(BaseRequestMiddleware):
+    """Middleware сессии бота: запоминает хэши после любой правки текста или клавиатуры"""
+
+    async def __call__(self, make_request, bot, method):
+        if not isinstance(method, (EditMessageText, EditMessageReplyMarkup)) or method.message_id is None:
+            return await make_request(bot, method)
+
+        key = (method.chat_id, method.message_id)
+        try:
+            result = await make_request(bot, method)
+        except TelegramBadRequest as e:
+            if not _is_not_modified(e):
+                # Что сейчас на экране, неизвестно
+                rendered.forget(key)
+                raise
+            result = True
+        except Exception:
+            rendered.forget(key)
+            raise
+
+        if isinstance(method, EditMessageText):
+            rendered.remember(key, render_hash(method.text), render_hash(method.reply_markup))
+        else:
+            rendered.remember(key, rendered.get(key)[0], render_hash(method.reply_markup))
+        return result
+
+
+async def edit_view(message, text, reply_markup=None, **kwargs):
+    """edit_text, если текст или клавиатура действительно изменились"""
+    key = (message.chat.id, message.message_id)
+    text_hash, markup_hash = render_hash(text), render_hash(reply_markup)
+    if rendered.get(key) == (text_hash, markup_hash):
+        return False
+
+    try:
+        await message.edit_text(text, reply_markup=reply_markup, **kwargs)
+    except TelegramBadRequest as e:
+        if not _is_not_modified(e):
+            raise
+    rendered.remember(key, text_hash, markup_hash)
+    return True
+
+
+async def edit_view_markup(message, reply_markup):
+    """edit_reply_markup, если клавиатура изменилась"""
+    key = (message.chat.id, message.message_id)
+    text_hash, markup_hash = rendered.get(key)
+    new_hash = render_hash(reply_markup)
+    if markup_hash == new_hash:
+        return False
+
+    try:
+        await message.edit_reply_markup(reply_markup=reply_markup)
+    except TelegramBadRequest as e:
+        if not _is_not_modified(e):
+            raise
+    rendered.remember(key, text_hash, new_hash)
+    return True
+
+
+class ViewRegistry:
+    """Открытые клавиатуры: (chat_id, message_id) -> View"""
+
+    def __init__(self, interval=REFRESH_INTERVAL):
+        self.interval = timedelta(seconds=interval)
+        self._views = {}
+        self._by_date = defaultdict(set)  # (зона, дата) -> ключи сообщений
+        self._by_chat = {}  # chat_id -> ключ последнего сообщения
+        self._dirty = set()
+        self._last_refresh = datetime.min
+
+    def register(self, message, kind, date, time=None, zone='main'):
+        """Следить за сообщением с клавиатурой. В чате живо только последнее"""
+        key = (message.chat.id, message.message_id)
+        previous = self._by_chat.get(message.chat.id)
+        if previous is not None:
+            self._forget(previous)
+
+        self._views[key] = View(kind, zone, date, time, datetime.now())
+        self._by_date[(zone, date)].add(key)
+        self._by_chat[message.chat.id] = key
+
+    def forget(self, message):
+        """Сообщение больше не показывает живую клавиатуру"""
+        self._forget((message.chat.id, message.message_id))
+
+    def _forget(self, key):
+        view = self._views.pop(key, None)
+        if view is None:
+            return
+        self._dirty.discard(key)
+        keys = self._by_date.get((view.zone, view.date))
+        if keys is not None:
+            keys.discard(key)
+            if not keys:
+                del self._by_date[(view.zone, view.date)]
+        if self._by_chat.get(key[0]) == key:
+            del self._by_chat[key[0]]
+
+    def __len__(self):
+        return len(self._views)
+
+    def mark_dirty(self, zone, date):
+        """Занятость на дату изменилась — обновить клавиатуры при следующем проходе"""
+        keys = self._by_date.get((zone, date))
+        if not keys:
+            return
+        self._dirty.update(keys)
+
+        # Все изменения до прохода сливаются в одно обновление на сообщение
+        if not scheduler.has_job(REFRESH_JOB_KEY):
+            when = max(datetime.now(), self._last_refresh + self.interval)
+            scheduler.schedule(REFRESH_JOB_KEY, when, self.refresh)
+
+    def render(self, view):
+        if view.kind == VIEW_TIMES:
+            return get_time_slots(view.date, view.zone)
+        return get_tables_keyboard(view.date, view.time, view.zone)
+
+    def refresh(self):
+        """Перерисовать изменившиеся клавиатуры"""
+        self._last_refresh = datetime.now()
+        expired_before = self._last_refresh - VIEW_TTL
+        dirty, self._dirty = self._dirty, set()
+
+        updated = 0
+        for key in dirty:
+            view = self._views.get(key)
+            if view is None:
+                continue
+            if view.registered_at < expired_before:
+                self._forget(key)
+                continue
+
+            # Занятость могла вернуться к прежней — тогда править нечего
+            markup = self.render(view)
+            text_hash, markup_hash = rendered.get(key)
+            new_hash = render_hash(markup)
+            if markup_hash == new_hash:
+                continue
+            rendered.remember(key, text_hash, new_hash)
+
+            chat_id, message_id = key
+            sender.enqueue_call(
+                "edit_message_reply_markup",
+                chat_id=chat_id,
+                message_id=message_id,
+                reply_markup=markup
+            )
+            updated += 1
+
+        if updated:
+            logger.info(f"Обновлено клавиатур: {updated}")
+
+
+views = ViewRegistry()
+
+
+async def forget_view_middleware(handler, event: CallbackQuery, data):
+    """Нажатие в сообщении обычно меняет его — перестаем следить до новой регистрации"""
+    if event.message:
+        views.forget(event.message)
+    return await handler(event, data)
+
+
+@on(BOOKING_CREATED)
+@on(BOOKING_RELEASED)
+def _refresh_views(booking):
+    views.mark_dirty(booking.zone or 'main', booking.date)
@@ -0,0 +1,222 @@
+"""
+Лист ожидания
+Если на выбранное время нет столиков, гость может встать в очередь.
+Когда столик на это время освобождается, его сразу предлагают первому
+подходящему гостю; неотвеченное предложение переходит следующему.
+"""
+import bisect
+import logging
+from collections import defaultdict, namedtuple
+from datetime import datetime, timedelta
+
+from availability import booking_tables
+from booking_events import on, BOOKING_RELEASED
+from config import config
+from database import get_session, WaitlistEntry
+from keyboards import get_waitlist_offer_keyboard
+from scheduler import scheduler
+from sender import sender
+from utils import get_available_tables
+
+logger = logging.getLogger(__name__)
+
+WaitingGuest = namedtuple("WaitingGuest", ["id", "user_id", "zone", "date", "time", "guests"])
+
+
+class Waitlist:
+    """Очереди ожидания по слотам (зона, дата, время) в памяти"""
+
+    def __init__(self):
+        self._queues = defaultdict(list)  # (zone, date, time) -> [WaitingGuest] по порядку записи
+        self._offers = {}  # id записи -> (WaitingGuest, номер столика)
+
+    def load(self):
+        """Восстановить очереди из БД при запуске"""
+        today = datetime.now().strftime('%Y-%m-%d')
+        session = get_session()
+        try:
+            entries = session.query(WaitlistEntry).filter(
+                WaitlistEntry.status.in_(['waiting', 'offered']),
+                WaitlistEntry.date >= today
+            ).order_by(WaitlistEntry.id).all()
+
+            for entry in entries:
+                guest = self._to_guest(entry)
+                if entry.status == 'waiting':
+                    self._queues[(guest.zone, guest.date, guest.time)].append(guest)
+                else:
+                    self._offers[guest.id] = (guest, entry.offered_table)
+                    scheduler.schedule(f"wl_offer:{guest.id}", entry.offer_expires_at, self.expire_offer, guest.id)
+        finally:
+            session.close()
+
+        logger.info(f"Лист ожидания: {len(self)} записей, {len(self._offers)} активных предложений")
+
+    def __len__(self):
+        return sum(len(queue) for queue in self._queues.values())
+
+    @staticmethod
+    def _to_guest(entry):
+        return WaitingGuest(entry.id, entry.user_id, entry.zone, entry.date, entry.time, entry.guests)
+
+    @staticmethod
+    def _set_status(entry_id, status, **fields):
+        session = get_session()
+        try:
+            session.query(WaitlistEntry).filter(WaitlistEntry.id == entry_id).update(
+                dict(status=status, **fields), synchronize_session=False
+            )
+            session.commit()
+        finally:
+            session.close()
+
+    def position(self, zone, date, time, user_id):
+        """Место гостя в очереди (с 1) или None"""
+        for position, guest in enumerate(self._queues.get((zone, date, time), []), start=1):
+            if guest.user_id == user_id:
+                return position
+        return None
+
+    def join(self, user_id, zone, date, time, guests):
+        """Записать гостя в очередь. Возвращает (место в очереди, новая ли запись)"""
+        position = self.position(zone, date, time, user_id)
+        if position:
+            return position, False
+
+        session = get_session()
+        try:
+            entry = WaitlistEntry(user_id=user_id, zone=zone, date=date, time=time, guests=guests)
+            session.add(entry)
+            session.commit()
+            guest = self._to_guest(entry)
+        finally:
+            session.close()
+
+        queue = self._queues[(zone, date, time)]
+        queue.append(guest)
+        return len(queue), True
+
+    def _pop_first_fitting(self, zone, date, time, table_number):
+        """Первый гость в очереди слота, которому подходит столик (по местам и времени)"""
+        queue = self._queues.get((zone, date, time))
+        if not queue:
+            return None
+
+        for index, guest in enumerate(queue):
+            if table_number not in get_available_tables(date, time, zone, guest.guests):
+                continue
+            del queue[index]
+            if not queue:
+                del self._queues[(zone, date, time)]
+            return guest
+        return None
+
+    def offer_table(self, zone, date, table_number):
+        """Предложить освободившийся столик первому подходящему гостю за этот день"""
+        now = datetime.now()
+        slots = sorted(time for queue_zone, queue_date, time in self._queues
+                       if queue_zone == zone and queue_date == date)
+
+        for time in slots:
+            try:
+                slot_start = datetime.strptime(f"{date} {time}", '%Y-%m-%d %H:%M')
+            except ValueError:
+                continue
+
+            if slot_start <= now:
+                # Слот уже прошел — очередь больше не нужна
+                self._queues.pop((zone, date, time), None)
+                continue
+
+            guest = self._pop_first_fitting(zone, date, time, table_number)
+            if guest is not None:
+                self._send_offer(guest, table_number)
+                return guest
+        return None
+
+    def _send_offer(self, guest, table_number):
+        expires_at = datetime.now() + timedelta(minutes=config.WAITLIST_OFFER_TIMEOUT_MINUTES)
+        self._offers[guest.id] = (guest, table_number)
+        self._set_status(guest.id, 'offered', offered_table=table_number, offer_expires_at=expires_at)
+        scheduler.schedule(f"wl_offer:{guest.id}", expires_at, self.expire_offer, guest.id)
+
+        date_obj = datetime.strptime(guest.date, '%Y-%m-%d')
+        sender.enqueue(
+            guest.user_id,
+            f"🎉 <b>Освободился столик!</b>\n\n"
+            f"📅 Дата: {date_obj.strftime('%d.%m.%Y')}\n"
+            f"⏰ Время: {guest.time}\n"
+            f"🪑 Столик: №{table_number}\n"
+            f"👥 Гостей: {guest.guests}\n\n"
+            f"<i>Предложение действует {config.WAITLIST_OFFER_TIMEOUT_MINUTES} мин.</i>",
+            parse_mode="HTML",
+            reply_markup=get_waitlist_offer_keyboard(guest.id)
+        )
+        logger.info(f"Столик №{table_number} на {guest.date} {guest.time} предложен гостю {guest.user_id} из листа ожидания")
+
+    def get_offer(self, entry_id, user_id):
+        """Активное предложение гостю или None"""
+        offer = self._offers.get(entry_id)
+        if offer is None or offer[0].user_id != user_id:
+            return None
+        return offer
+
+    def claim(self, entry_id):
+        """Гость принял предложение"""
+        offer = self._offers.pop(entry_id, None)
+        scheduler.cancel(f"wl_offer:{entry_id}")
+        if offer:
+            self._set_status(entry_id, 'claimed')
+        return offer
+
+    def decline(self, entry_id):
+        """Гость отказался — предлагаем столик следующему"""
+        offer = self._offers.pop(entry_id, None)
+        scheduler.cancel(f"wl_offer:{entry_id}")
+        if offer:
+            self._set_status(entry_id, 'cancelled')
+            self._reoffer(*offer)
+        return offer
+
+    def return_offer(self, entry_id):
+        """Столик заняли раньше, чем гость ответил: гость снова ждет на своем
+        месте в очереди, а столик (если он свободен на другое время) уходит дальше"""
+        offer = self._offers.pop(entry_id, None)
+        scheduler.cancel(f"wl_offer:{entry_id}")
+        if not offer:
+            return None
+
+        guest, table_number = offer
+        slot = (guest.zone, guest.date, guest.time)
+        if self.position(*slot, guest.user_id):
+            # Пока шло предложение, гость записался на этот слот заново
+            self._set_status(entry_id, 'cancelled')
+        else:
+            self._set_status(entry_id, 'waiting', offered_table=None, offer_expires_at=None)
+            # Очередь идет по порядку записи, то есть по id
+            queue = self._queues[slot]
+            queue.insert(bisect.bisect_left([queued.id for queued in queue], guest.id), guest)
+
+        self._reoffer(guest, table_number)
+        return self.position(*slot, guest.user_id)
+
+    def expire_offer(self, entry_id):
+        """Предложение не приняли вовремя — предлагаем столик следующему"""
+        offer = self._offers.pop(entry_id, None)
+        if offer:
+            self._set_status(entry_id, 'expired')
+            sender.enqueue(offer[0].user_id, "⌛ Время на ответ по предложению из листа ожидания истекло.")
+            self._reoffer(*offer)
+
+    def _reoffer(self, guest, table_number):
+        self.offer_table(guest.zone, guest.date, table_number)
+
+
+waitlist = Waitlist()
+
+
+@on(BOOKING_RELEASED)
+def offer_released_table(booking):
+    """Освободившиеся столики сразу уходят листу ожидания"""
+    for table_number in booking_tables(booking):
+        waitlist.offer_table(booking.zone or 'main', booking.date, table_number)